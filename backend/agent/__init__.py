@@ -1,2 +1,8 @@
-from .agent import root_agent
-from .agent import capacity_agent
\ No newline at end of file
+"""Agent package; agents are exposed lazily so importing the package stays cheap."""
+
+
+def __getattr__(name):
+    if name in ("root_agent", "capacity_agent"):
+        from . import agent
+        return getattr(agent, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,91 +1,207 @@
-"""
-Entry point for the Strategic Consultant Agent.
-Initializes and starts the agent's server.
-"""
-
-import os
-import sys
-import logging
-import asyncio
-from dotenv import load_dotenv
-
-# Add the parent directory (backend) to the Python path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-
-# Import TaskManagers and agents
-from .task_manager import TaskManager, TaskManager_CapacityAgent, TaskManager_ExternalStakeholderAgent, TaskManager_RiskAgent, TaskManager_EngagementAgent
-from .task_manager_delivery_staff import TaskManager_DeliveryStaffAgent
-from .agent import root_agent, capacity_agent, risk_agent, engagement_agent, external_stakeholder_agent
-from .agent_delivery_staff import delivery_staff_agent
-from common.a2a_server import create_agent_server
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler()],
-)
-logger = logging.getLogger(__name__)
-
-# Load environment variables
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
-load_dotenv(dotenv_path=dotenv_path, override=True)
-
-# Global variables for TaskManager instances
-task_manager_instance: TaskManager = None
-capacity_task_manager_instance: TaskManager_CapacityAgent = None
-risk_task_manager_instance: TaskManager_RiskAgent = None
-engagement_task_manager_instance: TaskManager_EngagementAgent = None
-external_stakeholder_task_manager_instance: TaskManager_ExternalStakeholderAgent = None
-delivery_staff_task_manager_instance: TaskManager_DeliveryStaffAgent = None
-
-async def main():
-    """Initialize and start the Strategic Consultant Agent server."""
-    global task_manager_instance, capacity_task_manager_instance, risk_task_manager_instance, engagement_task_manager_instance, external_stakeholder_task_manager_instance, delivery_staff_task_manager_instance
-
-    logger.info("Starting Strategic Consultant Agent A2A Server initialization...")
-
-    # Initialize TaskManagers
-    task_manager_instance = TaskManager(agent=root_agent)
-    capacity_task_manager_instance = TaskManager_CapacityAgent(agent=capacity_agent)
-    risk_task_manager_instance = TaskManager_RiskAgent(agent=risk_agent)
-    engagement_task_manager_instance = TaskManager_EngagementAgent(agent=engagement_agent)
-    external_stakeholder_task_manager_instance = TaskManager_ExternalStakeholderAgent(agent=external_stakeholder_agent)
-    delivery_staff_task_manager_instance = TaskManager_DeliveryStaffAgent(agent=delivery_staff_agent)
-
-    logger.info("TaskManagers initialized (Priority + Capacity + Risk + Engagement + ExternalStakeholder + DeliveryStaff).")
-
-    # Host/port config
-    host = os.getenv("CONSULTANT_A2A_HOST", "0.0.0.0")
-    port = int(os.getenv("PORT", os.getenv("CONSULTANT_A2A_PORT", "8004")))
-
-    # Create the FastAPI app
-    app = create_agent_server(
-        name=root_agent.name,
-        description=root_agent.description,
-        task_manager=task_manager_instance,
-        capacity_task_manager=capacity_task_manager_instance,
-        risk_task_manager=risk_task_manager_instance,
-        engagement_task_manager=engagement_task_manager_instance,
-        external_stakeholder_task_manager=external_stakeholder_task_manager_instance,
-        delivery_staff_task_manager=delivery_staff_task_manager_instance,
-    )
-
-    logger.info(f"Strategic Consultant Agent A2A server starting on {host}:{port}")
-    
-    import uvicorn
-    config = uvicorn.Config(app, host=host, port=port, log_level="info")
-    server = uvicorn.Server(config)
-    await server.serve()
-    
-    logger.info("Strategic Consultant Agent A2A server stopped.")
-
-if __name__ == "__main__":
-    try:
-        asyncio.run(main())
-    except KeyboardInterrupt:
-        logger.info("Strategic Consultant Agent server stopped by user.")
-        sys.exit(0)
-    except Exception as e:
-        logger.error(f"Error during server startup: {str(e)}", exc_info=True)
-        sys.exit(1)
+"""
+Entry point for the Strategic Consultant Agent.
+Initializes and starts the agent's server.
+
+Set WEB_CONCURRENCY (or UVICORN_WORKERS) above 1 to run several uvicorn worker
+processes; sessions then live in the shared SQLite store so any worker can
+serve any turn. Send SIGHUP to the main process to restart workers one at a
+time (graceful reload); GRACEFUL_SHUTDOWN_SECONDS bounds how long each worker
+waits for in-flight requests.
+
+On SIGTERM (e.g. a redeploy) new turns get 503 and readiness turns false,
+detached turns get SHUTDOWN_DRAIN_SECONDS to finish, and in-memory sessions are
+checkpointed to the state directory for the next instance to restore.
+"""
+
+import os
+import sys
+import logging
+import asyncio
+from dotenv import load_dotenv
+
+# Add the parent directory (backend) to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from common.startup_timing import startup_timer
+
+# Import the persona registry; agents and TaskManagers are built on first request
+with startup_timer.measure("import:server"):
+    from .personas import PERSONAS, PersonaRegistry, warm_up_routes
+    from common.a2a_server import create_agent_server
+    from common.batch import create_batch_endpoint
+    from .analytics_api import create_analytics_router, run_analytics_sync
+    from .export import create_export_router
+    from .search import create_search_router, run_search_sync
+    from .survey_api import create_survey_router, run_survey_themes
+    from common.plan_queue import drain_plan_queue
+    from common.readiness import ReadinessMonitor, create_health_router
+    from common.session_checkpoint import checkpoint_sessions, load_checkpoint
+    from common.shutdown import get_shutdown_coordinator
+    from common.session_store import worker_count, session_store_kind
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
+load_dotenv(dotenv_path=dotenv_path, override=True)
+
+# Global persona registry holding the (lazily built) TaskManagers
+persona_registry: PersonaRegistry = None
+
+def create_app():
+    """
+    Build the FastAPI app with its persona registry and background tasks.
+
+    Used directly in single-process mode and as the uvicorn app factory in
+    multi-worker mode, where each worker builds its own registry.
+    """
+    global persona_registry
+
+    logger.info(f"Starting Strategic Consultant Agent A2A Server initialization (pid {os.getpid()}, session store: {session_store_kind()})...")
+
+    # Register personas; each one is constructed on its first request
+    with startup_timer.measure("persona_registry"):
+        persona_registry = PersonaRegistry()
+
+    logger.info(f"Personas registered (lazy): {', '.join(persona_registry.routes())}")
+
+    # Sessions the previous instance checkpointed at shutdown, restored as each persona is built
+    load_checkpoint()
+    shutdown = get_shutdown_coordinator()
+
+    # Personas to build in the background; readiness waits for these
+    warm_up = warm_up_routes(os.getenv("WARMUP_PERSONAS", ""))
+    readiness = ReadinessMonitor(persona_registry.status, warm_up)
+
+    # Create the FastAPI app
+    with startup_timer.measure("create_agent_server"):
+        app = create_agent_server(
+            name=PERSONAS["run"].agent_name,
+            description=PERSONAS["run"].description,
+            task_manager=persona_registry.get("run"),
+            capacity_task_manager=persona_registry.get("capacity_agent"),
+            risk_task_manager=persona_registry.get("risk_agent"),
+            engagement_task_manager=persona_registry.get("engagement_agent"),
+            external_stakeholder_task_manager=persona_registry.get("external_stakeholder_agent"),
+            delivery_staff_task_manager=persona_registry.get("delivery_staff_agent"),
+            endpoints={"batch": create_batch_endpoint(persona_registry.task_managers)},
+            routers=[
+                create_health_router(readiness), create_analytics_router(), create_export_router(),
+                create_search_router(), create_survey_router(),
+            ],
+            personas=persona_registry.specs,
+        )
+
+    background_tasks = []
+
+    async def start_background_tasks():
+        # SIGTERM starts draining before uvicorn stops accepting connections
+        shutdown.install_signal_handlers()
+
+        # Replay plan generation deferred while a model circuit was open
+        background_tasks.append(asyncio.create_task(drain_plan_queue(
+            persona_registry.task_managers,
+            interval=float(os.getenv("PLAN_QUEUE_DRAIN_SECONDS", "30")),
+        )))
+
+        # Keep cross-consultation analytics in step with consultations saved by other workers
+        analytics_interval = float(os.getenv("ANALYTICS_SYNC_SECONDS", "300"))
+        if analytics_interval > 0:
+            background_tasks.append(asyncio.create_task(run_analytics_sync(analytics_interval)))
+
+        # Index consultations saved by other workers for /search, and embed new documents
+        search_interval = float(os.getenv("SEARCH_SYNC_SECONDS", "300"))
+        if search_interval > 0:
+            background_tasks.append(asyncio.create_task(run_search_sync(search_interval)))
+
+        # Re-cluster open-text survey answers that arrived since the last pass
+        themes_interval = float(os.getenv("SURVEY_THEMES_SECONDS", "3600"))
+        if themes_interval > 0:
+            background_tasks.append(asyncio.create_task(run_survey_themes(themes_interval)))
+
+        # Optionally build personas in the background so the first user doesn't pay for it
+        if warm_up != []:
+            background_tasks.append(asyncio.create_task(persona_registry.warm_up(warm_up)))
+
+        # Cached readiness report behind /health/ready
+        background_tasks.append(asyncio.create_task(readiness.run()))
+
+    async def stop_background_tasks():
+        for task in background_tasks:
+            task.cancel()
+        # Let detached turns finish (their plans are saved inside the turn), then checkpoint sessions
+        await shutdown.drain()
+        checkpoint_sessions(persona_registry.session_services())
+
+    app.add_event_handler("startup", start_background_tasks)
+    app.add_event_handler("shutdown", stop_background_tasks)
+
+    startup_timer.log_report()
+    return app
+
+def server_settings() -> dict:
+    """Host, port and shutdown settings shared by both run modes."""
+    return {
+        "host": os.getenv("CONSULTANT_A2A_HOST", "0.0.0.0"),
+        "port": int(os.getenv("PORT", os.getenv("CONSULTANT_A2A_PORT", "8004"))),
+        "log_level": "info",
+        "timeout_graceful_shutdown": int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "30")),
+    }
+
+async def main():
+    """Initialize and start the Strategic Consultant Agent server in a single process."""
+    import uvicorn
+
+    app = create_app()
+    settings = server_settings()
+    logger.info(f"Strategic Consultant Agent A2A server starting on {settings['host']}:{settings['port']}")
+
+    config = uvicorn.Config(app, **settings)
+    server = uvicorn.Server(config)
+    await server.serve()
+    
+    logger.info("Strategic Consultant Agent A2A server stopped.")
+
+def run_workers(workers: int) -> None:
+    """Start uvicorn's process supervisor with one app instance per worker."""
+    import uvicorn
+
+    # Workers must share session state; default them to the SQLite store
+    os.environ.setdefault("SESSION_STORE", "sqlite")
+    settings = server_settings()
+    logger.info(f"Strategic Consultant Agent A2A server starting {workers} workers on {settings['host']}:{settings['port']}")
+    uvicorn.run("agent.__main__:create_app", factory=True, workers=workers, **settings)
+
+def record_import_profile() -> None:
+    """Record an -X importtime profile of this entry point into the local state directory."""
+    import json
+    from common.import_profiler import profile_imports, format_report
+    from common.local_state import state_path
+
+    report = profile_imports("agent.__main__")
+    report_path = state_path("import_time_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"{format_report(report, top=15)}\nFull import profile written to {report_path}")
+
+if __name__ == "__main__":
+    try:
+        if "--profile-imports" in sys.argv or os.getenv("PROFILE_IMPORTS", "").lower() in ("1", "true"):
+            record_import_profile()
+        workers = worker_count()
+        if workers > 1:
+            run_workers(workers)
+        else:
+            asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Strategic Consultant Agent server stopped by user.")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Error during server startup: {str(e)}", exc_info=True)
+        sys.exit(1)
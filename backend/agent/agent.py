@@ -1,14 +1,23 @@
-from google.adk.agents import Agent
 import os
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from google.adk.models.lite_llm import LiteLlm
+from .models import agent_model
+
+# google.adk is slow to import, so it is imported when an agent is first built
+if TYPE_CHECKING:
+    from google.adk.agents import Agent
+
 # from google.adk.tools import FunctionTool
 # from google.adk.models.lite_llm import 
 
-root_agent = Agent(
-    name="riley_strategic_consultant",
-    description="Riley - A strategic consultant AI specialized in priority discovery and strategic planning for TAFE NSW departments.",
-    instruction = """
+def build_root_agent() -> "Agent":
+    """Build Riley, the strategic consultant agent."""
+    from google.adk.agents import Agent
+
+    return Agent(
+        name="riley_strategic_consultant",
+        description="Riley - A strategic consultant AI specialized in priority discovery and strategic planning for TAFE NSW departments.",
+        instruction = """
     You are Riley, an experienced strategic consultant specializing in priority discovery and strategic planning for TAFE NSW departments.
 
     CORE IDENTITY:
@@ -273,13 +282,17 @@ root_agent = Agent(
 
     Your goal is to systematically gather stakeholder context through Sections 1-7, then provide comprehensive strategic analysis and recommendations with [PLAN_GENERATED] tags and HTML formatting in Section 8.
     """,
-    model=LiteLlm("gemini/gemini-2.5-flash")
-)
+        model=agent_model("gemini/gemini-2.5-flash", lite_llm=True)
+    )
 
-capacity_agent = Agent(
-   name="morgan_capacity_analyst",
-   description="Morgan - A capacity analyst AI specialised in evaluating staffing, resources, and workflow efficiency for organisational departments.",
-   instruction = """
+def build_capacity_agent() -> "Agent":
+    """Build Morgan, the capacity analyst agent."""
+    from google.adk.agents import Agent
+
+    return Agent(
+        name="morgan_capacity_analyst",
+        description="Morgan - A capacity analyst AI specialised in evaluating staffing, resources, and workflow efficiency for organisational departments.",
+        instruction = """
    Role:
    - You are Morgan, an experienced capacity analyst specialising in departmental capacity assessment.
    - You help departments evaluate current staffing levels, identify resource gaps, and optimise workflow efficiency.
@@ -466,14 +479,18 @@ capacity_agent = Agent(
    # - Keep the assessment structured, efficient, and rapid
    # - Always conclude with gratitude for the department's participation and time
    # """,
-   model="gemini-2.5-flash",
-   tools=[],
-)
-
-risk_agent = Agent(
-   name="alex_risk_analyst",
-   description="Alex - A Risk analyst AI specialized in evaluating staffing, resources, and workflow efficiency for organizational departments.",
-   instruction = """
+        model=agent_model("gemini-2.5-flash"),
+        tools=[],
+    )
+
+def build_risk_agent() -> "Agent":
+    """Build Alex, the risk analyst agent."""
+    from google.adk.agents import Agent
+
+    return Agent(
+        name="alex_risk_analyst",
+        description="Alex - A Risk analyst AI specialized in evaluating staffing, resources, and workflow efficiency for organizational departments.",
+        instruction = """
    Role:
    - You are Alex, a thorough and systematic Risk Assessment Specialist with deep expertise in risk identification and mitigation strategies.
    - You help organisations identify potential risks, assess their impact, and develop comprehensive mitigation strategies.
@@ -735,13 +752,17 @@ risk_agent = Agent(
    # - "Student placement risks are critical in health programs. Have you considered the impact of industry partner capacity constraints on clinical placements?"
    # - "With remote learning increasing, cybersecurity risks have escalated. What controls do you have for protecting student data in online environments?"
    # """,
-   model="gemini-2.5-flash"
-)
+        model=agent_model("gemini-2.5-flash")
+    )
+
+def build_engagement_agent() -> "Agent":
+    """Build Jordan, the engagement planner agent."""
+    from google.adk.agents import Agent
 
-engagement_agent = Agent(
-   name="jordan_engagement_planner",
-   description="Jordan - A Engagement Planner AI specialized in evaluating staffing, resources, and workflow efficiency for organizational departments.",
-   instruction = """
+    return Agent(
+        name="jordan_engagement_planner",
+        description="Jordan - A Engagement Planner AI specialized in evaluating staffing, resources, and workflow efficiency for organizational departments.",
+        instruction = """
    Role:
    - You are Jordan, a collaborative and inclusive Stakeholder Engagement Specialist with expertise in relationship building and communication strategy.
    - You help organizations identify key stakeholders, develop engagement strategies, and build sustainable relationships.
@@ -985,13 +1006,17 @@ engagement_agent = Agent(
    # Sample Plan Response Format:
    # "[PLAN_GENERATED] Based on our discussion, here's your comprehensive stakeholder engagement strategy..."
    # """,
-   model="gemini-2.5-flash"
-)
+        model=agent_model("gemini-2.5-flash")
+    )
+
+def build_external_stakeholder_agent() -> "Agent":
+    """Build the external stakeholder agent."""
+    from google.adk.agents import Agent
 
-external_stakeholder_agent = Agent(
-   name="external_stakeholder_agent",
-   description="Agent for managing external stakeholder engagement",
-   instruction="""
+    return Agent(
+        name="external_stakeholder_agent",
+        description="Agent for managing external stakeholder engagement",
+        instruction="""
    You are Josh, a data collection specialist focused on capturing comprehensive insights from industry stakeholders about workforce trends and training needs in the health and community services sector.
 
    ## Primary Objective
@@ -1149,8 +1174,8 @@ external_stakeholder_agent = Agent(
    ## Output Requirement
    Always conclude stakeholder engagement sessions with a structured HTML report starting with [PLAN_GENERATED], summarizing all captured data, insights, and actionable recommendations for TAFE NSW SWS consideration.
    """,
-   model="gemini-2.5-flash"
-)
+        model=agent_model("gemini-2.5-flash")
+    )
 
 
 # delivery_staff_agent = Agent(
@@ -1160,4 +1185,25 @@ external_stakeholder_agent = Agent(
 #    This agent is responsible for engaging with delivery staff to gather insights and feedback on training effectiveness, operational challenges, and workforce needs.
 #    """,
 #    model="gemini-2.5-flash"
-# )
\ No newline at end of file
+# )
+
+
+# Agents are built on first access rather than at import time so that only the
+# personas actually used pay their construction cost.
+_AGENT_BUILDERS = {
+    "root_agent": build_root_agent,
+    "capacity_agent": build_capacity_agent,
+    "risk_agent": build_risk_agent,
+    "engagement_agent": build_engagement_agent,
+    "external_stakeholder_agent": build_external_stakeholder_agent,
+}
+_agents = {}
+
+
+def __getattr__(name):
+    """Lazily build module-level agents such as ``root_agent`` on first access."""
+    if name in _AGENT_BUILDERS:
+        if name not in _agents:
+            _agents[name] = _AGENT_BUILDERS[name]()
+        return _agents[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,72 +1,56 @@
-from google.adk.agents import Agent
-import os
+from typing import TYPE_CHECKING
+
 from dotenv import load_dotenv
-from google.adk.models.lite_llm import LiteLlm
-import json
+from .models import agent_model
+from .questionnaires import get_questionnaire_registry, format_question
+
+# google.adk is slow to import and the question helpers here don't need it,
+# so it is imported when the agent is first built
+if TYPE_CHECKING:
+    from google.adk.agents import Agent
+
+def delivery_staff_questionnaire():
+    """The delivery staff question set, loaded once per process by the questionnaire registry."""
+    return get_questionnaire_registry().get('delivery_staff')
 
 def load_questions():
-    # Get the directory where this file is located
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    questions_file = os.path.join(current_dir, 'questions', 'delivery_staff.json')
-    with open(questions_file, 'r') as f:
-        return json.load(f)
+    return delivery_staff_questionnaire().data
 
 def get_question_by_id(question_id):
-    questions_data = load_questions()
-    for question in questions_data['questions']:
-        if question['id'] == str(question_id):
-            return question
-    return None
+    return delivery_staff_questionnaire().get(question_id)
 
 def format_question_for_agent(question):
     """Format a question object for presentation by the agent"""
-    if not question:
-        return None
-        
-    # Handle matrix-style questions
-    if question.get('type') == 'matrix':
-        formatted = f"Question: {question['question']}\n\n"
-        
-        for sub_q in question.get('subQuestions', []):
-            formatted += f"For {sub_q['title']}:\n"
-            formatted += "Options:\n"
-            for option in sub_q['options']:
-                formatted += f"- {option}\n"
-            formatted += "\n"
-        
-        return formatted.strip()
-    
-    # Handle regular questions
-    formatted = f"Question: {question['question']}\n"
-    
-    if question.get('options') and len(question['options']) > 0:
-        formatted += "Options:\n"
-        for option in question['options']:
-            if option.strip():  # Skip empty options
-                formatted += f"- {option}\n"
-    
-    return formatted.strip()
-
-def get_next_question_id(current_response):
-    """Extract current question ID from response and return next question ID"""
-    import re
-    # Look for ID[number] pattern in the response
-    match = re.search(r'ID\[(\d+)\]', current_response)
-    if match:
-        current_id = int(match.group(1))
-        return current_id + 1
-    return 1  # Start with question 1 if no ID found
-
-delivery_staff_agent = Agent(
-   name="delivery_staff_agent",
-   description="Agent for managing delivery staff engagement - presents one question at a time",
-    instruction=f"""
+    return format_question(question)
+
+def get_next_question_id(current_response, answers=None):
+    """
+    Extract current question ID from response and return the next question ID the
+    survey's branching rules allow given the answers so far ({question id: answer}),
+    or None once the survey is complete
+    """
+    questionnaire = delivery_staff_questionnaire()
+    current_id = questionnaire.question_in(current_response)
+    if current_id is None:
+        question = questionnaire.first(answers)  # Start with the first question if no ID found
+    else:
+        question = questionnaire.next_after(current_id, answers)
+    return int(question['id']) if question else None
+
+def build_delivery_staff_agent() -> "Agent":
+    """Build Riva, the delivery staff survey agent."""
+    from google.adk.agents import Agent
+
+    return Agent(
+        name="delivery_staff_agent",
+        description="Agent for managing delivery staff engagement - presents one question at a time",
+        instruction=f"""
     You are Riva, a virtual assistant for TAFE NSW delivery staff.
 
     IMPORTANT RULES:
     1. Present ONLY ONE question at a time from the delivery staff questions when conducting the consultation.
     2. If the user just started or you see no ID in the conversation, start with question ID 1.
-    3. If you see ID[X] in the previous conversation, present the question with ID X+1.
+    3. If the prompt ends with "Next question: ID[N]", present the question with ID N; questions are skipped based on earlier answers, so N is not always X+1. Otherwise, if you see ID[X] in the previous conversation, present the question with ID X+1. If the prompt ends with "The survey is complete", thank the user for their time instead of presenting another question.
     4. Always end your response with "ID[current_question_number]" when presenting a question.
     5. If the user asks any other query (not related to the consultation questions), answer helpfully and informatively as Riva, using your general knowledge and context.
     6. For matrix-type questions, present all sub-questions together with their respective options, formatting as shown.
@@ -94,12 +78,25 @@ delivery_staff_agent = Agent(
 
     ID[current_question_number]
 
-    Available questions: {load_questions()}
+    Available questions:
+{delivery_staff_questionnaire().prompt_listing()}
 
     Start with question ID 1 unless you detect a previous question ID in the conversation.
     """,
-   model="gemini-2.5-flash"
-)
+        model=agent_model("gemini-2.5-flash", script="survey")
+    )
+
+_delivery_staff_agent = None
+
+
+def __getattr__(name):
+    """Build ``delivery_staff_agent`` on first access; its instruction embeds the whole question bank."""
+    global _delivery_staff_agent
+    if name == "delivery_staff_agent":
+        if _delivery_staff_agent is None:
+            _delivery_staff_agent = build_delivery_staff_agent()
+        return _delivery_staff_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Helper function to run the agent with a specific question
 def get_agent_response_for_question(question_id, context=None):
@@ -0,0 +1,405 @@
+"""
+Cross-consultation analytics.
+Structured answers extracted from each consultation (challenge and risk
+ratings, ranked investment priorities, capacity figures) are persisted once
+in a local fact table and held in memory as NumPy column arrays, so dashboard
+aggregates are computed in milliseconds without re-reading transcripts.
+
+Facts arrive from two sources: TaskManagers publish each saved consultation
+(see consultation_events), and a periodic sync pulls consultation_data and
+chat_history rows newer than the last synced id from Supabase. Every worker
+reads the shared fact table incrementally by sequence number.
+"""
+
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from common.local_state import connect
+from common.supabase_client import get_supabase_client
+from .answer_extraction import ANSWER_LABELS, extract_answers
+from .consultation_events import ConsultationSaved
+from .consultation_facts import structured_answers
+
+logger = logging.getLogger(__name__)
+
+FACTS_DB = "analytics.sqlite3"
+
+
+def _timestamp(value: Any) -> float:
+    """Convert an ISO timestamp (as Supabase returns it) to epoch seconds; 0 if unparseable."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return 0.0
+
+
+class FactStore:
+    """SQLite table of extracted facts, one row per consultation, ordered by a sequence number."""
+
+    def __init__(self, filename: str = FACTS_DB):
+        self.conn = connect(filename)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS consultation_facts (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                consultation_type TEXT NOT NULL,
+                department TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                answers TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS analytics_sync (
+                source TEXT PRIMARY KEY,
+                watermark INTEGER NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+
+    def upsert(self, facts: List[Dict[str, Any]]) -> None:
+        """Insert or replace facts; a replaced row gets a new sequence number so readers pick it up."""
+        with self.conn:
+            for fact in facts:
+                self.conn.execute("DELETE FROM consultation_facts WHERE key = ?", (fact["key"],))
+                self.conn.execute(
+                    "INSERT INTO consultation_facts (key, consultation_type, department, created_at, answers) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (fact["key"], fact["consultation_type"], fact["department"], fact["created_at"], json.dumps(fact["answers"])),
+                )
+
+    def answers_for(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Stored answers by key, for the keys that already have a row."""
+        if not keys:
+            return {}
+        rows = self.conn.execute(
+            f"SELECT key, answers FROM consultation_facts WHERE key IN ({','.join('?' * len(keys))})",
+            keys,
+        ).fetchall()
+        return {row["key"]: json.loads(row["answers"]) for row in rows}
+
+    def since(self, seq: int) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            "SELECT seq, key, consultation_type, department, created_at, answers FROM consultation_facts "
+            "WHERE seq > ? ORDER BY seq",
+            (seq,),
+        ).fetchall()
+        return [{**dict(row), "answers": json.loads(row["answers"])} for row in rows]
+
+    def get_watermark(self, source: str) -> int:
+        row = self.conn.execute("SELECT watermark FROM analytics_sync WHERE source = ?", (source,)).fetchone()
+        return row["watermark"] if row else 0
+
+    def set_watermark(self, source: str, watermark: int) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO analytics_sync (source, watermark) VALUES (?, ?)",
+                (source, watermark),
+            )
+
+
+class AnalyticsEngine:
+    """In-memory columnar view of the fact table with vectorised aggregates."""
+
+    def __init__(self, store: Optional[FactStore] = None, initial_capacity: int = 1024):
+        self.store = store or FactStore()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._size = 0
+        self._capacity = initial_capacity
+        self._rows: Dict[str, int] = {}
+        self._departments: List[str] = []
+        self._department_codes: Dict[str, int] = {}
+        self._types: List[str] = []
+        self._type_codes: Dict[str, int] = {}
+        self.department = np.zeros(initial_capacity, dtype=np.int32)
+        self.consultation_type = np.zeros(initial_capacity, dtype=np.int32)
+        self.created_at = np.zeros(initial_capacity, dtype=np.float64)
+        self.answers: Dict[str, np.ndarray] = {
+            kind: np.full((initial_capacity, len(labels)), np.nan, dtype=np.float64 if kind == "capacity" else np.float32)
+            for kind, labels in ANSWER_LABELS.items()
+        }
+
+    # -- ingestion ---------------------------------------------------------
+
+    @staticmethod
+    def _code(value: str, names: List[str], codes: Dict[str, int]) -> int:
+        key = (value or "Unknown").strip().lower()
+        if key not in codes:
+            codes[key] = len(names)
+            names.append((value or "Unknown").strip())
+        return codes[key]
+
+    def _grow(self) -> None:
+        self._capacity *= 2
+        self.department = np.resize(self.department, self._capacity)
+        self.consultation_type = np.resize(self.consultation_type, self._capacity)
+        self.created_at = np.resize(self.created_at, self._capacity)
+        for kind, column in self.answers.items():
+            grown = np.full((self._capacity, column.shape[1]), np.nan, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self.answers[kind] = grown
+
+    def _apply(self, fact: Dict[str, Any]) -> None:
+        row = self._rows.get(fact["key"])
+        if row is None:
+            if self._size == self._capacity:
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._rows[fact["key"]] = row
+
+        self.department[row] = self._code(fact["department"], self._departments, self._department_codes)
+        self.consultation_type[row] = self._code(fact["consultation_type"], self._types, self._type_codes)
+        self.created_at[row] = fact["created_at"]
+        for kind, labels in ANSWER_LABELS.items():
+            values = fact["answers"].get(kind, {})
+            self.answers[kind][row] = [values.get(label, np.nan) for label in labels]
+
+    def refresh(self) -> int:
+        """Load facts added since the last refresh; returns how many rows were applied."""
+        with self._lock:
+            facts = self.store.since(self._seq)
+            for fact in facts:
+                self._apply(fact)
+                self._seq = fact["seq"]
+        return len(facts)
+
+    def ingest(self, key: str, consultation_type: str, department: str, created_at: float,
+               history: List[Dict[str, Any]], plan: str = "",
+               answers: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        """Extract and persist the facts for one consultation; ``answers`` already extracted per turn take precedence."""
+        self.store.upsert([{
+            "key": key,
+            "consultation_type": consultation_type,
+            "department": department or "Unknown",
+            "created_at": created_at,
+            "answers": {**extract_answers(history, plan), **(answers or {})},
+        }])
+
+    def ingest_event(self, event: ConsultationSaved) -> None:
+        """Consultation event subscriber: record a just-saved consultation."""
+        if event.consultation_id is None:
+            return
+        self.ingest(
+            f"{event.consultation_type}:{event.consultation_id}",
+            event.consultation_type,
+            event.context.get("department", ""),
+            time.time(),
+            event.conversation_history,
+            event.plan,
+            structured_answers(event.facts),
+        )
+        self.refresh()
+
+    def sync_from_supabase(self, page_size: int = 100) -> int:
+        """
+        Pull consultations newer than the stored watermark from Supabase; returns how many were added.
+
+        Runs off the event loop, so it writes through its own connection and
+        leaves applying the new rows to the next ``refresh()``.
+        """
+        supabase = get_supabase_client()
+        if not supabase:
+            return 0
+
+        store = FactStore()
+        synced = 0
+        watermark = store.get_watermark("supabase")
+        while True:
+            rows = (
+                supabase.table("consultation_data")
+                .select("id, consultation_type, department, created_at, plan")
+                .gt("id", watermark)
+                .order("id")
+                .limit(page_size)
+                .execute()
+                .data
+            )
+            if not rows:
+                break
+
+            ids = [row["id"] for row in rows]
+            transcripts: Dict[Any, List[Dict[str, Any]]] = {}
+            offset = 0
+            while True:
+                # PostgREST caps responses at 1000 rows, so page through the chat history
+                chunk = (
+                    supabase.table("chat_history")
+                    .select("consultation_id, sender, message, message_order")
+                    .in_("consultation_id", ids)
+                    .order("consultation_id")
+                    .order("message_order")
+                    .range(offset, offset + 999)
+                    .execute()
+                    .data
+                )
+                for message in chunk:
+                    transcripts.setdefault(message["consultation_id"], []).append(message)
+                if len(chunk) < 1000:
+                    break
+                offset += 1000
+
+            keys = {row["id"]: f"{row.get('consultation_type') or 'unknown'}:{row['id']}" for row in rows}
+            # Answers already recorded per turn by ingest_event win; extraction only fills the kinds they lack
+            existing = store.answers_for(list(keys.values()))
+            store.upsert([
+                {
+                    "key": keys[row["id"]],
+                    "consultation_type": row.get("consultation_type") or "unknown",
+                    "department": row.get("department") or "Unknown",
+                    "created_at": _timestamp(row.get("created_at")),
+                    "answers": {
+                        **extract_answers(transcripts.get(row["id"], []), row.get("plan") or ""),
+                        **existing.get(keys[row["id"]], {}),
+                    },
+                }
+                for row in rows
+            ])
+            watermark = ids[-1]
+            store.set_watermark("supabase", watermark)
+            synced += len(rows)
+
+        store.conn.close()
+        if synced:
+            logger.info(f"Analytics synced {synced} consultations from Supabase (watermark {watermark})")
+        return synced
+
+    # -- queries -----------------------------------------------------------
+
+    def _mask(self, department: Optional[str] = None, consultation_type: Optional[str] = None,
+              since: Optional[float] = None) -> np.ndarray:
+        n = self._size
+        mask = np.ones(n, dtype=bool)
+        if department:
+            code = self._department_codes.get(department.strip().lower(), -1)
+            mask &= self.department[:n] == code
+        if consultation_type:
+            code = self._type_codes.get(consultation_type.strip().lower(), -1)
+            mask &= self.consultation_type[:n] == code
+        if since:
+            mask &= self.created_at[:n] >= since
+        return mask
+
+    def overview(self, **filters) -> Dict[str, Any]:
+        """Consultation counts by type and department, and how many answered each question kind."""
+        mask = self._mask(**filters)
+        n = self._size
+        by_type = np.bincount(self.consultation_type[:n][mask], minlength=len(self._types))
+        by_department = np.bincount(self.department[:n][mask], minlength=len(self._departments))
+        return {
+            "consultations": int(mask.sum()),
+            "by_consultation_type": {self._types[i]: int(c) for i, c in enumerate(by_type) if c},
+            "by_department": {self._departments[i]: int(c) for i, c in enumerate(by_department) if c},
+            "answered": {
+                kind: int((~np.isnan(column[:n][mask])).any(axis=1).sum())
+                for kind, column in self.answers.items()
+            },
+        }
+
+    def rating_summary(self, kind: str, **filters) -> Dict[str, Any]:
+        """Mean rating, response count and 1-5 distribution per item, highest mean first."""
+        mask = self._mask(**filters)
+        matrix = self.answers[kind][:self._size][mask]
+        labels = ANSWER_LABELS[kind]
+        responses = (~np.isnan(matrix)).sum(axis=0)
+        means = np.divide(np.nansum(matrix, axis=0), responses, out=np.full(len(labels), np.nan), where=responses > 0)
+        distribution = np.stack([(matrix == value).sum(axis=0) for value in range(1, 6)], axis=1)
+        order = np.argsort(-np.nan_to_num(means, nan=-1.0), kind="stable")
+        return {
+            "consultations": int(mask.sum()),
+            "items": [
+                {
+                    "item": labels[i],
+                    "responses": int(responses[i]),
+                    "mean": None if np.isnan(means[i]) else round(float(means[i]), 2),
+                    "high_share": round(float(distribution[i, 3:].sum() / responses[i]), 3) if responses[i] else None,
+                    "distribution": {str(value): int(distribution[i, value - 1]) for value in range(1, 6)},
+                }
+                for i in order
+            ],
+        }
+
+    def priority_summary(self, **filters) -> Dict[str, Any]:
+        """Investment priorities by Borda score (rank 1 = 5 points ... rank 5 = 1 point)."""
+        mask = self._mask(**filters)
+        ranks = self.answers["priority_ranks"][:self._size][mask]
+        labels = ANSWER_LABELS["priority_ranks"]
+        ranked = ~np.isnan(ranks)
+        times_ranked = ranked.sum(axis=0)
+        scores = np.where(ranked, np.clip(6 - ranks, 0, 5), 0).sum(axis=0)
+        mean_rank = np.divide(np.nansum(ranks, axis=0), times_ranked, out=np.full(len(labels), np.nan), where=times_ranked > 0)
+        first_choice = (ranks == 1).sum(axis=0)
+        order = np.argsort(-scores, kind="stable")
+        return {
+            "consultations": int(mask.sum()),
+            "items": [
+                {
+                    "item": labels[i],
+                    "score": int(scores[i]),
+                    "times_ranked": int(times_ranked[i]),
+                    "first_choice": int(first_choice[i]),
+                    "mean_rank": None if np.isnan(mean_rank[i]) else round(float(mean_rank[i]), 2),
+                }
+                for i in order
+            ],
+        }
+
+    def capacity_summary(self, **filters) -> Dict[str, Any]:
+        """Student capacity totals and utilisation overall and per department."""
+        mask = self._mask(**filters)
+        n = self._size
+        capacity = self.answers["capacity"][:n][mask]
+        departments = self.department[:n][mask]
+        current, maximum, utilisation = capacity[:, 0], capacity[:, 1], capacity[:, 2]
+        reported = ~np.isnan(current)
+        with_utilisation = ~np.isnan(utilisation)
+
+        def group(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+            return np.bincount(departments[valid], weights=values[valid], minlength=len(self._departments))
+
+        current_sum = group(current, reported)
+        maximum_sum = group(maximum, ~np.isnan(maximum))
+        reports = np.bincount(departments[reported], minlength=len(self._departments))
+        utilisation_sum = group(utilisation, with_utilisation)
+        utilisation_count = np.bincount(departments[with_utilisation], minlength=len(self._departments))
+
+        return {
+            "consultations": int(mask.sum()),
+            "reported": int(reported.sum()),
+            "total_current_capacity": float(np.nansum(current)),
+            "total_max_capacity": float(np.nansum(maximum)),
+            "mean_utilisation_pct": round(float(np.nanmean(utilisation)), 1) if with_utilisation.any() else None,
+            "by_department": {
+                self._departments[i]: {
+                    "reported": int(reports[i]),
+                    "current_capacity": float(current_sum[i]),
+                    "max_capacity": float(maximum_sum[i]),
+                    "mean_utilisation_pct": round(float(utilisation_sum[i] / utilisation_count[i]), 1) if utilisation_count[i] else None,
+                }
+                for i in np.flatnonzero(reports)
+            },
+        }
+
+
+_engine: Optional[AnalyticsEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_analytics_engine() -> AnalyticsEngine:
+    """Return the process-wide analytics engine, loading the fact table on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = AnalyticsEngine()
+                engine.refresh()
+                _engine = engine
+    return _engine
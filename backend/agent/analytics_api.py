@@ -0,0 +1,112 @@
+"""
+HTTP endpoints and background wiring for cross-consultation analytics.
+Kept separate from the engine so the server only imports NumPy when analytics
+are first used.
+
+Environment:
+    ANALYTICS_SYNC_SECONDS   Interval between Supabase syncs (default: 300; 0 disables)
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable
+
+from fastapi import APIRouter, HTTPException, Query
+
+from .consultation_events import ConsultationSaved, subscribe
+
+logger = logging.getLogger(__name__)
+
+
+def _engine():
+    from .analytics import get_analytics_engine
+    engine = get_analytics_engine()
+    # Cheap when nothing is new: one indexed query against the fact table
+    engine.refresh()
+    return engine
+
+
+async def _query(query: Callable[[Any], Any]) -> Any:
+    """Run ``query`` on the refreshed engine in a worker thread (the first call loads the fact table)."""
+    return await asyncio.to_thread(lambda: query(_engine()))
+
+
+def _filters(department: Optional[str], consultation_type: Optional[str], since: Optional[str]) -> Dict[str, Any]:
+    filters: Dict[str, Any] = {"department": department, "consultation_type": consultation_type}
+    if since:
+        try:
+            filters["since"] = datetime.fromisoformat(since).timestamp()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="'since' must be an ISO date, e.g. 2025-01-31")
+    return filters
+
+
+def _on_consultation_saved(event: ConsultationSaved) -> None:
+    # Runs in a worker thread (see consultation_events), so loading the engine doesn't block turns
+    from .analytics import get_analytics_engine
+    get_analytics_engine().ingest_event(event)
+
+
+def create_analytics_router() -> APIRouter:
+    """Return the /analytics router and subscribe the engine to saved consultations."""
+    subscribe(_on_consultation_saved)
+    router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+    @router.get("/overview")
+    async def overview(department: Optional[str] = None, consultation_type: Optional[str] = None,
+                       since: Optional[str] = Query(None, description="ISO date lower bound")):
+        """Consultation counts by type and department."""
+        filters = _filters(department, consultation_type, since)
+        return await _query(lambda engine: engine.overview(**filters))
+
+    @router.get("/challenges")
+    async def challenges(department: Optional[str] = None, consultation_type: Optional[str] = None,
+                         since: Optional[str] = Query(None, description="ISO date lower bound")):
+        """Operational challenges ranked by mean rating (1 = not a problem, 5 = major problem)."""
+        filters = _filters(department, consultation_type, since)
+        return await _query(lambda engine: engine.rating_summary("challenge_ratings", **filters))
+
+    @router.get("/risks")
+    async def risks(department: Optional[str] = None, consultation_type: Optional[str] = None,
+                    since: Optional[str] = Query(None, description="ISO date lower bound")):
+        """Risks ranked by mean level of concern."""
+        filters = _filters(department, consultation_type, since)
+        return await _query(lambda engine: engine.rating_summary("risk_ratings", **filters))
+
+    @router.get("/priorities")
+    async def priorities(department: Optional[str] = None, consultation_type: Optional[str] = None,
+                         since: Optional[str] = Query(None, description="ISO date lower bound")):
+        """Investment priorities ranked by Borda score."""
+        filters = _filters(department, consultation_type, since)
+        return await _query(lambda engine: engine.priority_summary(**filters))
+
+    @router.get("/capacity")
+    async def capacity(department: Optional[str] = None, consultation_type: Optional[str] = None,
+                       since: Optional[str] = Query(None, description="ISO date lower bound")):
+        """Student capacity and utilisation, overall and per department."""
+        filters = _filters(department, consultation_type, since)
+        return await _query(lambda engine: engine.capacity_summary(**filters))
+
+    @router.post("/refresh")
+    async def refresh():
+        """Sync new consultations from Supabase now instead of waiting for the next interval."""
+        from .analytics import get_analytics_engine
+        engine = await asyncio.to_thread(get_analytics_engine)
+        synced = await asyncio.to_thread(engine.sync_from_supabase)
+        return {"synced": synced, "applied": await asyncio.to_thread(engine.refresh)}
+
+    return router
+
+
+async def run_analytics_sync(interval: float) -> None:
+    """Periodically pull new consultations from Supabase into the fact table."""
+    from .analytics import get_analytics_engine
+    while True:
+        try:
+            engine = await asyncio.to_thread(get_analytics_engine)
+            await asyncio.to_thread(engine.sync_from_supabase)
+            await asyncio.to_thread(engine.refresh)
+        except Exception as e:
+            logger.error(f"Analytics sync failed: {e}")
+        await asyncio.sleep(interval)
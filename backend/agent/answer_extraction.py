@@ -0,0 +1,207 @@
+"""
+Structured answer extraction for Riley consultations.
+Turns the free-text answers to Riley's rating, ranking and capacity questions
+into numbers: challenge and risk ratings (1-5), ranked investment priorities
+and student capacity figures. Works on the chat transcript, and falls back to
+the tables in the generated HTML plan when no transcript is available.
+"""
+
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+# Items as Riley lists them, each with the keywords that identify it in a free-text answer
+CHALLENGES: List[Tuple[str, str]] = [
+    ("Staff recruitment/retention", r"staff (?:recruit|retention|retain)|staffing"),
+    ("Student recruitment/retention", r"student (?:recruit|retention|retain)|enrolment"),
+    ("Industry placement capacity", r"placement"),
+    ("Equipment/technology adequacy", r"equipment|technology"),
+    ("Facility capacity/condition", r"facilit"),
+    ("Curriculum relevance", r"curricul"),
+    ("Regulatory compliance", r"regulat|compliance"),
+    ("Funding/budget constraints", r"fund|budget"),
+    ("Industry partnerships", r"partnership"),
+    ("Student support services", r"support"),
+]
+
+RISKS: List[Tuple[str, str]] = [
+    ("Loss of key staff", r"key staff|loss of staff|staff loss|losing staff"),
+    ("Declining student enrolments", r"enrol"),
+    ("Changes to government funding", r"government|funding"),
+    ("New regulatory requirements", r"regulat"),
+    ("Technology becoming obsolete", r"obsolete|technology"),
+    ("Loss of industry partnerships", r"partnership"),
+    ("Increased competition", r"competition|competitor"),
+    ("Economic downturn impact", r"econom|downturn"),
+    ("Workplace health & safety issues", r"safety|\bwhs\b|health &|health and"),
+    ("Reputation/quality concerns", r"reputation|quality"),
+]
+
+INVESTMENT_PRIORITIES: List[Tuple[str, str]] = [
+    ("Additional teaching staff", r"teaching staff|additional staff|more staff|teachers"),
+    ("Professional development for existing staff", r"professional development|\bpd\b|upskill"),
+    ("New/upgraded equipment", r"equipment"),
+    ("Facility improvements/expansion", r"facilit"),
+    ("Technology infrastructure", r"technology|infrastructure"),
+    ("Student support services", r"student support|support services"),
+    ("Industry partnership development", r"partnership"),
+    ("Marketing/student recruitment", r"marketing|recruitment"),
+    ("Curriculum development/refresh", r"curricul"),
+    ("Assessment development/refresh", r"assessment"),
+    ("Quality assurance/compliance systems", r"quality|compliance"),
+    ("Research and innovation capabilities", r"research|innovation"),
+]
+
+CAPACITY_FIELDS = ["current_capacity", "max_capacity", "utilisation_pct"]
+
+# Valid field names for each answer kind, in the column order analytics stores them
+ANSWER_LABELS = {
+    "challenge_ratings": [name for name, _ in CHALLENGES],
+    "risk_ratings": [name for name, _ in RISKS],
+    "priority_ranks": [name for name, _ in INVESTMENT_PRIORITIES],
+    "capacity": CAPACITY_FIELDS,
+}
+
+# Question patterns, matching ConsultationStageTracker's, that introduce each answer type
+QUESTION_PATTERNS = {
+    "challenge_ratings": "rate the following challenges",
+    "risk_ratings": "rate your level of concern",
+    "priority_ranks": "rank your top 5 investment priorities",
+    "capacity": "current student capacity",
+}
+
+_COMPILED = {
+    "challenge_ratings": [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in CHALLENGES],
+    "risk_ratings": [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in RISKS],
+    "priority_ranks": [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in INVESTMENT_PRIORITIES],
+}
+_RATING = re.compile(r"(?<![\d.])([1-5])(?:\s*/\s*5)?(?![\d.%])")
+_NUMBER = re.compile(r"(\d[\d,]*(?:\.\d+)?)")
+_PERCENT = re.compile(r"(\d{1,3}(?:\.\d+)?)\s*(?:%|per ?cent)", re.IGNORECASE)
+_TABLE_ROW = re.compile(r"<tr>\s*<td>(.*?)</td>\s*<td>\s*([1-5])(?:\s*/\s*5)?\s*</td>", re.IGNORECASE | re.DOTALL)
+
+
+def _segments(answer: str) -> List[str]:
+    """Split an answer into per-item segments (lines, or comma/semicolon separated parts)."""
+    parts = [p.strip() for p in re.split(r"[\n;]+", answer) if p.strip()]
+    if len(parts) == 1:
+        parts = [p.strip() for p in parts[0].split(",") if p.strip()]
+    return parts
+
+
+def parse_ratings(answer: str, kind: str) -> Dict[str, int]:
+    """
+    Parse 1-5 ratings for the items of ``kind`` from a free-text answer.
+
+    Labelled answers ("Staff recruitment: 4") are matched by keyword; a bare
+    list of exactly one number per item is taken in the order Riley asked.
+    """
+    items = _COMPILED[kind]
+    ratings: Dict[str, int] = {}
+    for segment in _segments(answer):
+        rating = _RATING.findall(segment)
+        if not rating:
+            continue
+        for name, pattern in items:
+            if name not in ratings and pattern.search(segment):
+                ratings[name] = int(rating[-1])
+                break
+    if ratings:
+        return ratings
+
+    numbers = _RATING.findall(answer)
+    if len(numbers) == len(items):
+        return {name: int(value) for (name, _), value in zip(items, numbers)}
+    return {}
+
+
+def parse_ranking(answer: str) -> Dict[str, int]:
+    """Parse ranked investment priorities: explicit "1." style ranks, otherwise order of mention."""
+    ranks: Dict[str, int] = {}
+    order = 0
+    for segment in _segments(answer):
+        explicit = re.match(r"^\s*(?:#\s*)?(\d{1,2})\s*[.):-]", segment)
+        for name, pattern in _COMPILED["priority_ranks"]:
+            if name not in ranks and pattern.search(segment):
+                order += 1
+                ranks[name] = int(explicit.group(1)) if explicit else order
+                break
+        if len(ranks) == 5:
+            break
+    return ranks
+
+
+def parse_capacity(answer: str) -> Dict[str, float]:
+    """Parse current and maximum student capacity and the utilisation percentage."""
+    capacity: Dict[str, float] = {}
+    percent = _PERCENT.search(answer)
+    if percent:
+        capacity["utilisation_pct"] = float(percent.group(1))
+        answer = answer[:percent.start()] + answer[percent.end():]
+
+    counts = [float(n.replace(",", "")) for n in _NUMBER.findall(answer)]
+    if counts:
+        capacity["current_capacity"] = counts[0]
+    if len(counts) > 1:
+        capacity["max_capacity"] = counts[1]
+    if "utilisation_pct" not in capacity and capacity.get("max_capacity"):
+        capacity["utilisation_pct"] = round(capacity["current_capacity"] / capacity["max_capacity"] * 100, 1)
+    return capacity
+
+
+def parse_answer(kind: str, answer: str) -> Dict[str, Any]:
+    """Parse one answer of the given kind; returns an empty dict when nothing was recognised."""
+    if kind == "priority_ranks":
+        return parse_ranking(answer)
+    if kind == "capacity":
+        return parse_capacity(answer)
+    return parse_ratings(answer, kind)
+
+
+def question_kind(ai_message: str) -> Optional[str]:
+    """Return which structured question an assistant message asks, if any."""
+    lowered = ai_message.lower()
+    for kind, pattern in QUESTION_PATTERNS.items():
+        if pattern in lowered:
+            return kind
+    return None
+
+
+def extract_from_transcript(history: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Extract every structured answer from a transcript of {sender, message} entries."""
+    answers: Dict[str, Dict[str, Any]] = {}
+    pending_kind = None
+    for msg in history:
+        sender = msg.get("sender", "user")
+        text = msg.get("message", "") or ""
+        if sender in ("ai", "bot", "agent", "model"):
+            pending_kind = question_kind(text)
+        elif pending_kind:
+            parsed = parse_answer(pending_kind, text)
+            if parsed:
+                answers[pending_kind] = parsed
+            pending_kind = None
+    return answers
+
+
+def extract_from_plan(plan: str) -> Dict[str, Dict[str, Any]]:
+    """Extract challenge and risk ratings from "<tr><td>Item</td><td>4</td>" rows in an HTML plan."""
+    answers: Dict[str, Dict[str, Any]] = {}
+    for label, value in _TABLE_ROW.findall(plan or ""):
+        label = re.sub(r"<[^>]+>", "", label)
+        for kind in ("challenge_ratings", "risk_ratings"):
+            for name, pattern in _COMPILED[kind]:
+                if pattern.search(label):
+                    answers.setdefault(kind, {}).setdefault(name, int(value))
+                    break
+            else:
+                continue
+            break
+    return answers
+
+
+def extract_answers(history: List[Dict[str, Any]], plan: str = "") -> Dict[str, Dict[str, Any]]:
+    """Extract structured answers from a transcript, filling gaps from the plan's tables."""
+    answers = extract_from_transcript(history or [])
+    for kind, values in extract_from_plan(plan).items():
+        answers.setdefault(kind, values)
+    return answers
@@ -0,0 +1,114 @@
+"""
+Command-line batch runner for consultation transcripts.
+Replays many (persona, transcript, context) jobs either in-process or through
+a running server's /batch endpoint, writing one JSON result per line.
+
+Input is a JSON array or a JSONL file of jobs:
+    {"persona": "risk_agent", "transcript": [{"sender": "user", "message": "..."}],
+     "context": {"email": "...", "name": "...", "role": "...", "department": "..."}}
+
+Usage (from the backend directory):
+    python -m agent.batch_cli jobs.jsonl --output results.jsonl
+    python -m agent.batch_cli jobs.jsonl --url http://localhost:8004 --batch-id risk-prompt-v2
+
+Re-running with the same batch id (default: the input file name) skips jobs
+that already completed successfully.
+"""
+
+import os
+import sys
+import json
+import asyncio
+import logging
+import argparse
+import urllib.request
+from typing import List, Optional, TextIO
+
+from dotenv import load_dotenv
+
+from common.batch import BatchJob, BatchRunner, stream_batch_ndjson
+
+logger = logging.getLogger(__name__)
+
+
+def load_jobs(path: str) -> List[BatchJob]:
+    """Load jobs from a JSON array or a JSONL file."""
+    with open(path, "r") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        records = json.loads(text)
+    else:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return [BatchJob(**record) for record in records]
+
+
+async def run_local(jobs: List[BatchJob], batch_id: str, out: TextIO, workers: Optional[int], model_concurrency: Optional[int]) -> bool:
+    """Run the batch in this process; returns True if every job succeeded."""
+    from .personas import PersonaRegistry
+
+    runner = BatchRunner(PersonaRegistry().task_managers, workers=workers, model_concurrency=model_concurrency)
+    ok = True
+    async for line in stream_batch_ndjson(runner, jobs, batch_id):
+        out.write(line)
+        out.flush()
+        record = json.loads(line)
+        if record.get("type") == "result" and record.get("status") != "success":
+            ok = False
+    return ok
+
+
+def run_remote(url: str, jobs: List[BatchJob], batch_id: str, out: TextIO, workers: Optional[int], model_concurrency: Optional[int]) -> bool:
+    """Send the batch to a running server and copy its NDJSON stream to ``out``."""
+    body = json.dumps({
+        "jobs": [job.dict() for job in jobs],
+        "batch_id": batch_id,
+        "workers": workers,
+        "model_concurrency": model_concurrency,
+    }).encode()
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/batch",
+        data=body,
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    ok = True
+    with urllib.request.urlopen(request) as response:
+        for raw in response:
+            line = raw.decode()
+            out.write(line)
+            out.flush()
+            record = json.loads(line)
+            if record.get("type") == "result" and record.get("status") != "success":
+                ok = False
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay consultation transcripts through the persona agents")
+    parser.add_argument("input", help="JSON or JSONL file of batch jobs")
+    parser.add_argument("--output", help="Write NDJSON results here instead of stdout")
+    parser.add_argument("--batch-id", help="Checkpoint name (default: input file name)")
+    parser.add_argument("--url", help="Send the batch to a running server instead of running in-process")
+    parser.add_argument("--workers", type=int, help="Concurrent jobs")
+    parser.add_argument("--model-concurrency", type=int, help="Concurrent jobs per model endpoint")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'), override=True)
+
+    jobs = load_jobs(args.input)
+    batch_id = args.batch_id or os.path.splitext(os.path.basename(args.input))[0]
+    out = open(args.output, "a") if args.output else sys.stdout
+    try:
+        if args.url:
+            ok = run_remote(args.url, jobs, batch_id, out, args.workers, args.model_concurrency)
+        else:
+            ok = asyncio.run(run_local(jobs, batch_id, out, args.workers, args.model_concurrency))
+    finally:
+        if args.output:
+            out.close()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+In-process notifications for completed consultations.
+TaskManagers publish here once a plan has been saved, so derived views such as
+analytics can update immediately instead of waiting for the next database sync.
+Subscribers may do disk I/O, so when published from the event loop they run in
+a worker thread after the request has moved on.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Callable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConsultationSaved:
+    """A consultation whose plan has been written to consultation_data."""
+    consultation_type: str
+    consultation_id: Optional[int]
+    context: Dict[str, Any]
+    conversation_history: List[Dict[str, Any]] = field(default_factory=list)
+    plan: str = ""
+    session_id: Optional[str] = None
+    facts: Dict[str, Any] = field(default_factory=dict)
+
+
+_subscribers: List[Callable[[ConsultationSaved], None]] = []
+# Dispatches in flight, referenced so they aren't garbage collected before they finish
+_dispatches: Set["asyncio.Task"] = set()
+
+
+def subscribe(callback: Callable[[ConsultationSaved], None]) -> None:
+    """Register a callback run for every saved consultation (in a worker thread when published from the event loop)."""
+    _subscribers.append(callback)
+
+
+def _notify(event: ConsultationSaved) -> None:
+    for callback in _subscribers:
+        try:
+            callback(event)
+        except Exception as e:
+            logger.error(f"Consultation event subscriber {getattr(callback, '__name__', callback)} failed: {e}")
+
+
+def publish_consultation_saved(event: ConsultationSaved) -> None:
+    """
+    Notify subscribers; a failing subscriber never affects the request that
+    saved the plan. From the event loop this returns at once and subscribers
+    run in a worker thread; elsewhere (CLI tools) they run before it returns.
+    """
+    if not _subscribers:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _notify(event)
+        return
+    task = loop.create_task(asyncio.to_thread(_notify, event))
+    _dispatches.add(task)
+    task.add_done_callback(_dispatches.discard)
@@ -0,0 +1,248 @@
+"""
+Per-turn structured answer extraction for Riley consultations.
+Each user turn is matched to the stage question it answers. Rating, ranking
+and capacity answers are parsed into typed fields (regex first, with a small
+LLM call only when parsing fails) and other answers are kept as short text.
+Facts are stored per session so plan generation can work from them instead
+of the full transcript, and are persisted as one row per consultation.
+
+Supabase table (one row per consultation):
+    consultation_facts(consultation_id bigint primary key, email text,
+                       consultation_type text, facts jsonb, created_at timestamptz)
+
+Environment:
+    ANSWER_EXTRACTION_LLM     "0" to disable the LLM fallback (default: enabled)
+    ANSWER_EXTRACTION_MODEL   LiteLLM model for the fallback (default: gemini/gemini-2.5-flash)
+"""
+
+import os
+import re
+import json
+import time
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from common.circuit_breaker import CircuitOpenError, get_breaker
+from common.local_state import connect
+from common.supabase_client import get_supabase_client
+from .answer_extraction import ANSWER_LABELS, CAPACITY_FIELDS, parse_answer, question_kind
+
+logger = logging.getLogger(__name__)
+
+FACTS_DB = "session_facts.sqlite3"
+MAX_TEXT_ANSWER = 600
+
+
+class SessionFactStore:
+    """SQLite store of extracted facts per (persona, session)."""
+
+    def __init__(self, filename: str = FACTS_DB):
+        self.conn = connect(filename)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS session_facts (
+                persona TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                facts TEXT NOT NULL,
+                plan_generated INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (persona, session_id)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get(self, persona: str, session_id: str) -> Dict[str, Any]:
+        row = self.conn.execute(
+            "SELECT facts FROM session_facts WHERE persona = ? AND session_id = ?", (persona, session_id)
+        ).fetchone()
+        return json.loads(row["facts"]) if row else {}
+
+    def save(self, persona: str, session_id: str, facts: Dict[str, Any]) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO session_facts (persona, session_id, facts, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (persona, session_id) DO UPDATE SET facts = excluded.facts, updated_at = excluded.updated_at",
+                (persona, session_id, json.dumps(facts), time.time()),
+            )
+
+    def plan_generated(self, persona: str, session_id: str) -> bool:
+        row = self.conn.execute(
+            "SELECT plan_generated FROM session_facts WHERE persona = ? AND session_id = ?", (persona, session_id)
+        ).fetchone()
+        return bool(row and row["plan_generated"])
+
+    def mark_plan_generated(self, persona: str, session_id: str) -> None:
+        with self.conn:
+            self.conn.execute(
+                "UPDATE session_facts SET plan_generated = 1 WHERE persona = ? AND session_id = ?", (persona, session_id)
+            )
+
+
+_store: Optional[SessionFactStore] = None
+
+
+def get_session_fact_store() -> SessionFactStore:
+    """Return the process-wide session fact store."""
+    global _store
+    if _store is None:
+        _store = SessionFactStore()
+    return _store
+
+
+def _validate(kind: str, values: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only known items with in-range numeric values from an LLM answer."""
+    valid: Dict[str, Any] = {}
+    labels = ANSWER_LABELS[kind]
+    for label, value in (values or {}).items():
+        if label not in labels:
+            continue
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            continue
+        if kind == "capacity":
+            if number >= 0:
+                valid[label] = number
+        elif 1 <= number <= 5:
+            valid[label] = int(number)
+    return valid
+
+
+async def llm_parse_answer(kind: str, question: str, answer: str) -> Dict[str, Any]:
+    """Ask a small model to map a free-text answer onto the question's items; {} on any failure."""
+    if os.getenv("ANSWER_EXTRACTION_LLM", "1") == "0" or os.getenv("MODEL_BACKEND", "").lower() == "stub":
+        return {}
+
+    model = os.getenv("ANSWER_EXTRACTION_MODEL", "gemini/gemini-2.5-flash")
+    if kind == "capacity":
+        instruction = f"Return a JSON object with any of the keys {CAPACITY_FIELDS} as numbers."
+    elif kind == "priority_ranks":
+        instruction = f"Return a JSON object mapping each ranked item (exact labels from {ANSWER_LABELS[kind]}) to its rank 1-5."
+    else:
+        instruction = f"Return a JSON object mapping each rated item (exact labels from {ANSWER_LABELS[kind]}) to its rating 1-5."
+
+    async def _call() -> str:
+        import litellm
+        response = await litellm.acompletion(
+            model=model,
+            messages=[
+                {"role": "system", "content": f"You extract structured survey answers. {instruction} Omit items the answer does not mention."},
+                {"role": "user", "content": f"Question:\n{question}\n\nAnswer:\n{answer}"},
+            ],
+            response_format={"type": "json_object"},
+            temperature=0,
+        )
+        return response.choices[0].message.content or "{}"
+
+    try:
+        content = await get_breaker(model).call(_call)
+        return _validate(kind, json.loads(content))
+    except CircuitOpenError:
+        return {}
+    except Exception as e:
+        logger.warning(f"LLM answer extraction failed for {kind}: {e}")
+        return {}
+
+
+class AnswerExtractor:
+    """Records the answer given on each turn against the stage question it responds to."""
+
+    def __init__(self, persona: str, question_patterns: List[str], store: Optional[SessionFactStore] = None):
+        self.persona = persona
+        self.question_patterns = question_patterns
+        self.store = store or get_session_fact_store()
+
+    def question_answered(self, question: str, facts: Dict[str, Any]) -> Optional[str]:
+        """
+        The stage question pattern an assistant message asks. Riley often recaps
+        an earlier topic before asking the next question, so the pattern that
+        appears last in the message wins; a pattern not answered yet breaks ties.
+        """
+        lowered = question.lower()
+        found = [(lowered.rfind(p), p not in facts, p) for p in self.question_patterns if p in lowered]
+        return max(found)[2] if found else None
+
+    def missing(self, facts: Dict[str, Any]) -> List[str]:
+        """Stage question patterns with no recorded answer."""
+        return [p for p in self.question_patterns if p not in facts]
+
+    def _answered_question(self, history: List[Dict[str, Any]]) -> Optional[str]:
+        """Return the last assistant message in the history, which the current message answers."""
+        for msg in reversed(history or []):
+            if msg.get("sender") == "ai":
+                return msg.get("message", "")
+        return None
+
+    async def record_turn(self, session_id: str, history: List[Dict[str, Any]], message: str) -> Dict[str, Any]:
+        """Extract the answer in ``message`` (if it answers a stage question) and return the session's facts."""
+        facts = self.store.get(self.persona, session_id)
+        question = self._answered_question(history)
+        if not question or not message.strip():
+            return facts
+
+        pattern = self.question_answered(question, facts)
+        if pattern is None:
+            return facts
+
+        kind = question_kind(question)
+        if kind:
+            parsed = parse_answer(kind, message)
+            source = "parsed"
+            if not parsed:
+                parsed = await llm_parse_answer(kind, question, message)
+                source = "llm"
+            facts[pattern] = {"kind": kind, "value": parsed, "source": source if parsed else "unparsed", "text": message[:MAX_TEXT_ANSWER]}
+        else:
+            facts[pattern] = {"kind": "text", "text": message[:MAX_TEXT_ANSWER]}
+
+        self.store.save(self.persona, session_id, facts)
+        return facts
+
+    def plan_generated(self, session_id: str) -> bool:
+        return self.store.plan_generated(self.persona, session_id)
+
+    def mark_plan_generated(self, session_id: str) -> None:
+        self.store.mark_plan_generated(self.persona, session_id)
+
+
+def structured_answers(facts: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Return the typed answers in a fact set keyed by answer kind (as analytics stores them)."""
+    return {
+        fact["kind"]: fact["value"]
+        for fact in facts.values()
+        if fact.get("kind") in ANSWER_LABELS and fact.get("value")
+    }
+
+
+def format_facts(facts: Dict[str, Any]) -> str:
+    """Render facts as a compact prompt section, one line per answered question."""
+    lines = []
+    for pattern, fact in facts.items():
+        value = fact.get("value")
+        if value:
+            rendered = "; ".join(f"{label}: {v:g}" if isinstance(v, float) else f"{label}: {v}" for label, v in value.items())
+        else:
+            rendered = re.sub(r"\s+", " ", fact.get("text", "")).strip()
+        lines.append(f"- {pattern}: {rendered}")
+    return "\n".join(lines)
+
+
+def persist_consultation_facts(consultation_id: Any, context: Dict[str, Any], consultation_type: str, facts: Dict[str, Any]) -> bool:
+    """Upsert the consultation's facts as a single consultation_facts row."""
+    try:
+        supabase = get_supabase_client()
+        if not supabase:
+            return False
+        supabase.table("consultation_facts").upsert({
+            "consultation_id": consultation_id,
+            "email": context.get("email", ""),
+            "consultation_type": consultation_type,
+            "facts": facts,
+            "created_at": datetime.utcnow().isoformat(),
+        }).execute()
+        return True
+    except Exception as e:
+        logger.error(f"Error saving consultation facts for consultation {consultation_id}: {e}")
+        return False
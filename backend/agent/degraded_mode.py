@@ -0,0 +1,195 @@
+"""
+Degraded-mode responses used while a model endpoint's circuit breaker is open.
+Scripted questions come from the local stage definitions and the questionnaire
+registry so consultations keep moving; plan generation is queued for later.
+"""
+
+import re
+import logging
+from typing import Dict, Any, List, Optional
+
+from common.plan_queue import get_plan_queue
+
+from .questionnaires import get_questionnaire_registry
+
+logger = logging.getLogger(__name__)
+
+# Scripted wording for each ConsultationStageTracker question pattern.
+# Every question contains its pattern so the tracker advances on the next turn.
+RILEY_SCRIPTED_QUESTIONS = {
+    "years have you been in your current position": "How many years have you been in your current position?",
+    "years with tafe nsw": "How many years with TAFE NSW have you had overall?",
+    "direct reports": "Do you have any direct reports? If so, how many?",
+    "internal stakeholders": "Who are the key internal stakeholders you work with most regularly?",
+    "external stakeholders": "What about external stakeholders - who do you collaborate with outside TAFE NSW?",
+    "familiar are you with the performance metrics": (
+        "How familiar are you with the performance metrics for your area?\n"
+        "1. Very familiar - I track these regularly\n"
+        "2. Somewhat familiar - I see them occasionally\n"
+        "3. Limited familiarity - I don't usually see detailed metrics\n"
+        "4. Not familiar - This would be new information for me"
+    ),
+    "additional data would be helpful": "What additional data would be helpful for you in your role?",
+    "rate the following challenges": (
+        "Please rate the following challenges in your area on a scale of 1-5 (1 = Not a problem, 5 = Major problem):\n"
+        "- Staff recruitment/retention\n- Student recruitment/retention\n- Industry placement capacity\n"
+        "- Equipment/technology adequacy\n- Facility capacity/condition\n- Curriculum relevance\n"
+        "- Regulatory compliance\n- Funding/budget constraints\n- Industry partnerships\n- Student support services"
+    ),
+    "top 3 operational challenges": "What are the top 3 operational challenges keeping you awake at night?",
+    "ideal world": "In your ideal world, what would your discipline/teaching area/programs look like in 3-5 years?",
+    "rank your top 5 investment priorities": (
+        "If you had additional resources, please rank your top 5 investment priorities (1 = highest priority):\n"
+        "- Additional teaching staff\n- Professional development for existing staff\n- New/upgraded equipment\n"
+        "- Facility improvements/expansion\n- Technology infrastructure\n- Student support services\n"
+        "- Industry partnership development\n- Marketing/student recruitment\n- Curriculum development/refresh\n"
+        "- Assessment development/refresh\n- Quality assurance/compliance systems\n- Research and innovation capabilities"
+    ),
+    "biggest opportunities for growth": "Where do you see the biggest opportunities for growth in your area?",
+    "current student capacity": (
+        "To the best of your knowledge, could you provide:\n"
+        "- Current student capacity in your area\n- Maximum potential capacity\n- Current utilisation rate (if known)"
+    ),
+    "prevents you from operating at full capacity": "What prevents you from operating at full capacity?",
+    "additional resources would you need": "To achieve your strategic priorities, what additional resources would you need?",
+    "rate your level of concern about these potential risks": (
+        "Please rate your level of concern about these potential risks (1 = Low concern, 5 = High concern):\n"
+        "- Loss of key staff\n- Declining student enrolments\n- Changes to government funding\n"
+        "- New regulatory requirements\n- Technology becoming obsolete\n- Loss of industry partnerships\n"
+        "- Increased competition\n- Economic downturn impact\n- Workplace health & safety issues\n- Reputation/quality concerns"
+    ),
+    "specific risks are you most concerned": "What specific risks are you most concerned about for your area?",
+    "needs to be in place for a strategic roadmap": "What needs to be in place for a strategic roadmap to be successful in your area?",
+    "industry trends or changes": "What industry trends or changes should we be aware of that might impact your area?",
+    "innovative approaches or best practices": "Are there any innovative approaches or best practices from other institutions that interest you?",
+    "anything else you'd like us to know": "Is there anything else you'd like us to know?",
+}
+
+PLAN_DEFERRED_MESSAGE = (
+    "Thank you - I have everything I need. Our analysis service is busy right now, so your plan "
+    "will be generated shortly and saved to your consultation record. You don't need to stay on this page."
+)
+
+COMPLETED_MESSAGE = "Thank you for completing the survey - your responses have been recorded."
+
+UNAVAILABLE_MESSAGE = (
+    "Sorry, I'm having trouble reaching our analysis service at the moment. "
+    "Your responses so far are safe - please try again in a few minutes."
+)
+
+
+# A request or offer to produce the persona's deliverable ("generate my capacity plan", "shall I prepare the risk register?")
+_PLAN_REQUEST = re.compile(
+    r"\b(?:generate|prepare|create|produce|put together|draft|compile|write up|finali[sz]e)\b[^.?!]*"
+    r"\b(?:plan|report|summary|assessment|analysis|recommendations|roadmap|register|matrix)\b",
+    re.IGNORECASE,
+)
+_DECLINE = re.compile(r"^\s*(?:no|not yet|wait|hold on|before (?:you|that))\b", re.IGNORECASE)
+
+
+def requests_plan(message: str, history: List[Dict]) -> bool:
+    """
+    Whether a turn would have the persona produce its plan: the user asks for
+    it, or agrees when the persona's last message offered it. Only such turns
+    are worth queueing; any other reply would be thrown away on replay.
+    """
+    if _PLAN_REQUEST.search(message or "") and not _DECLINE.match(message or ""):
+        return True
+    last_ai = next((msg for msg in reversed(history or []) if msg.get("sender") == "ai"), None)
+    offered = last_ai is not None and _PLAN_REQUEST.search(last_ai.get("message", "") or "")
+    return bool(offered) and not _DECLINE.match(message or "")
+
+
+def _degraded_data(**extra: Any) -> Dict[str, Any]:
+    data = {"degraded": True}
+    data.update(extra)
+    return data
+
+
+def queue_plan(persona: str, message: str, context: Dict[str, Any], session_id: str) -> bool:
+    """Queue plan generation for later if the plan can be saved against a user."""
+    if not context or not context.get("email"):
+        return False
+    try:
+        get_plan_queue().enqueue(persona, message, context, session_id)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to queue deferred plan for {persona}: {e}")
+        return False
+
+
+def riley_fallback(message: str, context: Dict[str, Any], session_id: str, stage_analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Serve Riley's next scripted question, or queue the plan once all questions are answered."""
+    stage = stage_analysis["stage"]
+
+    if stage == "strategic_analysis":
+        queued = queue_plan("run", message, context, session_id)
+        return {
+            "message": PLAN_DEFERRED_MESSAGE if queued else UNAVAILABLE_MESSAGE,
+            "status": "success",
+            "session_id": session_id,
+            "data": _degraded_data(conversation_stage=stage, progress=stage_analysis["progress"], plan_queued=queued),
+        }
+
+    if stage == "consultation_complete":
+        text = "Thank you for your time and input today - it's been a pleasure."
+    else:
+        remaining = stage_analysis.get("questions_remaining") or []
+        text = RILEY_SCRIPTED_QUESTIONS.get(remaining[0], UNAVAILABLE_MESSAGE) if remaining else UNAVAILABLE_MESSAGE
+        if stage == "initial_engagement":
+            name = (context or {}).get("name", "there")
+            text = f"G'day {name}! I'm Riley, your strategic consultant. Let's start with your background:\n\n{text}"
+
+    return {
+        "message": text,
+        "status": "success",
+        "session_id": session_id,
+        "data": _degraded_data(
+            conversation_stage=stage,
+            progress=stage_analysis["progress"],
+            next_action=stage_analysis["next_action"],
+            stage_description=stage_analysis.get("stage_description", ""),
+        ),
+    }
+
+
+def questionnaire_fallback(questionnaire: Any, history: List[Dict], session_id: str, message: Optional[str] = None) -> Dict[str, Any]:
+    """Serve the next scripted question of a persona's questionnaire, following its branching rules on the answers so far."""
+    question = questionnaire.next_question(history, message)
+    text = COMPLETED_MESSAGE if question is None else questionnaire.scripted_message(question)
+    return {
+        "message": text,
+        "status": "success",
+        "session_id": session_id,
+        "plan_saved": False,
+        "consultation_id": None,
+        "data": _degraded_data(plan_generated=False, plan_saved=False, questionnaire=questionnaire.name),
+    }
+
+
+def delivery_staff_fallback(history: List[Dict], session_id: str, message: Optional[str] = None) -> Dict[str, Any]:
+    """Serve the next delivery staff question straight from the local question bank."""
+    return questionnaire_fallback(get_questionnaire_registry().get("delivery_staff"), history, session_id, message)
+
+
+def plan_persona_fallback(persona: str, message: str, context: Dict[str, Any], session_id: str) -> Dict[str, Any]:
+    """
+    Personas driven by a questionnaire keep asking its questions once the
+    question being answered is found in the conversation. Otherwise a turn
+    asking for the plan is queued for generation once the model is back, and
+    any other turn is held: the user is asked to continue in a few minutes.
+    """
+    questionnaire = get_questionnaire_registry().for_persona(persona)
+    history = (context or {}).get("conversationHistory", [])
+    if (questionnaire is not None and questionnaire.current_question_id(history) is not None
+            and questionnaire.next_question(history, message) is not None):
+        return questionnaire_fallback(questionnaire, history, session_id, message)
+    queued = requests_plan(message, history) and queue_plan(persona, message, context, session_id)
+    return {
+        "message": PLAN_DEFERRED_MESSAGE if queued else UNAVAILABLE_MESSAGE,
+        "status": "success",
+        "session_id": session_id,
+        "plan_saved": False,
+        "consultation_id": None,
+        "data": _degraded_data(plan_generated=False, plan_saved=False, plan_queued=queued),
+    }
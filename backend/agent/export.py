@@ -0,0 +1,328 @@
+"""
+Streaming export of consultations for reporting.
+Pages through consultation_data and chat_history with keyset pagination
+(``id > last_id ORDER BY id``), joins each page of consultations to its chat
+messages, and writes CSV, JSONL or Parquet one page at a time, so memory stays
+bounded by the page size however many consultations there are.
+
+Incremental exports keep a named watermark (the last exported consultation id)
+in the local state directory and only export consultations added since.
+
+Environment:
+    EXPORT_PAGE_SIZE   Consultations fetched per page (default: 500)
+"""
+
+import io
+import os
+import csv
+import json
+import time
+import logging
+from typing import Dict, Any, List, Optional, Iterator, Iterable, Tuple
+
+from common.local_state import connect
+from common.supabase_client import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DB = "exports.sqlite3"
+FORMATS = ("csv", "jsonl", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+# PostgREST returns at most 1000 rows per request
+CHAT_PAGE_SIZE = 1000
+
+CONSULTATION_COLUMNS = ["id", "created_at", "consultation_type", "email", "name", "role", "department", "plan"]
+MESSAGE_COLUMNS = ["message_id", "message_order", "sender", "message", "message_created_at"]
+INTEGER_COLUMNS = {"id", "message_id", "message_order", "message_count"}
+
+
+class ExportWatermarks:
+    """Last exported consultation id per named incremental export."""
+
+    def __init__(self, filename: str = EXPORT_DB):
+        self.conn = connect(filename)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS export_watermarks (
+                name TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                exported_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get(self, name: str) -> int:
+        row = self.conn.execute("SELECT last_id FROM export_watermarks WHERE name = ?", (name,)).fetchone()
+        return row["last_id"] if row else 0
+
+    def set(self, name: str, last_id: int, rows: int) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO export_watermarks (name, last_id, rows, exported_at) VALUES (?, ?, ?, ?)",
+                (name, last_id, rows, time.time()),
+            )
+
+
+def iter_consultation_pages(supabase: Any, since_id: int = 0, page_size: Optional[int] = None,
+                            consultation_type: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Yield pages of consultation_data rows with id > since_id, in id order."""
+    page_size = page_size or int(os.getenv("EXPORT_PAGE_SIZE", "500"))
+    last_id = since_id
+    while True:
+        query = supabase.table("consultation_data").select(", ".join(CONSULTATION_COLUMNS)).gt("id", last_id)
+        if consultation_type:
+            query = query.eq("consultation_type", consultation_type)
+        rows = query.order("id").limit(page_size).execute().data
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]["id"]
+        if len(rows) < page_size:
+            return
+
+
+def fetch_messages(supabase: Any, consultation_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """Return the chat messages of a page of consultations, keyed by consultation id and in message order."""
+    messages: Dict[int, List[Dict[str, Any]]] = {}
+    if not consultation_ids:
+        return messages
+    last_id = 0
+    while True:
+        chunk = (
+            supabase.table("chat_history")
+            .select("id, consultation_id, sender, message, message_order, created_at")
+            .in_("consultation_id", consultation_ids)
+            .gt("id", last_id)
+            .order("id")
+            .limit(CHAT_PAGE_SIZE)
+            .execute()
+            .data
+        )
+        for message in chunk:
+            messages.setdefault(message["consultation_id"], []).append(message)
+        if len(chunk) < CHAT_PAGE_SIZE:
+            break
+        last_id = chunk[-1]["id"]
+    for transcript in messages.values():
+        transcript.sort(key=lambda m: m.get("message_order") or 0)
+    return messages
+
+
+def iter_export_pages(supabase: Any, since_id: int = 0, rows: str = "consultations",
+                      consultation_type: Optional[str] = None, include_plan: bool = True,
+                      page_size: Optional[int] = None) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Yield (last consultation id, records) for each page of consultations.
+
+    ``rows="consultations"`` gives one record per consultation with its
+    transcript nested; ``rows="messages"`` gives one record per chat message
+    with the consultation's columns repeated.
+    """
+    for page in iter_consultation_pages(supabase, since_id, page_size, consultation_type):
+        messages = fetch_messages(supabase, [row["id"] for row in page])
+        records = []
+        for consultation in page:
+            if not include_plan:
+                consultation = {k: v for k, v in consultation.items() if k != "plan"}
+            transcript = messages.get(consultation["id"], [])
+            if rows == "messages":
+                for message in transcript:
+                    records.append({
+                        **consultation,
+                        "message_id": message["id"],
+                        "message_order": message.get("message_order"),
+                        "sender": message.get("sender"),
+                        "message": message.get("message"),
+                        "message_created_at": message.get("created_at"),
+                    })
+            else:
+                records.append({
+                    **consultation,
+                    "message_count": len(transcript),
+                    "transcript": [
+                        {"sender": m.get("sender"), "message": m.get("message"), "created_at": m.get("created_at")}
+                        for m in transcript
+                    ],
+                })
+        yield page[-1]["id"], records
+
+
+def export_columns(rows: str, include_plan: bool = True) -> List[str]:
+    columns = [c for c in CONSULTATION_COLUMNS if include_plan or c != "plan"]
+    return columns + (MESSAGE_COLUMNS if rows == "messages" else ["message_count", "transcript"])
+
+
+def _flat(record: Dict[str, Any]) -> Dict[str, Any]:
+    """CSV and Parquet cells are scalars, so the nested transcript is stored as a JSON string."""
+    if isinstance(record.get("transcript"), list):
+        return {**record, "transcript": json.dumps(record["transcript"])}
+    return record
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever has been written since the last drain."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def encode_pages(pages: Iterable[List[Dict[str, Any]]], fmt: str, columns: List[str]) -> Iterator[bytes]:
+    """Encode pages of records as a byte stream in the given format, one chunk per page."""
+    if fmt == "jsonl":
+        for page in pages:
+            yield "".join(json.dumps(record, default=str) + "\n" for record in page).encode()
+    elif fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for page in pages:
+            writer.writerows(_flat(record) for record in page)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    elif fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+        # A fixed schema (ids and counts as integers, the rest as strings) keeps row groups consistent
+        schema = pa.schema([(c, pa.int64() if c in INTEGER_COLUMNS else pa.string()) for c in columns])
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema)
+        try:
+            for page in pages:
+                if page:
+                    # One row group per page: only the current page is ever held in Arrow memory
+                    flat = [_flat(record) for record in page]
+                    table = pa.Table.from_pydict(
+                        {
+                            c: [r.get(c) if c in INTEGER_COLUMNS or r.get(c) is None else str(r[c]) for r in flat]
+                            for c in columns
+                        },
+                        schema=schema,
+                    )
+                    writer.write_table(table)
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+    else:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of {', '.join(FORMATS)}")
+
+
+class Export:
+    """One export run; tracks the highest consultation id written so the watermark can advance."""
+
+    def __init__(self, fmt: str = "jsonl", rows: str = "consultations", since_id: int = 0,
+                 incremental: Optional[str] = None, consultation_type: Optional[str] = None,
+                 include_plan: bool = True, page_size: Optional[int] = None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}', expected one of {', '.join(FORMATS)}")
+        if rows not in ("consultations", "messages"):
+            raise ValueError("rows must be 'consultations' or 'messages'")
+        self.fmt = fmt
+        self.rows = rows
+        self.incremental = incremental
+        self.consultation_type = consultation_type
+        self.include_plan = include_plan
+        self.page_size = page_size
+        self.watermarks = ExportWatermarks() if incremental else None
+        self.since_id = max(since_id, self.watermarks.get(incremental)) if incremental else since_id
+        self.last_id = self.since_id
+        self.consultations = 0
+        self.records = 0
+
+    def _tracked(self, pages: Iterable[Tuple[int, List[Dict[str, Any]]]]) -> Iterator[List[Dict[str, Any]]]:
+        for last_id, records in pages:
+            self.last_id = max(self.last_id, last_id)
+            self.consultations += len({record["id"] for record in records})
+            self.records += len(records)
+            yield records
+
+    def stream(self) -> Iterator[bytes]:
+        """Yield the encoded export; the watermark only advances once the whole export has been produced."""
+        supabase = get_supabase_client()
+        if not supabase:
+            raise RuntimeError("Supabase is not configured")
+        pages = iter_export_pages(
+            supabase, self.since_id, self.rows, self.consultation_type, self.include_plan, self.page_size
+        )
+        yield from encode_pages(self._tracked(pages), self.fmt, export_columns(self.rows, self.include_plan))
+        if self.incremental:
+            self.watermarks.set(self.incremental, self.last_id, self.records)
+        logger.info(
+            f"Exported {self.consultations} consultations ({self.records} {self.rows} rows) as {self.fmt}, "
+            f"ids {self.since_id + 1}..{self.last_id}"
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "format": self.fmt,
+            "rows": self.rows,
+            "since_id": self.since_id,
+            "last_id": self.last_id,
+            "consultations": self.consultations,
+            "records": self.records,
+        }
+
+
+def create_export_router():
+    """Return the /export router, which streams an export in the requested format."""
+    from fastapi import APIRouter, HTTPException, Query
+    from fastapi.responses import StreamingResponse
+
+    router = APIRouter(tags=["export"])
+
+    @router.get("/export")
+    def export(format: str = Query("jsonl", description="csv, jsonl or parquet"),
+               rows: str = Query("consultations", description="'consultations' (transcript nested) or 'messages'"),
+               since_id: int = Query(0, description="Only consultations with a greater id"),
+               incremental: Optional[str] = Query(None, description="Named watermark to resume from and advance"),
+               consultation_type: Optional[str] = None,
+               include_plan: bool = True):
+        """Stream consultations and their chat history; the last record's id is the next since_id."""
+        if not get_supabase_client():
+            raise HTTPException(status_code=503, detail="Supabase is not configured")
+        try:
+            job = Export(format, rows, since_id, incremental, consultation_type, include_plan)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        filename = f"consultations-{rows}-{int(time.time())}.{format}"
+        # A plain generator: Starlette iterates it in a worker thread, so the blocking
+        # Supabase calls never run on the event loop
+        return StreamingResponse(
+            job.stream(),
+            media_type=MEDIA_TYPES[format],
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}"',
+                "X-Export-Since-Id": str(job.since_id),
+            },
+        )
+
+    return router
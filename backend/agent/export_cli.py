@@ -0,0 +1,72 @@
+"""
+Command-line export of consultations and their chat history.
+Streams consultation_data joined to chat_history into CSV, JSONL or Parquet
+with bounded memory; see agent.export for the paging details.
+
+Usage (from the backend directory):
+    python -m agent.export_cli --format parquet --output consultations.parquet
+    python -m agent.export_cli --format csv --rows messages --output messages.csv
+    python -m agent.export_cli --incremental nightly --output delta.jsonl
+
+With --incremental NAME, only consultations added since the last successful
+run of NAME are exported, and the watermark advances once the file is complete.
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from .export import Export, FORMATS
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export consultations and chat history")
+    parser.add_argument("--format", choices=FORMATS, help="Output format (default: from the output extension, else jsonl)")
+    parser.add_argument("--rows", choices=["consultations", "messages"], default="consultations",
+                        help="One row per consultation (transcript nested) or per chat message")
+    parser.add_argument("--output", help="Output file (default: stdout; required for parquet)")
+    parser.add_argument("--since-id", type=int, default=0, help="Only consultations with a greater id")
+    parser.add_argument("--incremental", help="Named watermark to resume from and advance")
+    parser.add_argument("--consultation-type", help="Only this consultation type, e.g. risk_assessment")
+    parser.add_argument("--no-plan", action="store_true", help="Leave the plan text out of the export")
+    parser.add_argument("--page-size", type=int, help="Consultations fetched per page")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'), override=True)
+
+    fmt = args.format
+    if not fmt:
+        extension = os.path.splitext(args.output or "")[1].lstrip(".")
+        fmt = extension if extension in FORMATS else "jsonl"
+    if fmt == "parquet" and not args.output:
+        parser.error("--output is required for parquet")
+
+    job = Export(fmt, args.rows, args.since_id, args.incremental, args.consultation_type,
+                 not args.no_plan, args.page_size)
+    # Write to a temporary file first so a failed export never leaves a truncated output behind
+    if args.output:
+        partial = f"{args.output}.partial"
+        with open(partial, "wb") as out:
+            for chunk in job.stream():
+                out.write(chunk)
+        os.replace(partial, args.output)
+    else:
+        out = sys.stdout.buffer
+        for chunk in job.stream():
+            out.write(chunk)
+            out.flush()
+
+    print(json.dumps(job.summary()), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
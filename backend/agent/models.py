@@ -0,0 +1,28 @@
+"""
+Model selection for the persona agents.
+Agents ask for their production model by name; MODEL_BACKEND=stub swaps in the
+offline stub model so the server can be exercised without calling Gemini.
+"""
+
+import os
+from typing import Any
+
+
+def agent_model(name: str, lite_llm: bool = False, script: str = "consultation") -> Any:
+    """
+    Return the model to give an ADK Agent.
+
+    Args:
+        name: Production model name, e.g. "gemini-2.5-flash"
+        lite_llm: Wrap the model in LiteLlm (as Riley does)
+        script: Stub behaviour when MODEL_BACKEND=stub ("consultation" or "survey")
+    """
+    if os.getenv("MODEL_BACKEND", "").lower() == "stub":
+        from .stub_model import StubLlm
+        return StubLlm(model=f"stub/{name.split('/')[-1]}", script=script)
+
+    if lite_llm:
+        # litellm is slow to import, so only pay for it when an agent needs it
+        from google.adk.models.lite_llm import LiteLlm
+        return LiteLlm(name)
+    return name
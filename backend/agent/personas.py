@@ -0,0 +1,215 @@
+"""
+Persona registry for the consultation server.
+Each persona (Riley, Morgan, Alex, Jordan, Josh, Riva) is described once here and
+its agent, Runner and session services are only built on the first request,
+or during an optional background warm-up.
+"""
+
+import asyncio
+import importlib
+import logging
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List
+
+from common.plan_queue import supersede_plan_job
+from common.session_checkpoint import restore_sessions
+from common.startup_timing import startup_timer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PersonaSpec:
+    """Static description of a persona and where its agent and TaskManager live."""
+    route: str
+    agent_name: str
+    description: str
+    agent_module: str
+    agent_attr: str
+    task_manager_module: str
+    task_manager_class: str
+    consultation_type: str
+    version: str = "1.0.0"
+
+
+PERSONAS: Dict[str, PersonaSpec] = {
+    spec.route: spec
+    for spec in [
+        PersonaSpec(
+            route="run",
+            agent_name="riley_strategic_consultant",
+            description="Riley - A strategic consultant AI specialized in priority discovery and strategic planning for TAFE NSW departments.",
+            agent_module=".agent",
+            agent_attr="root_agent",
+            task_manager_module=".task_manager",
+            task_manager_class="TaskManager",
+            consultation_type="priority_discovery",
+        ),
+        PersonaSpec(
+            route="capacity_agent",
+            agent_name="morgan_capacity_analyst",
+            description="Morgan - A capacity analyst AI specialised in evaluating staffing, resources, and workflow efficiency for organisational departments.",
+            agent_module=".agent",
+            agent_attr="capacity_agent",
+            task_manager_module=".task_manager",
+            task_manager_class="TaskManager_CapacityAgent",
+            consultation_type="capacity_assessment",
+        ),
+        PersonaSpec(
+            route="risk_agent",
+            agent_name="alex_risk_analyst",
+            description="Alex - A Risk analyst AI specialized in evaluating staffing, resources, and workflow efficiency for organizational departments.",
+            agent_module=".agent",
+            agent_attr="risk_agent",
+            task_manager_module=".task_manager",
+            task_manager_class="TaskManager_RiskAgent",
+            consultation_type="risk_register",
+        ),
+        PersonaSpec(
+            route="engagement_agent",
+            agent_name="jordan_engagement_planner",
+            description="Jordan - A Engagement Planner AI specialized in evaluating staffing, resources, and workflow efficiency for organizational departments.",
+            agent_module=".agent",
+            agent_attr="engagement_agent",
+            task_manager_module=".task_manager",
+            task_manager_class="TaskManager_EngagementAgent",
+            consultation_type="engagement_planning",
+        ),
+        PersonaSpec(
+            route="external_stakeholder_agent",
+            agent_name="external_stakeholder_agent",
+            description="Agent for managing external stakeholder engagement",
+            agent_module=".agent",
+            agent_attr="external_stakeholder_agent",
+            task_manager_module=".task_manager",
+            task_manager_class="TaskManager_ExternalStakeholderAgent",
+            consultation_type="external_stakeholder",
+        ),
+        PersonaSpec(
+            route="delivery_staff_agent",
+            agent_name="delivery_staff_agent",
+            description="Agent for managing delivery staff engagement - presents one question at a time",
+            agent_module=".agent_delivery_staff",
+            agent_attr="delivery_staff_agent",
+            task_manager_module=".task_manager_delivery_staff",
+            task_manager_class="TaskManager_DeliveryStaffAgent",
+            consultation_type="delivery_staff",
+        ),
+    ]
+}
+
+
+class LazyTaskManager:
+    """
+    Stand-in for a persona's TaskManager that builds the real one on first use.
+
+    Exposes the same ``process_task`` coroutine, so the A2A server and background
+    jobs can hold it without knowing whether the persona has been built yet.
+    """
+
+    def __init__(self, spec: PersonaSpec):
+        self.spec = spec
+        self.instance: Optional[Any] = None
+        self.build_error: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.instance is not None
+
+    def _build(self) -> Any:
+        with startup_timer.measure(f"persona:{self.spec.route}:agent"):
+            agent_module = importlib.import_module(self.spec.agent_module, package=__package__)
+            agent = getattr(agent_module, self.spec.agent_attr)
+        with startup_timer.measure(f"persona:{self.spec.route}:task_manager"):
+            task_manager_module = importlib.import_module(self.spec.task_manager_module, package=__package__)
+            task_manager_class = getattr(task_manager_module, self.spec.task_manager_class)
+            return task_manager_class(agent=agent)
+
+    async def get(self) -> Any:
+        """Return the TaskManager, building it off the event loop on first call."""
+        if self.instance is not None:
+            return self.instance
+        async with self._lock:
+            if self.instance is None:
+                try:
+                    instance = await asyncio.to_thread(self._build)
+                    self.build_error = None
+                except Exception as e:
+                    self.build_error = f"{type(e).__name__}: {e}"
+                    raise
+                # Sessions checkpointed by the previous instance at shutdown. Published only
+                # afterwards, so the unlocked fast path above never sees a half-restored persona
+                if hasattr(instance, "session_service"):
+                    await restore_sessions(self.spec.route, instance.session_service)
+                self.instance = instance
+                logger.info(f"Persona '{self.spec.route}' initialised on demand")
+        return self.instance
+
+    async def process_task(self, message: str, context: Dict[str, Any] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+        task_manager = await self.get()
+        result = await task_manager.process_task(message, context, session_id)
+        if result.get("status") == "success" and not (result.get("data") or {}).get("degraded"):
+            # A plan parked for this session while the model was down is now out of date
+            await supersede_plan_job(self.spec.route, result.get("session_id") or session_id)
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        # Delegate other attributes (e.g. ``runner``) only once built, so
+        # hasattr() checks never force construction
+        instance = self.__dict__.get("instance")
+        if instance is None:
+            raise AttributeError(name)
+        return getattr(instance, name)
+
+
+class PersonaRegistry:
+    """Holds one LazyTaskManager per persona route."""
+
+    def __init__(self, specs: Dict[str, PersonaSpec] = None):
+        self.specs = specs or PERSONAS
+        self.task_managers: Dict[str, LazyTaskManager] = {
+            route: LazyTaskManager(spec) for route, spec in self.specs.items()
+        }
+
+    def get(self, route: str) -> LazyTaskManager:
+        return self.task_managers[route]
+
+    def routes(self) -> List[str]:
+        return list(self.task_managers.keys())
+
+    async def warm_up(self, routes: Optional[List[str]] = None) -> None:
+        """Build the given personas (all if None) one at a time in the background."""
+        for route in self.routes() if routes is None else routes:
+            if route not in self.task_managers:
+                logger.warning(f"Unknown persona '{route}' in warm-up list")
+                continue
+            try:
+                await self.task_managers[route].get()
+            except Exception as e:
+                logger.error(f"Warm-up failed for persona '{route}': {e}")
+        startup_timer.log_report()
+
+    def session_services(self) -> Dict[str, Any]:
+        """Session services of the personas built so far, by route."""
+        return {
+            route: tm.instance.session_service
+            for route, tm in self.task_managers.items()
+            if tm.ready and hasattr(tm.instance, "session_service")
+        }
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            route: {"ready": tm.ready, "error": tm.build_error}
+            for route, tm in self.task_managers.items()
+        }
+
+
+def warm_up_routes(setting: str) -> Optional[List[str]]:
+    """Parse WARMUP_PERSONAS: empty for none, 'all' for every persona, or a comma list."""
+    setting = (setting or "").strip()
+    if not setting:
+        return []
+    if setting.lower() == "all":
+        return None
+    return [route.strip() for route in setting.split(",") if route.strip()]
@@ -0,0 +1,193 @@
+"""
+Branching rules for questionnaires.
+Questions may carry conditions on earlier answers, compiled once when the
+questionnaire is loaded and evaluated locally when choosing the next question:
+
+    "showIf": <condition>                          ask only when true; otherwise skip it
+    "skipTo": [{"if": <condition>, "to": "<id>"}]  once answered, jump ahead to the first matching target
+    "endIf": <condition>                           once answered, end the questionnaire when true
+
+A condition tests one earlier answer, or combines others:
+
+    {"question": "43", "equals": "Don't know"}     the answer is (or selects) this option
+    {"question": "57", "in": ["Miller", "Padstow"]}
+    {"question": "13", "contains": "placement"}    case-insensitive substring of the answer
+    {"question": "13", "matches": "^no\\b"}         case-insensitive regular expression
+    {"question": "6", "lt": 1}                     first number in the answer ("none"/"no" count as 0); also lte, gt, gte
+    {"question": "46", "answered": true}
+    {"all": [...]}, {"any": [...]}, {"not": {...}}
+
+Answers are matched against the referenced question's options the way the
+option tallies read them: by option wording, or by 1-based option number. A
+condition on a question that hasn't been answered is false (except
+"answered": false). Skips only move forward, so a questionnaire always ends.
+"""
+
+import re
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+Condition = Callable[[Dict[str, str]], bool]
+
+_COMPARISONS = {
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+}
+_NONE_WORDS = re.compile(r"^(?:no|none|nil|zero|nobody|not any)\b")
+# An answer made only of option numbers: "2", "1, 3 and 4"
+_OPTION_NUMBERS = re.compile(r"(?:\d+|\s+|[,;&]|\band\b)+")
+
+
+def _normalise(text: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9&%+ ]", " ", str(text).lower())).strip()
+
+
+def _number(answer: str) -> Optional[float]:
+    match = re.search(r"-?\d+(?:\.\d+)?", answer.replace(",", ""))
+    if match:
+        return float(match.group())
+    return 0.0 if _NONE_WORDS.match(_normalise(answer)) else None
+
+
+class _OptionMatcher:
+    """Which of a question's options an answer selects."""
+
+    def __init__(self, options: List[str]):
+        self.options = [_normalise(o) for o in options if o.strip()]
+        # Longest first, so "Not applicable to my role" is taken before any option inside it
+        self._order = sorted(range(len(self.options)), key=lambda i: -len(self.options[i]))
+
+    def selected(self, answer: str) -> List[str]:
+        normalised = _normalise(answer)
+        chosen = []
+        for index in self._order:
+            option = self.options[index]
+            if option and re.search(rf"(?<![a-z0-9]){re.escape(option)}(?![a-z0-9])", normalised):
+                chosen.append(option)
+                normalised = normalised.replace(option, " ")
+        if not chosen and _OPTION_NUMBERS.fullmatch(normalised):
+            chosen = [self.options[int(d) - 1] for d in re.findall(r"\d+", normalised) if 0 < int(d) <= len(self.options)]
+        # Free-text questions, or an answer naming none of the options, match on the whole answer
+        return chosen or [_normalise(answer)]
+
+
+def compile_condition(spec: Any, options: Dict[str, List[str]]) -> Condition:
+    """
+    Compile a condition into a function of {question id: answer text}.
+
+    Args:
+        spec: The condition as written in the questionnaire
+        options: Option lists by question id, for matching answers to options
+
+    Raises:
+        ValueError: For an unknown operator or a reference to a question that doesn't exist
+    """
+    if not isinstance(spec, dict):
+        raise ValueError(f"Condition must be an object, got {spec!r}")
+    if "all" in spec or "any" in spec:
+        combine = all if "all" in spec else any
+        parts = [compile_condition(part, options) for part in spec["all" if "all" in spec else "any"]]
+        return lambda answers: combine(part(answers) for part in parts)
+    if "not" in spec:
+        inner = compile_condition(spec["not"], options)
+        return lambda answers: not inner(answers)
+
+    question_id = str(spec.get("question", ""))
+    if question_id not in options:
+        raise ValueError(f"Condition refers to unknown question {question_id!r}")
+    operators = [key for key in spec if key != "question"]
+    if len(operators) != 1:
+        raise ValueError(f"Condition on question {question_id} needs exactly one operator, got {operators}")
+    operator, value = operators[0], spec[operators[0]]
+
+    if operator == "answered":
+        expected = bool(value)
+        return lambda answers: bool((answers.get(question_id) or "").strip()) == expected
+
+    if operator in ("equals", "in"):
+        matcher = _OptionMatcher(options[question_id])
+        wanted = {_normalise(v) for v in (value if operator == "in" else [value])}
+
+        def test(answer: str) -> bool:
+            return bool(wanted.intersection(matcher.selected(answer)))
+    elif operator == "contains":
+        needle = _normalise(value)
+
+        def test(answer: str) -> bool:
+            return needle in _normalise(answer)
+    elif operator == "matches":
+        pattern = re.compile(value, re.IGNORECASE)
+
+        def test(answer: str) -> bool:
+            return pattern.search(answer.strip()) is not None
+    elif operator in _COMPARISONS:
+        compare, limit = _COMPARISONS[operator], float(value)
+
+        def test(answer: str) -> bool:
+            number = _number(answer)
+            return number is not None and compare(number, limit)
+    else:
+        raise ValueError(f"Unknown condition operator {operator!r} on question {question_id}")
+
+    def condition(answers: Dict[str, str]) -> bool:
+        answer = answers.get(question_id)
+        return bool(answer and answer.strip()) and test(answer)
+
+    return condition
+
+
+class QuestionRules:
+    """The compiled showIf/skipTo/endIf rules of one questionnaire, and the next-question walk over them."""
+
+    def __init__(self, questions: List[Dict[str, Any]]):
+        self.ids = [q["id"] for q in questions]
+        self.position = {question_id: index for index, question_id in enumerate(self.ids)}
+        options = {q["id"]: list(q.get("options") or []) for q in questions}
+        self.show_if: Dict[str, Condition] = {}
+        self.skip_to: Dict[str, List[Tuple[Condition, str]]] = {}
+        self.end_if: Dict[str, Condition] = {}
+        for q in questions:
+            question_id = q["id"]
+            if "showIf" in q:
+                self.show_if[question_id] = compile_condition(q["showIf"], options)
+            if "endIf" in q:
+                self.end_if[question_id] = compile_condition(q["endIf"], options)
+            for rule in q.get("skipTo", []):
+                target = str(rule.get("to", ""))
+                if self.position.get(target, -1) <= self.position[question_id]:
+                    raise ValueError(f"Question {question_id} skips to {target!r}, which is not a later question")
+                self.skip_to.setdefault(question_id, []).append((compile_condition(rule.get("if"), options), target))
+
+    def __bool__(self) -> bool:
+        return bool(self.show_if or self.skip_to or self.end_if)
+
+    def _first_shown(self, index: int, answers: Dict[str, str]) -> Optional[int]:
+        while index < len(self.ids):
+            show = self.show_if.get(self.ids[index])
+            if show is None or show(answers):
+                return index
+            index += 1
+        return None
+
+    def first(self, answers: Dict[str, str]) -> Optional[int]:
+        """Index of the first question to ask."""
+        return self._first_shown(0, answers)
+
+    def next_after(self, question_id: str, answers: Dict[str, str]) -> Optional[int]:
+        """Index of the question to ask after ``question_id``, or None when the questionnaire is over."""
+        index = self.position.get(question_id)
+        if index is None:
+            return None
+        end = self.end_if.get(question_id)
+        if end is not None and end(answers):
+            return None
+        following = index + 1
+        for condition, target in self.skip_to.get(question_id, []):
+            if condition(answers):
+                following = self.position[target]
+                break
+        return self._first_shown(following, answers)
+
+    def summary(self) -> Dict[str, int]:
+        return {"show_if": len(self.show_if), "skip_to": len(self.skip_to), "end_if": len(self.end_if)}
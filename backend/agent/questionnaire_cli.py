@@ -0,0 +1,239 @@
+"""
+Convert a Word question set (.docx) into a questionnaire file.
+Reads word/document.xml straight from the .docx archive and recognises the
+layouts used by the question sets in the repository root:
+
+- "Section N: ..." and "N.N ..." paragraphs are headings, recorded on the
+  questions that follow them
+- a numbered paragraph, or an unnumbered one worded as a question, starts a
+  question; "Label: ____" fill-ins become open questions
+- "[ ]" checkboxes, deeper list levels and list paragraphs under an
+  unnumbered question are its options ("Other: ____" becomes "Other")
+- a table of "[ ]" cells is a matrix question: one sub-question per row with
+  the header cells as options
+- "(Select all that apply)" makes a multi-select question, and "top N" or
+  "select up to N" caps the selections
+- respondent details above the first section ("Name:", "Email:") are a
+  form header rather than survey questions and are left out (the personas
+  have them from the request context); a question repeated word for word
+  with the same options is kept once
+
+The result usually wants a read-through before it drives a persona. The
+committed riley.json and industry.json are exactly what the commands below
+produce; re-run them after changing the converter or the documents.
+
+Set 2 is not converted: Set 2.docx holds only the eight per-campus questions,
+and the full delivery staff set (from the Set 2 PDF) is curated by hand in
+delivery_staff.json, whose ids key stored survey answers.
+
+Usage (from the backend directory):
+    python -m agent.questionnaire_cli "../Set 1- Riley.docx" --name riley
+    python -m agent.questionnaire_cli "../Set 3 - Industry.docx" --name industry --title "HWHS Industry Survey"
+"""
+
+import os
+import re
+import sys
+import json
+import logging
+import zipfile
+import argparse
+import xml.etree.ElementTree as ET
+from typing import Dict, Any, List, Optional
+
+from .questionnaires import QUESTIONS_DIR
+
+logger = logging.getLogger(__name__)
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+_SECTION = re.compile(r"^Section\s+\d+[a-z]?\s*[:.-]", re.IGNORECASE)
+_SUBSECTION = re.compile(r"^\d+\.\d+\s+\S")
+_CHECKBOX = re.compile(r"^\s*(\[\s*\]|☐|□)\s*")
+_FILL_IN = re.compile(r"_{3,}")
+_MULTI = re.compile(r"select all|tick all|all that apply", re.IGNORECASE)
+_LIMIT = re.compile(r"\b(?:top|select up to|up to)\s+(\d+)\b", re.IGNORECASE)
+_RESPONDENT_DETAIL = re.compile(r"^(?:(?:full |first |last )?name|e-?mail(?: address)?|phone|mobile)$", re.IGNORECASE)
+
+
+def _text(element: ET.Element) -> str:
+    return "".join(t.text or "" for t in element.iter(f"{W}t")).strip()
+
+
+def _list_level(paragraph: ET.Element) -> Optional[int]:
+    level = paragraph.find(f"{W}pPr/{W}numPr/{W}ilvl")
+    return int(level.get(f"{W}val")) if level is not None else None
+
+
+def _style(paragraph: ET.Element) -> Optional[str]:
+    style = paragraph.find(f"{W}pPr/{W}pStyle")
+    return style.get(f"{W}val") if style is not None else None
+
+
+def _fill_in_label(text: str) -> str:
+    """ "Current capacity: ____ students" -> "Current capacity (students)" """
+    parts = [part.strip() for part in _FILL_IN.split(text)]
+    label = parts[0].rstrip(":").strip()
+    after = " ".join(part for part in parts[1:] if part)
+    return f"{label} ({after})" if after else label
+
+
+def _option(text: str) -> str:
+    text = _CHECKBOX.sub("", text)
+    return _fill_in_label(text) if _FILL_IN.search(text) else text.strip()
+
+
+def _looks_like_question(text: str) -> bool:
+    return text.endswith("?") or text.endswith(":") or "(select" in text.lower() or bool(_FILL_IN.search(text))
+
+
+def _matrix(question: str, table: ET.Element) -> Optional[Dict[str, Any]]:
+    rows = [[_text(cell) for cell in row.iter(f"{W}tc")] for row in table.iter(f"{W}tr")]
+    if len(rows) < 2 or len(rows[0]) < 2:
+        return None
+    options = [cell for cell in rows[0][1:] if cell]
+    sub_questions = [{"title": row[0], "options": list(options)} for row in rows[1:] if row and row[0]]
+    return {"question": question, "type": "matrix", "subQuestions": sub_questions}
+
+
+def convert(path: str) -> Dict[str, Any]:
+    """Parse a .docx question set into {"title": ..., "questions": [...]} with ids in document order."""
+    with zipfile.ZipFile(path) as docx:
+        body = ET.fromstring(docx.read("word/document.xml")).find(f"{W}body")
+
+    title = ""
+    section = topic = None
+    questions: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    # List level of the paragraph that started the current question (None when unnumbered)
+    current_level: Optional[int] = None
+
+    def start(question: Dict[str, Any], level: Optional[int], style: Optional[str]) -> None:
+        nonlocal current, current_level
+        previous = questions[-1] if questions else None
+        # "Please indicate:" before a numbered question introduces it rather than asking anything
+        if (previous is not None and previous is current and level is not None and previous.get("_level") is None
+                and not previous.get("options") and not previous.get("subQuestions")
+                and previous["question"].endswith(":") and not previous.get("_fill_in")):
+            questions.pop()
+        question.update({"section": section, "topic": topic, "_level": level, "_style": style})
+        questions.append(question)
+        current, current_level = question, level
+
+    for element in body:
+        if element.tag == f"{W}tbl":
+            # The paragraph before a rating table is the table's question
+            if current is not None and not current.get("options") and not current.get("subQuestions"):
+                matrix = _matrix(current["question"], element)
+                if matrix:
+                    current.update(matrix)
+            continue
+        if element.tag != f"{W}p":
+            continue
+        text = _text(element)
+        if not text:
+            continue
+        # The first paragraph names the set, unless it's already a question (Set 2)
+        title = title or text
+        if _SECTION.match(text):
+            section, topic, current = text, None, None
+            continue
+        if _SUBSECTION.match(text):
+            topic, current = text, None
+            continue
+
+        level = _list_level(element)
+        style = _style(element)
+        is_option = current is not None and (
+            bool(_CHECKBOX.match(text))
+            or (level is not None and current_level is not None and level > current_level)
+            or (style == "ListParagraph" and current_level is None)
+            # Items listed at the question's own level, under a list-styled question
+            or (style == "ListParagraph" and current["_style"] == "ListParagraph" and level == current_level
+                and _looks_like_question(current["question"]) and not _looks_like_question(text))
+            # A trailing "Not relevant to my role" after the checkboxes
+            or (current.get("options") and level == current.get("_option_level") and not _looks_like_question(text))
+        )
+        if is_option:
+            current.setdefault("options", []).append(_option(text))
+            current.setdefault("_option_level", level)
+            continue
+
+        if _FILL_IN.search(text):
+            start({"question": _fill_in_label(text), "_fill_in": True}, level, style)
+        else:
+            start({"question": text}, level, style)
+
+    result = []
+    seen = set()
+    for question in questions:
+        worded = question.get("options") or question.get("subQuestions") or question.get("_fill_in") or question.get("_level") is not None
+        if not worded and not _looks_like_question(question["question"]):
+            # Notes and headings between questions (completion time, confidentiality, faculty name)
+            continue
+        if (question.get("section") is None and not question.get("options")
+                and _RESPONDENT_DETAIL.match(question["question"].rstrip(": "))):
+            continue
+        signature = json.dumps([question["question"], question.get("options"), question.get("subQuestions")])
+        if signature in seen:
+            logger.info(f"Skipping repeated question: {question['question'][:60]}")
+            continue
+        seen.add(signature)
+        spec: Dict[str, Any] = {"id": str(len(result) + 1), "question": question["question"]}
+        if question.get("subQuestions"):
+            spec.update(type="matrix", subQuestions=question["subQuestions"])
+        elif question.get("options"):
+            spec["options"] = question["options"]
+            limit = _LIMIT.search(question["question"])
+            if _MULTI.search(question["question"]) or limit:
+                spec["type"] = "multi"
+                if limit:
+                    spec["maxSelections"] = int(limit.group(1))
+            else:
+                spec["type"] = "single"
+        else:
+            spec["type"] = "open"
+        if question.get("section"):
+            spec["section"] = question["section"]
+        if question.get("topic"):
+            spec["topic"] = question["topic"]
+        result.append(spec)
+    return {"title": title, "questions": result}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert a .docx question set into a questionnaire JSON file")
+    parser.add_argument("docx", help="The Word question set")
+    parser.add_argument("--name", required=True, help="Questionnaire id, also the file name in the questions directory")
+    parser.add_argument("--title", help="Title (default: the document's first paragraph)")
+    parser.add_argument("--persona", action="append", default=[], help="Persona route the questionnaire drives (repeatable)")
+    parser.add_argument("--id-tags", action="store_true", help="Tag served questions with ID[n]")
+    parser.add_argument("--output", help=f"Output file (default: {os.path.relpath(QUESTIONS_DIR)}/<name>.json)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    converted = convert(args.docx)
+    questionnaire = {
+        "id": args.name,
+        "title": args.title or converted["title"],
+        "source": os.path.basename(args.docx),
+        "personas": args.persona,
+        "idTags": args.id_tags,
+        "questions": converted["questions"],
+    }
+    output = args.output or os.path.join(QUESTIONS_DIR, f"{args.name}.json")
+    with open(output + ".partial", "w", encoding="utf-8") as f:
+        json.dump(questionnaire, f, indent=4, ensure_ascii=False)
+        f.write("\n")
+    os.replace(output + ".partial", output)
+
+    types: Dict[str, int] = {}
+    for question in converted["questions"]:
+        types[question["type"]] = types.get(question["type"], 0) + 1
+    print(json.dumps({"output": output, "questions": len(converted["questions"]), "types": types}), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+Questionnaire registry.
+Every questions/*.json file is a questionnaire: a list of questions plus an
+optional id, title and the persona routes it drives. All files are loaded
+once per process and compiled into lookups (question by id, branching rules,
+and a pattern matching any question's wording in an agent message), so
+serving the next scripted question is a dictionary lookup rather than a file
+read and a scan.
+
+A persona listed under "personas" is driven by that questionnaire: when its
+model is unavailable, degraded mode asks the next question from the file
+instead of holding the conversation. Questionnaires with "idTags" true tag
+each question with ID[n], as the delivery staff agent does; the others are
+followed by matching the question wording in the conversation, so only list
+a persona whose prompt asks the questions in the file's own words.
+
+Questions can be skipped or the questionnaire ended early on earlier
+answers; see agent.question_rules for the showIf/skipTo/endIf schema. The
+rules are compiled with the questionnaire, and a file with an invalid rule is
+not loaded.
+
+New questionnaires can be converted from the Word question sets with
+agent.questionnaire_cli.
+"""
+
+import os
+import re
+import json
+import glob
+import threading
+import logging
+from typing import Dict, Any, List, Optional
+
+from .question_rules import QuestionRules
+
+logger = logging.getLogger(__name__)
+
+QUESTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions")
+
+_ID_TAG = re.compile(r"ID\[(\d+)\]")
+
+
+def _normalise(text: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9&%+ ]", " ", str(text).lower())).strip()
+
+
+def format_question(question: Dict[str, Any]) -> Optional[str]:
+    """Format a question object for presentation by an agent"""
+    if not question:
+        return None
+
+    # Handle matrix-style questions
+    if question.get('type') == 'matrix':
+        formatted = f"Question: {question['question']}\n\n"
+
+        for sub_q in question.get('subQuestions', []):
+            formatted += f"For {sub_q['title']}:\n"
+            formatted += "Options:\n"
+            for option in sub_q['options']:
+                formatted += f"- {option}\n"
+            formatted += "\n"
+
+        return formatted.strip()
+
+    # Handle regular questions
+    formatted = f"Question: {question['question']}\n"
+
+    if question.get('options') and len(question['options']) > 0:
+        formatted += "Options:\n"
+        for option in question['options']:
+            if option.strip():  # Skip empty options
+                formatted += f"- {option}\n"
+
+    return formatted.strip()
+
+
+class Questionnaire:
+    """One question set, with its questions indexed by id, position and wording."""
+
+    def __init__(self, name: str, data: Dict[str, Any]):
+        self.name = data.get("id") or name
+        self.title = data.get("title", "")
+        self.personas: List[str] = list(data.get("personas", []))
+        self.id_tags = bool(data.get("idTags", False))
+        # The file as loaded, for callers that read the raw question list
+        self.data = data
+        # Questions without an id can't be tagged or looked up, so they are never served
+        self.questions: List[Dict[str, Any]] = [
+            {**q, "id": str(q["id"])} for q in data.get("questions", []) if str(q.get("id") or "")
+        ]
+        self.ids = [q["id"] for q in self.questions]
+        self.by_id = {q["id"]: q for q in self.questions}
+        wording = {_normalise(q["question"]): q["id"] for q in self.questions if _normalise(q.get("question", ""))}
+        self._by_wording = wording
+        # Longest wording first, so a question that contains another's wording wins
+        self._wording_pattern = re.compile(
+            "|".join(re.escape(w) for w in sorted(wording, key=len, reverse=True))
+        ) if wording else None
+        self.rules = QuestionRules(self.questions)
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def get(self, question_id: Any) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(str(question_id))
+
+    def first(self, answers: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+        """The first question whose showIf holds."""
+        index = self.rules.first(answers or {})
+        return None if index is None else self.questions[index]
+
+    def next_after(self, question_id: Any, answers: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        The question to ask after ``question_id`` given the answers so far:
+        the following question in file order unless a skipTo applies, passing
+        over questions whose showIf fails. None when an endIf holds, after the
+        last question, or for an unknown id.
+        """
+        index = self.rules.next_after(str(question_id), answers or {})
+        return None if index is None else self.questions[index]
+
+    def question_in(self, message: str) -> Optional[str]:
+        """The id of the question an agent message asks: its last ID[n] tag, else the last question worded in it."""
+        message = message or ""
+        if self.id_tags:
+            tags = _ID_TAG.findall(message)
+            if tags:
+                return tags[-1]
+        if self._wording_pattern is None:
+            return None
+        matches = self._wording_pattern.findall(_normalise(message))
+        return self._by_wording[matches[-1]] if matches else None
+
+    def current_question_id(self, history: List[Dict[str, Any]]) -> Optional[str]:
+        """The question asked most recently in the conversation, if any."""
+        for msg in reversed(history or []):
+            if msg.get("sender") == "ai":
+                question_id = self.question_in(msg.get("message", ""))
+                if question_id is not None:
+                    return question_id
+        return None
+
+    def answers(self, history: List[Dict[str, Any]], message: Optional[str] = None) -> Dict[str, str]:
+        """
+        {question id: answer} from the conversation: the user message after an
+        agent message asking a question answers it, and ``message`` (the turn
+        being processed) answers the last question asked.
+        """
+        answers: Dict[str, str] = {}
+        pending = None
+        for msg in history or []:
+            if msg.get("sender") == "ai":
+                pending = self.question_in(msg.get("message", ""))
+            elif msg.get("sender") == "user" and pending is not None:
+                answers[pending] = msg.get("message", "") or ""
+                pending = None
+        if message is not None and pending is not None:
+            answers[pending] = message
+        return answers
+
+    def next_question(self, history: List[Dict[str, Any]], message: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The question to ask next given the conversation so far; None once the questionnaire is complete."""
+        answers = self.answers(history, message)
+        current_id = self.current_question_id(history)
+        if current_id is None:
+            return self.first(answers)
+        return self.next_after(current_id, answers)
+
+    def completes(self, history: List[Dict[str, Any]], message: Optional[str] = None) -> bool:
+        """True for the turn answering the last question the rules allow (not for later turns)."""
+        last_ai = next((msg for msg in reversed(history or []) if msg.get("sender") == "ai"), None)
+        if last_ai is None or self.question_in(last_ai.get("message", "")) is None:
+            return False
+        return self.next_question(history, message) is None
+
+    def scripted_message(self, question: Dict[str, Any]) -> str:
+        """The agent message asking ``question``, tagged with its id when the questionnaire uses tags."""
+        text = format_question(question)
+        return f"{text}\n\nID[{question['id']}]" if self.id_tags else text
+
+    def prompt_listing(self) -> str:
+        """Every question on a line or two, for embedding the whole set in an agent instruction."""
+        lines = []
+        for q in self.questions:
+            kind = q.get("type") or ("choice" if q.get("options") else "open")
+            lines.append(f"ID[{q['id']}] ({kind}) {q['question']}")
+            if q.get("subQuestions"):
+                scales = {tuple(o for o in sub.get("options", []) if o.strip()) for sub in q["subQuestions"]}
+                if len(scales) == 1:
+                    # One rating scale for every row: list it once
+                    lines.append("    Options for each: " + " | ".join(scales.pop()))
+                    lines.append("    For: " + " | ".join(sub["title"] for sub in q["subQuestions"]))
+                else:
+                    for sub in q["subQuestions"]:
+                        options = " | ".join(o for o in sub.get("options", []) if o.strip())
+                        lines.append(f"    {sub['title']}: {options}")
+            elif q.get("options"):
+                lines.append("    Options: " + " | ".join(o for o in q["options"] if o.strip()))
+            if q.get("maxSelections"):
+                lines.append(f"    Select up to {q['maxSelections']}")
+        return "\n".join(lines)
+
+    def summary(self) -> Dict[str, Any]:
+        return {"id": self.name, "title": self.title, "personas": self.personas, "questions": len(self), "rules": self.rules.summary()}
+
+
+class QuestionnaireRegistry:
+    """Every questionnaire in the questions directory, loaded on first use."""
+
+    def __init__(self, directory: str = QUESTIONS_DIR):
+        self.directory = directory
+        self._questionnaires: Optional[Dict[str, Questionnaire]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Questionnaire]:
+        questionnaires = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+            name = os.path.splitext(os.path.basename(path))[0]
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    questionnaire = Questionnaire(name, json.load(f))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.error(f"Skipping unreadable questionnaire {path}: {e}")
+                continue
+            questionnaires[questionnaire.name] = questionnaire
+        logger.info(f"Loaded {len(questionnaires)} questionnaires from {self.directory}")
+        return questionnaires
+
+    @property
+    def questionnaires(self) -> Dict[str, Questionnaire]:
+        if self._questionnaires is None:
+            with self._lock:
+                if self._questionnaires is None:
+                    self._questionnaires = self._load()
+        return self._questionnaires
+
+    def reload(self) -> None:
+        """Re-read the questions directory (e.g. after converting a new question set)."""
+        with self._lock:
+            self._questionnaires = self._load()
+
+    def get(self, name: str) -> Optional[Questionnaire]:
+        return self.questionnaires.get(name)
+
+    def for_persona(self, route: str) -> Optional[Questionnaire]:
+        """The questionnaire driving the persona at ``route``, if one lists it."""
+        for questionnaire in self.questionnaires.values():
+            if route in questionnaire.personas:
+                return questionnaire
+        return None
+
+    def all(self) -> List[Questionnaire]:
+        return list(self.questionnaires.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: q.summary() for name, q in self.questionnaires.items()}
+
+
+_registry: Optional[QuestionnaireRegistry] = None
+
+
+def get_questionnaire_registry() -> QuestionnaireRegistry:
+    """Return the process-wide questionnaire registry."""
+    global _registry
+    if _registry is None:
+        _registry = QuestionnaireRegistry()
+    return _registry
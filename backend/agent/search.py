@@ -0,0 +1,416 @@
+"""
+Local search over consultation transcripts and plans.
+Each consultation is indexed once into a SQLite FTS5 table in the local state
+directory (transcript and plan as separate documents), so keyword and phrase
+queries such as "industry placement" are answered from the inverted index in
+milliseconds without touching Supabase.
+
+Semantic search is optional: when SEARCH_EMBEDDING_MODEL is set, documents are
+embedded in the background by the sync loop and held in memory as a normalised
+NumPy matrix, searched by brute-force cosine similarity.
+
+Documents arrive from the same two sources as analytics: saved-consultation
+events from the TaskManagers, and a periodic keyset sync of consultations newer
+than the last indexed id (see agent.export for the paging).
+
+Environment:
+    SEARCH_SYNC_SECONDS      Interval between Supabase syncs and embedding passes (default: 300; 0 disables)
+    SEARCH_EMBEDDING_MODEL   LiteLLM embedding model, e.g. gemini/text-embedding-004 (default: unset, keyword only)
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from common.local_state import connect
+from common.supabase_client import get_supabase_client
+from .consultation_events import ConsultationSaved, subscribe
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DB = "search.sqlite3"
+MAX_EMBED_CHARS = 8000
+EMBED_BATCH_SIZE = 32
+QUERY_CACHE_SIZE = 256
+
+
+def _plain_text(plan: str) -> str:
+    """Strip HTML tags and collapse whitespace in a generated plan."""
+    return re.sub(r"\s+", " ", re.sub(r"<[^>]+>", " ", plan or "")).strip()
+
+
+def _transcript_text(history: List[Dict[str, Any]]) -> str:
+    return "\n".join(f"{m.get('sender', 'user')}: {m.get('message', '')}" for m in history or [])
+
+
+def _fts_query(query: str) -> str:
+    """
+    Turn user input into an FTS5 query: quoted phrases are kept, other words
+    are quoted individually (so punctuation can't break the syntax) and ANDed.
+    """
+    phrases = re.findall(r'"([^"]+)"', query)
+    rest = re.sub(r'"[^"]*"', " ", query)
+    terms = [f'"{p.strip()}"' for p in phrases if p.strip()]
+    terms += [f'"{word}"' for word in re.findall(r"\w+", rest)]
+    return " ".join(terms)
+
+
+class SearchIndex:
+    """FTS5 keyword index, plus an optional in-memory embedding matrix for semantic search."""
+
+    def __init__(self, filename: str = SEARCH_DB):
+        self.conn = connect(filename)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS search_documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                consultation_id INTEGER,
+                consultation_type TEXT,
+                department TEXT,
+                field TEXT NOT NULL,
+                created_at TEXT,
+                text TEXT NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+                text, content='search_documents', content_rowid='id', tokenize='porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+                INSERT INTO search_fts (rowid, text) VALUES (new.id, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+                INSERT INTO search_fts (search_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END;
+            CREATE TABLE IF NOT EXISTS search_embeddings (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id INTEGER NOT NULL UNIQUE,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS search_sync (
+                source TEXT PRIMARY KEY,
+                watermark INTEGER NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self._embedding_seq = 0
+        self._document_ids: List[int] = []
+        self._matrix = None
+        self._query_cache: "OrderedDict[str, Any]" = OrderedDict()
+
+    def index_consultation(self, consultation_id: Any, consultation_type: str, department: str,
+                           created_at: str, history: List[Dict[str, Any]], plan: str = "") -> int:
+        """Index (or re-index) a consultation's transcript and plan; returns the number of documents written."""
+        written = 0
+        with self.conn:
+            for field, text in (("transcript", _transcript_text(history)), ("plan", _plain_text(plan))):
+                if not text:
+                    continue
+                key = f"{consultation_type}:{consultation_id}:{field}"
+                # Delete then insert keeps the FTS index in step through the triggers
+                self.conn.execute(
+                    "DELETE FROM search_embeddings WHERE document_id IN (SELECT id FROM search_documents WHERE key = ?)", (key,)
+                )
+                self.conn.execute("DELETE FROM search_documents WHERE key = ?", (key,))
+                self.conn.execute(
+                    "INSERT INTO search_documents (key, consultation_id, consultation_type, department, field, created_at, text) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, consultation_id, consultation_type, department or "Unknown", field, created_at, text),
+                )
+                written += 1
+        return written
+
+    def index_event(self, event: ConsultationSaved) -> None:
+        """Consultation event subscriber: index a just-saved consultation."""
+        if event.consultation_id is None:
+            return
+        self.index_consultation(
+            event.consultation_id,
+            event.consultation_type,
+            event.context.get("department", ""),
+            time.strftime("%Y-%m-%dT%H:%M:%S"),
+            event.conversation_history,
+            event.plan,
+        )
+
+    def get_watermark(self, source: str) -> int:
+        row = self.conn.execute("SELECT watermark FROM search_sync WHERE source = ?", (source,)).fetchone()
+        return row["watermark"] if row else 0
+
+    def set_watermark(self, source: str, watermark: int) -> None:
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO search_sync (source, watermark) VALUES (?, ?)", (source, watermark))
+
+    def _filters(self, department: Optional[str], consultation_type: Optional[str],
+                 field: Optional[str]) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for column, value in (("department", department), ("consultation_type", consultation_type), ("field", field)):
+            if value:
+                clauses.append(f"d.{column} = ?")
+                params.append(value)
+        return "".join(f" AND {c}" for c in clauses), params
+
+    def keyword_search(self, query: str, limit: int = 20, department: Optional[str] = None,
+                       consultation_type: Optional[str] = None, field: Optional[str] = None) -> List[Dict[str, Any]]:
+        """BM25-ranked FTS5 matches with a highlighted snippet."""
+        match = _fts_query(query)
+        if not match:
+            return []
+        where, params = self._filters(department, consultation_type, field)
+        rows = self.conn.execute(
+            f"""
+            SELECT d.id, d.consultation_id, d.consultation_type, d.department, d.field, d.created_at,
+                   snippet(search_fts, 0, '<mark>', '</mark>', ' … ', 24) AS snippet,
+                   bm25(search_fts) AS rank
+            FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid
+            WHERE search_fts MATCH ?{where}
+            ORDER BY rank
+            LIMIT ?
+            """,
+            [match, *params, limit],
+        ).fetchall()
+        return [
+            {
+                "consultation_id": row["consultation_id"],
+                "consultation_type": row["consultation_type"],
+                "department": row["department"],
+                "field": row["field"],
+                "created_at": row["created_at"],
+                "snippet": row["snippet"],
+                "score": round(-row["rank"], 4),
+                "document_id": row["id"],
+            }
+            for row in rows
+        ]
+
+    def pending_embeddings(self, model: str, limit: int = EMBED_BATCH_SIZE) -> List[Any]:
+        return self.conn.execute(
+            "SELECT d.id, d.text FROM search_documents d LEFT JOIN search_embeddings e "
+            "ON e.document_id = d.id AND e.model = ? WHERE e.document_id IS NULL ORDER BY d.id LIMIT ?",
+            (model, limit),
+        ).fetchall()
+
+    def embed_pending(self, model: str) -> int:
+        """Embed documents that have no vector for ``model`` yet; returns how many were embedded."""
+        import numpy as np
+        import litellm
+
+        embedded = 0
+        while True:
+            rows = self.pending_embeddings(model)
+            if not rows:
+                return embedded
+            response = litellm.embedding(model=model, input=[row["text"][:MAX_EMBED_CHARS] for row in rows])
+            vectors = [item["embedding"] for item in response.data]
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO search_embeddings (document_id, model, vector) VALUES (?, ?, ?)",
+                    [
+                        (row["id"], model, np.asarray(vector, dtype=np.float32).tobytes())
+                        for row, vector in zip(rows, vectors)
+                    ],
+                )
+            embedded += len(rows)
+
+    def refresh_embeddings(self, model: str) -> int:
+        """Append vectors added since the last refresh to the in-memory matrix; returns how many."""
+        import numpy as np
+
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT seq, document_id, vector FROM search_embeddings WHERE seq > ? AND model = ? ORDER BY seq",
+                (self._embedding_seq, model),
+            ).fetchall()
+            if not rows:
+                return 0
+            vectors = np.vstack([np.frombuffer(row["vector"], dtype=np.float32) for row in rows])
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            self._matrix = vectors if self._matrix is None else np.vstack([self._matrix, vectors])
+            self._document_ids.extend(row["document_id"] for row in rows)
+            self._embedding_seq = rows[-1]["seq"]
+            return len(rows)
+
+    def _query_vector(self, model: str, query: str):
+        import numpy as np
+        import litellm
+
+        cached = self._query_cache.get(query)
+        if cached is not None:
+            self._query_cache.move_to_end(query)
+            return cached
+        vector = np.asarray(litellm.embedding(model=model, input=[query]).data[0]["embedding"], dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        self._query_cache[query] = vector
+        if len(self._query_cache) > QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+        return vector
+
+    def semantic_search(self, query: str, model: str, limit: int = 20, department: Optional[str] = None,
+                        consultation_type: Optional[str] = None, field: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Cosine-similarity matches against the in-memory embedding matrix."""
+        import numpy as np
+
+        self.refresh_embeddings(model)
+        if self._matrix is None:
+            return []
+        scores = self._matrix @ self._query_vector(model, query)
+        # Over-fetch so filtering by department/type/field still leaves ``limit`` results
+        candidates = np.argsort(-scores)[: limit * 5]
+        ids = [self._document_ids[i] for i in candidates]
+        where, params = self._filters(department, consultation_type, field)
+        rows = {
+            row["id"]: row
+            for row in self.conn.execute(
+                f"SELECT d.id, d.consultation_id, d.consultation_type, d.department, d.field, d.created_at, "
+                f"substr(d.text, 1, 240) AS snippet FROM search_documents d "
+                f"WHERE d.id IN ({','.join('?' * len(ids))}){where}",
+                [*ids, *params],
+            )
+        }
+        results = []
+        for index, document_id in zip(candidates, ids):
+            row = rows.get(document_id)
+            if row is None:
+                continue
+            results.append({
+                "consultation_id": row["consultation_id"],
+                "consultation_type": row["consultation_type"],
+                "department": row["department"],
+                "field": row["field"],
+                "created_at": row["created_at"],
+                "snippet": row["snippet"],
+                "score": round(float(scores[index]), 4),
+                "document_id": document_id,
+            })
+            if len(results) == limit:
+                break
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        documents = self.conn.execute("SELECT COUNT(*) FROM search_documents").fetchone()[0]
+        embeddings = self.conn.execute("SELECT COUNT(*) FROM search_embeddings").fetchone()[0]
+        return {"documents": documents, "embeddings": embeddings, "watermark": self.get_watermark("supabase")}
+
+
+def sync_from_supabase(page_size: int = 100) -> int:
+    """
+    Index consultations newer than the stored watermark; returns how many were indexed.
+
+    Runs off the event loop, so it writes through its own connection.
+    """
+    from .export import iter_export_pages
+
+    supabase = get_supabase_client()
+    if not supabase:
+        return 0
+    index = SearchIndex()
+    synced = 0
+    for last_id, records in iter_export_pages(supabase, index.get_watermark("supabase"), page_size=page_size):
+        for record in records:
+            index.index_consultation(
+                record["id"], record.get("consultation_type", ""), record.get("department", ""),
+                record.get("created_at", ""), record["transcript"], record.get("plan", ""),
+            )
+        index.set_watermark("supabase", last_id)
+        synced += len(records)
+    if synced:
+        logger.info(f"Search index: indexed {synced} consultations from Supabase")
+    return synced
+
+
+def _reciprocal_rank_fusion(*result_lists: List[Dict[str, Any]], limit: int, k: int = 60) -> List[Dict[str, Any]]:
+    """Merge ranked result lists by summing 1 / (k + rank) per document."""
+    merged: Dict[int, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results):
+            entry = merged.setdefault(result["document_id"], {**result, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank + 1)
+    ranked = sorted(merged.values(), key=lambda r: r["score"], reverse=True)[:limit]
+    for result in ranked:
+        result["score"] = round(result["score"], 5)
+    return ranked
+
+
+_index: Optional[SearchIndex] = None
+
+
+def get_search_index() -> SearchIndex:
+    """Return the process-wide search index."""
+    global _index
+    if _index is None:
+        _index = SearchIndex()
+    return _index
+
+
+def _on_consultation_saved(event: ConsultationSaved) -> None:
+    get_search_index().index_event(event)
+
+
+def create_search_router():
+    """Return the /search router and subscribe the index to saved consultations."""
+    from fastapi import APIRouter, HTTPException, Query
+
+    subscribe(_on_consultation_saved)
+    router = APIRouter(tags=["search"])
+
+    @router.get("/search")
+    async def search(q: str = Query(..., min_length=1, description='Words or "quoted phrases"'),
+                     mode: str = Query("keyword", description="keyword, semantic or hybrid"),
+                     department: Optional[str] = None,
+                     consultation_type: Optional[str] = None,
+                     field: Optional[str] = Query(None, description="transcript or plan"),
+                     limit: int = Query(20, ge=1, le=200)):
+        """Search consultation transcripts and plans."""
+        index = get_search_index()
+        filters = {"department": department, "consultation_type": consultation_type, "field": field}
+        started = time.perf_counter()
+        model = os.getenv("SEARCH_EMBEDDING_MODEL")
+        if mode in ("semantic", "hybrid") and not model:
+            raise HTTPException(status_code=400, detail="Semantic search is not enabled (set SEARCH_EMBEDDING_MODEL)")
+
+        if mode == "keyword":
+            results = index.keyword_search(q, limit, **filters)
+        elif mode == "semantic":
+            results = await asyncio.to_thread(index.semantic_search, q, model, limit, **filters)
+        elif mode == "hybrid":
+            semantic = await asyncio.to_thread(index.semantic_search, q, model, limit, **filters)
+            results = _reciprocal_rank_fusion(index.keyword_search(q, limit, **filters), semantic, limit=limit)
+        else:
+            raise HTTPException(status_code=400, detail="mode must be keyword, semantic or hybrid")
+
+        return {
+            "query": q,
+            "mode": mode,
+            "results": results,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    @router.get("/search/stats")
+    async def stats():
+        """Indexed document and embedding counts."""
+        return get_search_index().stats()
+
+    return router
+
+
+async def run_search_sync(interval: float) -> None:
+    """Periodically index new consultations from Supabase and embed pending documents."""
+    while True:
+        try:
+            await asyncio.to_thread(sync_from_supabase)
+            model = os.getenv("SEARCH_EMBEDDING_MODEL")
+            if model:
+                # Own connection: the embedding pass runs in a worker thread
+                embedded = await asyncio.to_thread(lambda: SearchIndex().embed_pending(model))
+                if embedded:
+                    logger.info(f"Search index: embedded {embedded} documents with {model}")
+        except Exception as e:
+            logger.error(f"Search sync failed: {e}")
+        await asyncio.sleep(interval)
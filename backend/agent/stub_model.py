@@ -0,0 +1,179 @@
+"""
+Deterministic stand-in for the Gemini models used by the persona agents.
+Lets the server, TaskManagers and benchmarks run offline: responses are canned
+but shaped like the real ones (questions ending in ID[n] for Riva, an HTML
+plan tagged [PLAN_GENERATED] once a consultation has enough turns), with a
+configurable latency distribution and optional token streaming.
+
+Environment:
+    MODEL_BACKEND             "stub" to use this model for every agent
+    STUB_LATENCY              Time to first token: "fixed:MS", "uniform:LO,HI",
+                              "normal:MEAN,SD" or "lognormal:MEDIAN,SIGMA" (default: lognormal:800,0.4)
+    STUB_TOKENS_PER_SECOND    Generation speed after the first token (default: 80; 0 = instant)
+    STUB_PLAN_AFTER_TURNS     User turns before consultation personas emit a plan (default: 8)
+    STUB_FAILURE_RATE         Probability a call raises, to exercise the circuit breaker (default: 0)
+    STUB_SEED                 Seed for latency and failure sampling (default: 0)
+"""
+
+import os
+import re
+import math
+import random
+import asyncio
+import logging
+from typing import AsyncGenerator, Callable, List
+
+from pydantic import PrivateAttr
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+CONSULTATION_QUESTIONS = [
+    "Thanks for that. Could you describe your department's key priorities for the next 12 months?",
+    "What are the biggest challenges your team is currently facing in delivering those priorities?",
+    "How would you describe your current staffing levels and capacity relative to demand?",
+    "Which stakeholders, internal or external, are most critical to your success?",
+    "What risks do you see that could prevent these priorities from being achieved?",
+    "How do you currently measure progress and success for your area?",
+    "What support or resources would make the biggest difference to your team?",
+    "Is there anything else about your department's context that I should understand?",
+]
+
+PLAN_TEMPLATE = """<h2>Executive Summary</h2>
+<p>Based on our consultation, the department has clear strategic priorities with identifiable capacity constraints and stakeholder dependencies.</p>
+<h2>Priority Analysis</h2>
+<ul>
+<li><strong>Priority 1:</strong> Strengthen delivery capacity in high-demand programs</li>
+<li><strong>Priority 2:</strong> Improve industry partnership and engagement</li>
+<li><strong>Priority 3:</strong> Modernise systems and reporting workflows</li>
+</ul>
+<h2>Risks and Mitigations</h2>
+<p>Key risks include <em>workforce availability</em>, <em>funding variability</em> and <em>change fatigue</em>; each is paired with a mitigation owner and review cadence.</p>
+<h2>Implementation Roadmap</h2>
+<h3>Year 1 Priorities</h3>
+<ul>
+<li>Q1-Q2: Foundation building activities</li>
+<li>Q3-Q4: Pilot initiatives and measure outcomes</li>
+</ul>
+<h2>Next Steps and Implementation</h2>
+<p>Immediate actions to commence strategic implementation across the {turns} areas discussed.</p>
+[PLAN_GENERATED]"""
+
+SURVEY_COMPLETE_REPLY = "Thank you for your time - that's the end of the survey, and your responses have been recorded."
+
+# The branching notes TaskManager_DeliveryStaffAgent appends to the survey prompt
+_NEXT_QUESTION_NOTE = re.compile(r"Next question: ID\[(\d+)\]")
+_COMPLETE_NOTE = "The survey is complete."
+
+INSIGHTS_TEMPLATE = """Key insights from the delivery staff consultation ({answers} responses):
+- Education delivery: staff report growing demand for flexible and blended delivery.
+- Workforce trends: recruitment of qualified teachers remains the main constraint.
+- Skills gaps: digital skills and industry currency are the most frequently cited needs.
+- Infrastructure: facilities and equipment upgrades are needed to match industry practice."""
+
+
+def latency_sampler(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Parse a STUB_LATENCY spec into a function returning seconds."""
+    kind, _, params = (spec or "lognormal:800,0.4").partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()]
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1]) / 1000
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(values[0], values[1])) / 1000
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: rng.lognormvariate(mu, values[1]) / 1000
+    raise ValueError(f"Unknown STUB_LATENCY distribution '{kind}'")
+
+
+class StubLlm(BaseLlm):
+    """
+    ADK model that returns canned persona-shaped responses.
+
+    ``script`` selects the behaviour: "consultation" asks a scripted question per
+    turn and emits a plan after enough user turns; "survey" asks the delivery
+    staff question named by the prompt's "Next question: ID[n]" note, as Riva is
+    instructed to.
+    """
+
+    script: str = "consultation"
+
+    _rng: random.Random = PrivateAttr()
+    _latency: Callable[[], float] = PrivateAttr()
+    _tokens_per_second: float = PrivateAttr()
+    _plan_after_turns: int = PrivateAttr()
+    _failure_rate: float = PrivateAttr()
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        return [r"stub/.*"]
+
+    def model_post_init(self, __context) -> None:
+        super().model_post_init(__context)
+        seed = int(os.getenv("STUB_SEED", "0"))
+        self._rng = random.Random(seed)
+        self._latency = latency_sampler(os.getenv("STUB_LATENCY", "lognormal:800,0.4"), self._rng)
+        self._tokens_per_second = float(os.getenv("STUB_TOKENS_PER_SECOND", "80"))
+        self._plan_after_turns = int(os.getenv("STUB_PLAN_AFTER_TURNS", "8"))
+        self._failure_rate = float(os.getenv("STUB_FAILURE_RATE", "0"))
+
+    @staticmethod
+    def _text(content: types.Content) -> str:
+        return "".join(part.text or "" for part in (content.parts or []))
+
+    def _consultation_reply(self, llm_request: LlmRequest) -> str:
+        user_turns = sum(1 for content in llm_request.contents if content.role == "user")
+        if user_turns >= self._plan_after_turns:
+            return PLAN_TEMPLATE.format(turns=user_turns)
+        return CONSULTATION_QUESTIONS[(user_turns - 1) % len(CONSULTATION_QUESTIONS)]
+
+    def _survey_reply(self, llm_request: LlmRequest) -> str:
+        from .agent_delivery_staff import delivery_staff_questionnaire
+
+        prompt = self._text(llm_request.contents[-1]) if llm_request.contents else ""
+        if prompt.startswith("Summarized Conversation"):
+            return INSIGHTS_TEMPLATE.format(answers=prompt.count("\nuser:"))
+        if prompt.rstrip().endswith(_COMPLETE_NOTE):
+            return SURVEY_COMPLETE_REPLY
+        questionnaire = delivery_staff_questionnaire()
+        notes = _NEXT_QUESTION_NOTE.findall(prompt)
+        if notes:
+            question = questionnaire.get(notes[-1])
+        else:
+            # No note (e.g. a direct agent call): continue after the last question asked in the session
+            asked = [n for content in llm_request.contents for n in re.findall(r"ID\[(\d+)\]", self._text(content))]
+            question = questionnaire.next_after(asked[-1]) if asked else questionnaire.first()
+        if question is None:
+            return SURVEY_COMPLETE_REPLY
+        return questionnaire.scripted_message(question)
+
+    def _response(self, text: str, partial: bool = False) -> LlmResponse:
+        return LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=text)]),
+            partial=partial,
+            turn_complete=not partial,
+        )
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(self._latency())
+        if self._failure_rate and self._rng.random() < self._failure_rate:
+            raise RuntimeError("Stub model injected failure")
+
+        text = self._survey_reply(llm_request) if self.script == "survey" else self._consultation_reply(llm_request)
+        tokens = re.findall(r"\S+\s*", text)
+        delay = 1 / self._tokens_per_second if self._tokens_per_second > 0 else 0
+
+        if stream:
+            for token in tokens:
+                if delay:
+                    await asyncio.sleep(delay)
+                yield self._response(token, partial=True)
+        elif delay:
+            await asyncio.sleep(delay * len(tokens))
+        yield self._response(text)
@@ -0,0 +1,94 @@
+"""
+HTTP endpoints and background refresh for delivery staff survey reporting:
+open-text themes and option tallies, plus the loaded questionnaires. Kept
+separate from both so the server only imports NumPy when survey reporting is
+first used.
+
+Environment:
+    SURVEY_THEMES_SECONDS   Interval between incremental theme refreshes (default: 3600; 0 disables)
+"""
+
+import asyncio
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+logger = logging.getLogger(__name__)
+
+
+def create_survey_router() -> APIRouter:
+    """Return the /survey router."""
+    router = APIRouter(prefix="/survey", tags=["survey"])
+
+    @router.get("/themes")
+    async def themes():
+        """Cached themes for every open question that has been clustered."""
+        from .survey_themes import SURVEY, ThemeStore
+        return {"survey": SURVEY, "questions": ThemeStore().all(SURVEY)}
+
+    @router.get("/themes/{question_id}")
+    async def question_themes(question_id: str):
+        """Cached themes for one open question."""
+        from .survey_themes import SURVEY, ThemeStore
+        result = ThemeStore().get(SURVEY, question_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"No themes computed for question {question_id}")
+        return result
+
+    @router.post("/themes/refresh")
+    async def refresh_themes(question: Optional[List[str]] = Query(None), force: bool = False):
+        """Re-cluster questions with new answers now (one labelling call per changed theme)."""
+        from .survey_themes import refresh_themes as refresh
+        refreshed = await refresh(question, force)
+        return {
+            "refreshed": [r["question_id"] for r in refreshed],
+            "llm_calls": sum(r["llm_calls"] for r in refreshed),
+        }
+
+    @router.get("/tallies")
+    async def tallies():
+        """Option counts for every single, multi-select and matrix question answered so far."""
+        from .survey_tallies import SURVEY, get_tally_engine
+        engine = get_tally_engine()
+        engine.refresh()
+        return {"survey": SURVEY, "respondents": engine.store.respondents(SURVEY), "questions": engine.all()}
+
+    @router.get("/tallies/{question_id}")
+    async def question_tallies(question_id: str):
+        """Option counts for one question (per sub-question for matrix questions)."""
+        from .survey_tallies import get_tally_engine
+        engine = get_tally_engine()
+        engine.refresh()
+        result = engine.question(question_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"Question {question_id} has no options to tally")
+        return result
+
+    @router.get("/questionnaires")
+    async def questionnaires():
+        """Every loaded questionnaire with the personas it drives."""
+        from .questionnaires import get_questionnaire_registry
+        return {"questionnaires": get_questionnaire_registry().stats()}
+
+    @router.get("/questionnaires/{name}")
+    async def questionnaire(name: str):
+        """One questionnaire's questions, as served to its personas."""
+        from .questionnaires import get_questionnaire_registry
+        found = get_questionnaire_registry().get(name)
+        if found is None:
+            raise HTTPException(status_code=404, detail=f"No questionnaire named {name}")
+        return {**found.summary(), "questions": found.questions}
+
+    return router
+
+
+async def run_survey_themes(interval: float) -> None:
+    """Periodically re-cluster open questions that received new answers."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            from .survey_themes import refresh_themes
+            await refresh_themes()
+        except Exception as e:
+            logger.error(f"Survey theme refresh failed: {e}")
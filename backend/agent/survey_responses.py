@@ -0,0 +1,107 @@
+"""
+Per-question answers to the delivery staff survey.
+Every agent message asks one question tagged ID[n], so the user message that
+follows is the answer to question n. Answers are recorded per (session,
+question) in a local SQLite table as they arrive, giving survey-level jobs
+(theme clustering, option tallies) one row per answer to read incrementally
+by sequence number instead of re-parsing transcripts.
+"""
+
+import re
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+from common.local_state import connect
+
+logger = logging.getLogger(__name__)
+
+RESPONSES_DB = "survey_responses.sqlite3"
+_QUESTION_ID = re.compile(r"ID\[(\d+)\]")
+
+
+def answered_question_id(history: List[Dict[str, Any]]) -> Optional[str]:
+    """Return the id of the question asked in the last agent message, if it carries one."""
+    for msg in reversed(history or []):
+        if msg.get("sender") == "ai":
+            ids = _QUESTION_ID.findall(msg.get("message", "") or "")
+            return ids[-1] if ids else None
+    return None
+
+
+class SurveyResponseStore:
+    """SQLite table of survey answers, one row per (session, question); re-answering replaces the row."""
+
+    def __init__(self, filename: str = RESPONSES_DB):
+        self.conn = connect(filename)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS survey_answers (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                survey TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                question_id TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                answered_at REAL NOT NULL,
+                UNIQUE (survey, session_id, question_id)
+            );
+            CREATE INDEX IF NOT EXISTS survey_answers_question ON survey_answers (survey, question_id);
+            """
+        )
+        self.conn.commit()
+
+    def record(self, survey: str, session_id: str, question_id: str, answer: str) -> None:
+        # REPLACE deletes the old row and inserts a new one, so a changed answer gets a new seq
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO survey_answers (survey, session_id, question_id, answer, answered_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (survey, session_id, question_id, answer, time.time()),
+            )
+
+    def record_turn(self, survey: str, session_id: str, history: List[Dict[str, Any]], message: str) -> Optional[str]:
+        """Record ``message`` as the answer to the question the agent last asked; returns that question id."""
+        question_id = answered_question_id(history)
+        if question_id and message.strip():
+            self.record(survey, session_id, question_id, message.strip())
+        return question_id
+
+    def answers_since(self, survey: str, seq: int, question_ids: Optional[List[str]] = None) -> List[Any]:
+        """Rows with seq greater than ``seq``, in seq order, optionally limited to some questions."""
+        sql = "SELECT seq, session_id, question_id, answer, answered_at FROM survey_answers WHERE survey = ? AND seq > ?"
+        params: List[Any] = [survey, seq]
+        if question_ids:
+            sql += f" AND question_id IN ({','.join('?' * len(question_ids))})"
+            params += list(question_ids)
+        return self.conn.execute(sql + " ORDER BY seq", params).fetchall()
+
+    def answers_for(self, survey: str, question_id: str) -> List[Any]:
+        """Current answers to one question, one per session."""
+        return self.conn.execute(
+            "SELECT seq, session_id, answer FROM survey_answers WHERE survey = ? AND question_id = ? ORDER BY seq",
+            (survey, question_id),
+        ).fetchall()
+
+    def latest_seq(self, survey: str, question_id: Optional[str] = None) -> int:
+        if question_id is None:
+            row = self.conn.execute("SELECT MAX(seq) FROM survey_answers WHERE survey = ?", (survey,)).fetchone()
+        else:
+            row = self.conn.execute(
+                "SELECT MAX(seq) FROM survey_answers WHERE survey = ? AND question_id = ?", (survey, question_id)
+            ).fetchone()
+        return row[0] or 0
+
+    def respondents(self, survey: str) -> int:
+        row = self.conn.execute("SELECT COUNT(DISTINCT session_id) FROM survey_answers WHERE survey = ?", (survey,)).fetchone()
+        return row[0]
+
+
+_store: Optional[SurveyResponseStore] = None
+
+
+def get_survey_response_store() -> SurveyResponseStore:
+    """Return the process-wide survey response store."""
+    global _store
+    if _store is None:
+        _store = SurveyResponseStore()
+    return _store
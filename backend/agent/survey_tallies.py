@@ -0,0 +1,215 @@
+"""
+Option tallies for the delivery staff survey's choice questions.
+Answers to single, multi-select and matrix questions are parsed against the
+option lists in questions/delivery_staff.json and counted into NumPy arrays:
+one count per option, and one per (sub-question, option) cell for matrix
+questions. Counts are updated incrementally from the survey answer table by
+sequence number, so survey-level reporting is a lookup rather than a pass over
+every transcript. A respondent who changes an answer is moved, not double
+counted.
+"""
+
+import re
+import threading
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from .survey_responses import get_survey_response_store
+
+logger = logging.getLogger(__name__)
+
+SURVEY = "delivery_staff"
+_NUMBER_LIST = re.compile(r"^[\d\s,;/&and.-]+$")
+
+
+def _normalise(text: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9&%+ ]", " ", text.lower())).strip()
+
+
+class ChoiceQuestion:
+    """A single, multi-select or matrix question with its option lists and count array."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.id = str(spec["id"])
+        self.text = spec["question"]
+        self.sub_questions = [sub["title"] for sub in spec.get("subQuestions", [])]
+        if self.sub_questions:
+            self.kind = "matrix"
+            self.options = [[o for o in sub["options"] if o.strip()] for sub in spec["subQuestions"]]
+        else:
+            # Untyped questions with options accept several selections, like 'multi'
+            self.kind = spec.get("type") or "multi"
+            self.options = [[o for o in spec.get("options", []) if o.strip()]]
+        width = max((len(options) for options in self.options), default=0)
+        self.counts = np.zeros((len(self.options), width), dtype=np.int64)
+        self.respondents = 0
+        self.unparsed = 0
+        self._normalised = [[_normalise(o) for o in options] for options in self.options]
+
+    def _match_options(self, text: str, row: int) -> List[int]:
+        """Options of one row named in ``text``: by option text, leading rating digit, or 1-based number."""
+        normalised = _normalise(text)
+        options = self._normalised[row]
+        matched = []
+        # Longest options first, removing each match so "Other" can't also match inside another option
+        for index in sorted(range(len(options)), key=lambda i: -len(options[i])):
+            option = options[index]
+            if option and re.search(rf"(?<![a-z0-9]){re.escape(option)}(?![a-z0-9])", normalised):
+                matched.append(index)
+                normalised = normalised.replace(option, " ")
+        if matched:
+            return sorted(matched)
+
+        # Rating scales ("1 - No Shortages") are usually answered with just the number
+        digits = re.findall(r"(?<![\d.])(\d{1,2})(?![\d.%])", text)
+        if digits and _NUMBER_LIST.match(text.strip()):
+            leading = {re.match(r"\s*(\d+)", o).group(1): i for i, o in enumerate(self.options[row]) if re.match(r"\s*\d+", o)}
+            if leading:
+                return sorted({leading[d] for d in digits if d in leading})
+            return sorted({int(d) - 1 for d in digits if 0 < int(d) <= len(options)})
+        return []
+
+    def parse(self, answer: str) -> Optional[np.ndarray]:
+        """Return a 0/1 selection array shaped like the counts, or None if nothing was recognised."""
+        selection = np.zeros_like(self.counts)
+        if self.kind != "matrix":
+            matched = self._match_options(answer, 0)
+            if self.kind == "single":
+                matched = matched[:1]
+            selection[0, matched] = 1
+            return selection if matched else None
+
+        segments = [s.strip() for s in re.split(r"[\n;]+", answer) if s.strip()]
+        if len(segments) == 1:
+            segments = [s.strip() for s in segments[0].split(",") if s.strip()]
+        titles = [_normalise(t) for t in self.sub_questions]
+        for segment in segments:
+            lowered = _normalise(segment)
+            # Longest title first, so "Registered Nurse" wins over a sub-question titled "Nurse"
+            row = next((i for i in sorted(range(len(titles)), key=lambda i: -len(titles[i])) if titles[i] and titles[i] in lowered), None)
+            if row is None:
+                continue
+            remainder = lowered.replace(titles[row], " ")
+            matched = self._match_options(remainder, row) or self._match_options(re.sub(r"[^\d,\s]", " ", remainder), row)
+            if matched:
+                selection[row, matched[0]] = 1
+        if selection.any():
+            return selection
+
+        # A bare list with one rating per sub-question, in the order they were asked
+        digits = re.findall(r"(?<![\d.])(\d)(?![\d.%])", answer)
+        if len(digits) == len(self.sub_questions) and _NUMBER_LIST.match(answer.strip()):
+            for row, digit in enumerate(digits):
+                matched = self._match_options(digit, row)
+                if matched:
+                    selection[row, matched[0]] = 1
+        return selection if selection.any() else None
+
+    def summary(self) -> Dict[str, Any]:
+        """Counts and shares per option (per sub-question for matrix questions)."""
+        rows = []
+        for row, options in enumerate(self.options):
+            counts = self.counts[row, :len(options)]
+            total = int(counts.sum())
+            entry: Dict[str, Any] = {
+                "options": [
+                    {"option": option, "count": int(count), "share": round(count / total, 3) if total else 0.0}
+                    for option, count in zip(options, counts)
+                ],
+                "responses": total,
+            }
+            scale = [re.match(r"\s*(\d+)", o) for o in options]
+            if total and all(scale):
+                values = np.array([int(m.group(1)) for m in scale])
+                entry["mean"] = round(float(values @ counts) / total, 2)
+            if self.kind == "matrix":
+                entry["sub_question"] = self.sub_questions[row]
+            rows.append(entry)
+
+        result: Dict[str, Any] = {
+            "question_id": self.id,
+            "question": self.text,
+            "type": self.kind,
+            "respondents": self.respondents,
+            "unparsed": self.unparsed,
+        }
+        if self.kind == "matrix":
+            result["sub_questions"] = rows
+        else:
+            result.update(rows[0])
+        return result
+
+
+class TallyEngine:
+    """Per-question option counts, kept current by applying new survey answers as they are recorded."""
+
+    def __init__(self):
+        from .agent_delivery_staff import load_questions
+
+        self.store = get_survey_response_store()
+        self.questions: Dict[str, ChoiceQuestion] = {
+            str(spec["id"]): ChoiceQuestion(spec)
+            for spec in load_questions()["questions"]
+            if spec.get("id") and (spec.get("subQuestions") or spec.get("options"))
+        }
+        self._lock = threading.Lock()
+        self._seq = 0
+        # Flat indices of the cells each (session, question) currently counts, so a changed answer can be backed out
+        self._applied: Dict[Tuple[str, str], Optional[Tuple[int, ...]]] = {}
+
+    def refresh(self) -> int:
+        """Apply answers recorded since the last refresh; returns how many were applied."""
+        with self._lock:
+            rows = self.store.answers_since(SURVEY, self._seq)
+            applied = 0
+            for row in rows:
+                self._seq = row["seq"]
+                question = self.questions.get(row["question_id"])
+                if question is None:
+                    continue
+                key = (row["session_id"], question.id)
+                if key in self._applied:
+                    previous = self._applied[key]
+                    if previous is None:
+                        question.unparsed -= 1
+                    else:
+                        question.counts.flat[list(previous)] -= 1
+                    question.respondents -= 1
+
+                selection = question.parse(row["answer"])
+                if selection is None:
+                    question.unparsed += 1
+                    self._applied[key] = None
+                else:
+                    cells = np.flatnonzero(selection)
+                    question.counts.flat[cells] += 1
+                    self._applied[key] = tuple(int(cell) for cell in cells)
+                question.respondents += 1
+                applied += 1
+            return applied
+
+    def question(self, question_id: str) -> Optional[Dict[str, Any]]:
+        question = self.questions.get(question_id)
+        return question.summary() if question else None
+
+    def all(self) -> List[Dict[str, Any]]:
+        return [q.summary() for q in self.questions.values() if q.respondents]
+
+
+_engine: Optional[TallyEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_tally_engine() -> TallyEngine:
+    """Return the process-wide tally engine, built from every recorded answer on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = TallyEngine()
+                applied = engine.refresh()
+                logger.info(f"Survey tallies loaded from {applied} answers")
+                _engine = engine
+    return _engine
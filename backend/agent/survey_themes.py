@@ -0,0 +1,357 @@
+"""
+Theme clustering of open-text answers to the delivery staff survey.
+For each open question, all respondents' answers are vectorised with TF-IDF
+(unigrams and bigrams, in NumPy), grouped with spherical k-means, and each
+cluster is labelled with a single LLM call from its top terms and most
+representative answers, rather than one call per respondent.
+
+Results are cached per question in the local state directory together with
+the answer sequence number they cover, so a refresh only re-clusters questions
+that received new answers. A theme keeps its label when most of its
+respondents were already in one previous theme, and labels are also cached by
+signature (question and top terms), so only genuinely new themes cost a call.
+
+Usage (from the backend directory):
+    python -m agent.survey_themes            # refresh questions with new answers
+    python -m agent.survey_themes --question 65 --force
+
+Environment:
+    SURVEY_THEMES_MODEL   LiteLLM model that labels clusters (default: gemini/gemini-2.5-flash)
+    SURVEY_THEMES_LLM     "0" to label clusters with their top terms only (default: enabled)
+    SURVEY_THEMES_MAX_K   Upper bound on clusters per question (default: 8)
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from common.circuit_breaker import CircuitOpenError, get_breaker
+from common.local_state import connect
+from .survey_responses import get_survey_response_store
+
+logger = logging.getLogger(__name__)
+
+SURVEY = "delivery_staff"
+THEMES_DB = "survey_themes.sqlite3"
+MIN_ANSWERS = 3
+MAX_VOCABULARY = 2000
+REPRESENTATIVES = 5
+# A theme whose respondents overlap a previous theme's this much keeps its label
+LABEL_REUSE_OVERLAP = 0.6
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how
+i if in into is it its itself just like may me might more most much must my no nor not of off on once only or other
+our ours out over own same she should so some such than that the their theirs them then there these they this those
+through to too under until up very was we were what when where which while who whom why will with would you your
+yours yes think really things thing lot lots get got make need needs needed better etc
+""".split())
+
+
+def open_questions() -> List[Dict[str, Any]]:
+    """Questions answered in free text: typed 'open', or with neither options nor sub-questions."""
+    from .agent_delivery_staff import load_questions
+    return [
+        {**q, "id": str(q["id"])} for q in load_questions()["questions"]
+        if q.get("id") and (q.get("type") == "open" or (not q.get("type") and not q.get("options") and not q.get("subQuestions")))
+    ]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words minus stopwords, plus adjacent-word bigrams."""
+    words = [w for w in re.findall(r"[a-z][a-z'-]+", text.lower()) if len(w) > 2 and w not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def tfidf_matrix(texts: List[str]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Return L2-normalised TF-IDF rows (sublinear tf, smoothed idf) and the vocabulary.
+
+    Terms used by a single answer are dropped once there are enough answers for
+    them to be noise, and the vocabulary is capped at the most common terms.
+    """
+    token_lists = [tokenize(text) for text in texts]
+    df = Counter(term for tokens in token_lists for term in set(tokens))
+    min_df = 2 if len(texts) >= 10 else 1
+    vocabulary = [term for term, count in df.most_common(MAX_VOCABULARY) if count >= min_df]
+    index = {term: i for i, term in enumerate(vocabulary)}
+
+    matrix = np.zeros((len(texts), len(vocabulary)), dtype=np.float32)
+    for row, tokens in enumerate(token_lists):
+        for term, count in Counter(tokens).items():
+            column = index.get(term)
+            if column is not None:
+                matrix[row, column] = 1.0 + math.log(count)
+    idf = np.log((1.0 + len(texts)) / (1.0 + np.array([df[t] for t in vocabulary], dtype=np.float32))) + 1.0
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.maximum(norms, 1e-12)
+    return matrix, vocabulary
+
+
+def spherical_kmeans(matrix: np.ndarray, k: int, seed: int = 0, iterations: int = 50,
+                     initial_groups: Optional[List[List[int]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster unit rows by cosine similarity; returns (labels, unit centroids).
+
+    Seeds from ``initial_groups`` (row indices of earlier clusters) when given,
+    so a refresh with a few new answers keeps the previous clusters, and tops
+    up the remaining centroids with k-means++.
+    """
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    centroids = [matrix[group].sum(axis=0) for group in (initial_groups or [])[:k] if group]
+    centroids = [c / max(float(np.linalg.norm(c)), 1e-12) for c in centroids if np.any(c)]
+    if not centroids:
+        centroids = [matrix[rng.integers(n)]]
+    for _ in range(len(centroids), k):
+        distance = np.clip(1.0 - np.max(matrix @ np.array(centroids).T, axis=1), 0.0, None).astype(np.float64)
+        total = distance.sum()
+        choice = rng.integers(n) if total <= 0 else rng.choice(n, p=distance / total)
+        centroids.append(matrix[choice])
+    centroids = np.array(centroids)
+
+    labels = np.full(n, -1)
+    for _ in range(iterations):
+        similarity = matrix @ centroids.T
+        new_labels = similarity.argmax(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for cluster in range(k):
+            members = matrix[labels == cluster]
+            if len(members):
+                centroid = members.sum(axis=0)
+            else:
+                # Re-seed an empty cluster with the answer least like its own centroid
+                centroid = matrix[similarity.max(axis=1).argmin()]
+            centroids[cluster] = centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+    return labels, centroids
+
+
+def choose_k(answers: int) -> int:
+    max_k = int(os.getenv("SURVEY_THEMES_MAX_K", "8"))
+    return max(1, min(max_k, answers // 2, round(math.sqrt(answers / 2))))
+
+
+def cluster_answers(texts: List[str], seed: int = 0, initial_groups: Optional[List[List[int]]] = None) -> List[Dict[str, Any]]:
+    """Group answers into themes; each theme has its size, top terms and most representative answers."""
+    matrix, vocabulary = tfidf_matrix(texts)
+    if not vocabulary:
+        return [{"size": len(texts), "top_terms": [], "representatives": texts[:REPRESENTATIVES], "members": list(range(len(texts)))}]
+    labels, centroids = spherical_kmeans(matrix, choose_k(len(texts)), seed, initial_groups=initial_groups)
+
+    themes = []
+    for cluster, centroid in enumerate(centroids):
+        members = np.flatnonzero(labels == cluster)
+        if not len(members):
+            continue
+        closest = members[np.argsort(-(matrix[members] @ centroid))][:REPRESENTATIVES]
+        themes.append({
+            "size": int(len(members)),
+            "top_terms": [vocabulary[i] for i in np.argsort(-centroid)[:8] if centroid[i] > 0],
+            "representatives": [texts[i] for i in closest],
+            "members": members.tolist(),
+        })
+    themes.sort(key=lambda theme: theme["size"], reverse=True)
+    return themes
+
+
+class ThemeStore:
+    """Cached clustering results per question and cluster labels per signature."""
+
+    def __init__(self, filename: str = THEMES_DB):
+        self.conn = connect(filename)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS survey_themes (
+                survey TEXT NOT NULL,
+                question_id TEXT NOT NULL,
+                answers_seq INTEGER NOT NULL,
+                computed_at REAL NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (survey, question_id)
+            );
+            CREATE TABLE IF NOT EXISTS theme_labels (
+                signature TEXT PRIMARY KEY,
+                label TEXT NOT NULL,
+                summary TEXT NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+
+    def get(self, survey: str, question_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT answers_seq, computed_at, result FROM survey_themes WHERE survey = ? AND question_id = ?",
+            (survey, question_id),
+        ).fetchone()
+        if not row:
+            return None
+        return {**json.loads(row["result"]), "answers_seq": row["answers_seq"], "computed_at": row["computed_at"]}
+
+    def all(self, survey: str) -> List[Dict[str, Any]]:
+        rows = self.conn.execute("SELECT question_id FROM survey_themes WHERE survey = ?", (survey,)).fetchall()
+        return [self.get(survey, row["question_id"]) for row in rows]
+
+    def save(self, survey: str, question_id: str, answers_seq: int, result: Dict[str, Any]) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO survey_themes (survey, question_id, answers_seq, computed_at, result) VALUES (?, ?, ?, ?, ?)",
+                (survey, question_id, answers_seq, time.time(), json.dumps(result)),
+            )
+
+    def label(self, signature: str) -> Optional[Tuple[str, str]]:
+        row = self.conn.execute("SELECT label, summary FROM theme_labels WHERE signature = ?", (signature,)).fetchone()
+        return (row["label"], row["summary"]) if row else None
+
+    def save_label(self, signature: str, label: str, summary: str) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO theme_labels (signature, label, summary) VALUES (?, ?, ?)", (signature, label, summary)
+            )
+
+
+async def label_theme(question: str, theme: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """One LLM call naming a theme from its top terms and representative answers; None if unavailable."""
+    if os.getenv("SURVEY_THEMES_LLM", "1") == "0" or os.getenv("MODEL_BACKEND", "").lower() == "stub":
+        return None
+    model = os.getenv("SURVEY_THEMES_MODEL", "gemini/gemini-2.5-flash")
+    answers = "\n".join(f"- {text[:400]}" for text in theme["representatives"])
+
+    async def _call() -> str:
+        import litellm
+        response = await litellm.acompletion(
+            model=model,
+            messages=[
+                {"role": "system", "content": (
+                    "You name themes in survey answers from TAFE NSW delivery staff. Return a JSON object with "
+                    "'label' (at most 6 words) and 'summary' (one sentence describing what these respondents say)."
+                )},
+                {"role": "user", "content": (
+                    f"Question: {question}\nKey terms: {', '.join(theme['top_terms'])}\n"
+                    f"{theme['size']} respondents gave answers like:\n{answers}"
+                )},
+            ],
+            response_format={"type": "json_object"},
+            temperature=0,
+        )
+        return response.choices[0].message.content or "{}"
+
+    try:
+        parsed = json.loads(await get_breaker(model).call(_call))
+        if parsed.get("label"):
+            return str(parsed["label"])[:80], str(parsed.get("summary", ""))[:400]
+    except CircuitOpenError:
+        pass
+    except Exception as e:
+        logger.warning(f"Theme labelling failed: {e}")
+    return None
+
+
+def theme_signature(question_id: str, theme: Dict[str, Any]) -> str:
+    return hashlib.sha1(f"{question_id}|{'|'.join(sorted(theme['top_terms'][:5]))}".encode()).hexdigest()
+
+
+def _previous_label(sessions: List[str], previous: Optional[Dict[str, Any]]) -> Optional[Tuple[str, str]]:
+    """Label of the previously computed theme sharing most respondents, if the overlap is large enough."""
+    best, best_overlap = None, 0.0
+    members = set(sessions)
+    for theme in (previous or {}).get("themes", []):
+        earlier = set(theme.get("sessions", []))
+        overlap = len(members & earlier) / max(len(members | earlier), 1)
+        if overlap > best_overlap:
+            best, best_overlap = theme, overlap
+    if best is not None and best_overlap >= LABEL_REUSE_OVERLAP and best.get("summary"):
+        return best["label"], best["summary"]
+    return None
+
+
+async def compute_question_themes(question: Dict[str, Any], store: ThemeStore, answers: List[Any],
+                                  previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Cluster one question's answers and label each cluster, reusing labels of themes that barely changed."""
+    texts = [row["answer"] for row in answers]
+    position = {row["session_id"]: i for i, row in enumerate(answers)}
+    initial_groups = [
+        [position[session] for session in theme.get("sessions", []) if session in position]
+        for theme in (previous or {}).get("themes", [])
+    ]
+    themes = await asyncio.to_thread(cluster_answers, texts, 0, initial_groups) if len(texts) >= MIN_ANSWERS else []
+    llm_calls = 0
+    for theme in themes:
+        theme["sessions"] = [answers[i]["session_id"] for i in theme.pop("members")]
+        signature = theme_signature(question["id"], theme)
+        cached = _previous_label(theme["sessions"], previous) or store.label(signature)
+        if cached is None:
+            labelled = await label_theme(question["question"], theme)
+            if labelled:
+                llm_calls += 1
+                store.save_label(signature, *labelled)
+                cached = labelled
+        theme["label"], theme["summary"] = cached or (", ".join(theme["top_terms"][:3]) or "Other", "")
+        theme["share"] = round(theme["size"] / len(texts), 3)
+    return {
+        "question_id": question["id"],
+        "question": question["question"],
+        "answers": len(texts),
+        "themes": themes,
+        "llm_calls": llm_calls,
+    }
+
+
+async def refresh_themes(question_ids: Optional[List[str]] = None, force: bool = False,
+                         store: Optional[ThemeStore] = None) -> List[Dict[str, Any]]:
+    """Re-cluster open questions that have new answers since their cached result; returns what was recomputed."""
+    store = store or ThemeStore()
+    responses = get_survey_response_store()
+    refreshed = []
+    for question in open_questions():
+        if question_ids and question["id"] not in question_ids:
+            continue
+        latest = responses.latest_seq(SURVEY, question["id"])
+        cached = store.get(SURVEY, question["id"])
+        if not force and cached is not None and cached["answers_seq"] >= latest:
+            continue
+        if not latest:
+            continue
+        result = await compute_question_themes(question, store, responses.answers_for(SURVEY, question["id"]), cached)
+        store.save(SURVEY, question["id"], latest, result)
+        refreshed.append(result)
+        logger.info(
+            f"Survey themes for question {question['id']}: {result['answers']} answers, "
+            f"{len(result['themes'])} themes, {result['llm_calls']} labelling calls"
+        )
+    return refreshed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cluster open-text delivery staff answers into themes")
+    parser.add_argument("--question", action="append", help="Question id to refresh (repeatable; default: all open questions)")
+    parser.add_argument("--force", action="store_true", help="Recompute even if no new answers arrived")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'), override=True)
+
+    for result in asyncio.run(refresh_themes(args.question, args.force)):
+        print(f"\nQ{result['question_id']}: {result['question']} ({result['answers']} answers)")
+        for theme in result["themes"]:
+            print(f"  {theme['share']:>5.0%}  {theme['label']}  [{', '.join(theme['top_terms'][:5])}]")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
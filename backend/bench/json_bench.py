@@ -0,0 +1,157 @@
+"""
+Benchmark for JSON encoding/decoding and response compression on plan-sized
+payloads. Builds agent responses carrying a synthetic HTML consultation plan
+and requests carrying conversation histories of increasing length, then times
+stdlib json against orjson in both directions and gzip against brotli on the
+encoded response, reporting compressed sizes alongside.
+
+Usage (from the backend directory):
+    python -m bench.json_bench
+    python -m bench.json_bench --plan-sections 40 --history-turns 25,100,200 --output json_bench.json
+"""
+
+import sys
+import gzip
+import json
+import argparse
+from typing import Dict, Any, List, Optional
+
+from bench.metrics import time_call
+from bench.replay_bench import SYNTHETIC_ANSWERS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PLAN_SECTION = """<section class="plan-section">
+  <h2>{index}. Strategic priority {index}</h2>
+  <p>Based on the consultation, the faculty should expand flexible delivery for apprentices while
+  addressing the teaching shortfall in health and community services. Employer partners want
+  faster course updates and more work-based learning &mdash; &ldquo;we need graduates job-ready&rdquo;.</p>
+  <table>
+    <thead><tr><th>Action</th><th>Owner</th><th>Timeline</th><th>Measure</th></tr></thead>
+    <tbody>
+      <tr><td>Recruit two full-time teachers</td><td>Head Teacher</td><td>Term {term}</td><td>Vacancies filled</td></tr>
+      <tr><td>Review equipment replacement cycle</td><td>Faculty Director</td><td>Q{quarter}</td><td>Budget approved</td></tr>
+      <tr><td>Pilot employer co-designed units</td><td>Industry Liaison</td><td>Semester {semester}</td><td>Units delivered</td></tr>
+    </tbody>
+  </table>
+</section>
+"""
+
+
+def synthetic_plan(sections: int) -> str:
+    """An HTML plan of ``sections`` priority sections, similar in shape to generated consultation plans."""
+    body = "".join(
+        PLAN_SECTION.format(index=i + 1, term=i % 4 + 1, quarter=i % 4 + 1, semester=i % 2 + 1)
+        for i in range(sections)
+    )
+    return f"<html><head><title>Consultation plan</title></head><body><h1>Consultation plan</h1>{body}</body></html>"
+
+
+def synthetic_history(turns: int) -> List[Dict[str, str]]:
+    history = []
+    for turn in range(turns):
+        history.append({"sender": "ai", "message": f"Thank you. Question {turn + 1}: could you tell me more about your team's priorities for next year?"})
+        history.append({"sender": "user", "message": SYNTHETIC_ANSWERS[turn % len(SYNTHETIC_ANSWERS)]})
+    return history
+
+
+def build_payloads(plan_sections: int, history_turns: List[int]) -> Dict[str, Any]:
+    """Name -> payload dict: one plan response plus one request per history length."""
+    payloads: Dict[str, Any] = {
+        f"plan_response-{plan_sections}": {
+            "message": synthetic_plan(plan_sections),
+            "status": "success",
+            "data": {"plan_generated": True, "stage": "plan_generation", "answers_captured": 24},
+            "session_id": "3f1c2a9e-bench",
+        }
+    }
+    for turns in history_turns:
+        payloads[f"request_history-{turns}"] = {
+            "message": "I think that covers it, please go ahead with the analysis.",
+            "context": {
+                "userName": "Alex Example",
+                "userEmail": "alex@example.edu.au",
+                "userRole": "Head Teacher",
+                "department": "Health and Community Services",
+                "conversationHistory": synthetic_history(turns),
+            },
+            "session_id": "3f1c2a9e-bench",
+        }
+    return payloads
+
+
+def stdlib_dumps(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def run_suite(payloads: Dict[str, Any], repeats: int) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, payload in payloads.items():
+        encoded = stdlib_dumps(payload)
+        result: Dict[str, Any] = {
+            "bytes": len(encoded),
+            "json_encode": time_call(lambda: stdlib_dumps(payload), repeats),
+            "json_decode": time_call(lambda: json.loads(encoded), repeats),
+            "gzip": {**time_call(lambda: gzip.compress(encoded, compresslevel=6), repeats), "bytes": len(gzip.compress(encoded, compresslevel=6))},
+        }
+        if orjson is not None:
+            result["orjson_encode"] = time_call(lambda: orjson.dumps(payload), repeats)
+            result["orjson_decode"] = time_call(lambda: orjson.loads(encoded), repeats)
+        if brotli is not None:
+            result["brotli"] = {**time_call(lambda: brotli.compress(encoded, quality=4), repeats), "bytes": len(brotli.compress(encoded, quality=4))}
+        results[name] = result
+    return results
+
+
+def format_report(results: Dict[str, Dict[str, Any]]) -> str:
+    lines = [f"{'payload':<24} {'case':<14} {'best_us':>10} {'median_us':>10} {'bytes':>9}  note"]
+    for name, result in results.items():
+        for case in ("json_encode", "orjson_encode", "json_decode", "orjson_decode", "gzip", "brotli"):
+            timing = result.get(case)
+            if timing is None:
+                continue
+            note = ""
+            stdlib = result.get(case.replace("orjson", "json"))
+            if case.startswith("orjson") and stdlib:
+                note = f"{stdlib['median_us'] / timing['median_us']:.1f}x faster than json"
+            elif "bytes" in timing:
+                note = f"{timing['bytes'] / result['bytes']:.1%} of {result['bytes']} bytes"
+            lines.append(
+                f"{name:<24} {case:<14} {timing['best_us']:>10.1f} {timing['median_us']:>10.1f} "
+                f"{timing.get('bytes', result['bytes']):>9}  {note}"
+            )
+    if orjson is None:
+        lines.append("orjson not installed: orjson cases skipped")
+    if brotli is None:
+        lines.append("brotli not installed: brotli case skipped")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark JSON encode/decode and compression on plan-sized payloads")
+    parser.add_argument("--plan-sections", type=int, default=30, help="Sections in the synthetic HTML plan")
+    parser.add_argument("--history-turns", default="25,100,200", help="Comma-separated conversation history lengths in turns")
+    parser.add_argument("--repeats", type=int, default=5, help="Timing repeats per case")
+    parser.add_argument("--output", help="Write the JSON results to this path")
+    args = parser.parse_args(argv)
+
+    payloads = build_payloads(args.plan_sections, [int(t) for t in args.history_turns.split(",") if t.strip()])
+    results = run_suite(payloads, args.repeats)
+    print(format_report(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Load generator for the A2A server.
+Simulates concurrent multi-turn consultations against every persona endpoint
+and reports throughput, latency percentiles and memory growth. By default the
+server runs in-process on the stub model (MODEL_BACKEND=stub) so results are
+reproducible offline; pass --url to load-test a running deployment instead.
+
+Usage (from the backend directory):
+    python -m bench.load_test --consultations 20 --turns 10 --concurrency 16
+    python -m bench.load_test --personas run,risk_agent --output load.json --max-p95-ms 2500
+"""
+
+import os
+import re
+import gc
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tracemalloc
+from typing import Dict, Any, List, Optional
+
+from bench.metrics import latency_summary, rss_bytes
+
+USER_ANSWERS = [
+    "Our main priority is growing enrolments in the health and community services programs.",
+    "We are short two full-time teachers and rely heavily on casual staff.",
+    "Industry partners want more work-based learning and faster course updates.",
+    "The biggest risk is losing experienced staff to industry roles.",
+    "We track completion rates, student satisfaction and employer feedback.",
+    "More admin support would free teachers to focus on delivery.",
+    "Funding uncertainty makes it hard to plan beyond twelve months.",
+    "I think that covers it, please go ahead with the analysis.",
+]
+
+
+def create_stub_app() -> Any:
+    """Build the server app in-process on the stub model without touching the database."""
+    os.environ.setdefault("MODEL_BACKEND", "stub")
+    os.environ.setdefault("SESSION_STORE", "memory")
+    from agent.__main__ import create_app
+    app = create_app()
+    # __main__ loads .env; never write load-test plans to the real database
+    for key in ("SUPABASE_URL", "SUPABASE_ANON_KEY"):
+        os.environ.pop(key, None)
+    return app
+
+
+def next_user_message(persona: str, reply: str, turn: int, rng: random.Random) -> str:
+    """Pick a plausible user answer to the assistant's last reply."""
+    if persona == "delivery_staff_agent":
+        options = re.findall(r"^- (.+)$", reply, flags=re.MULTILINE)
+        if options:
+            return rng.choice(options)
+    return USER_ANSWERS[turn % len(USER_ANSWERS)]
+
+
+async def simulate_consultation(client: Any, persona: str, index: int, turns: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """Run one consultation and return a record per turn."""
+    context = {
+        "user_id": f"loadtest_{persona}_{index}",
+        "email": f"loadtest+{persona}-{index}@example.com",
+        "name": f"Load Test {index}",
+        "role": "Head Teacher",
+        "department": "Health and Community Services",
+    }
+    history: List[Dict[str, str]] = []
+    session_id: Optional[str] = None
+    message = "Hi, I'm ready to start the consultation."
+    records = []
+
+    for turn in range(turns):
+        history.append({"sender": "user", "message": message})
+        body = {"message": message, "context": {**context, "conversationHistory": list(history)}, "session_id": session_id}
+        started = time.perf_counter()
+        try:
+            response = await client.post(f"/{persona}", json=body)
+            result = response.json()
+            status = result.get("status", "error") if response.status_code == 200 else f"http_{response.status_code}"
+        except Exception as e:
+            result, status = {"message": str(e)}, "exception"
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        reply = result.get("message", "")
+        session_id = result.get("session_id") or session_id
+        records.append({
+            "persona": persona,
+            "turn": turn,
+            "latency_ms": latency_ms,
+            "status": status,
+            "plan_generated": bool((result.get("data") or {}).get("plan_generated")) or "<h2>" in reply,
+        })
+        history.append({"sender": "ai", "message": reply})
+        message = next_user_message(persona, reply, turn, rng)
+    return records
+
+
+async def run_load(client: Any, personas: List[str], consultations: int, turns: int, concurrency: int, seed: int) -> Dict[str, Any]:
+    """Run ``consultations`` per persona with at most ``concurrency`` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    rng = random.Random(seed)
+
+    async def one(persona: str, index: int) -> List[Dict[str, Any]]:
+        async with semaphore:
+            return await simulate_consultation(client, persona, index, turns, random.Random(rng.random()))
+
+    started = time.perf_counter()
+    batches = await asyncio.gather(*(one(persona, i) for persona in personas for i in range(consultations)))
+    elapsed = time.perf_counter() - started
+    records = [record for batch in batches for record in batch]
+
+    per_persona = {}
+    for persona in personas:
+        persona_records = [r for r in records if r["persona"] == persona]
+        per_persona[persona] = {
+            "latency_ms": latency_summary([r["latency_ms"] for r in persona_records]),
+            "errors": sum(1 for r in persona_records if r["status"] != "success"),
+            "plans_generated": sum(1 for r in persona_records if r["plan_generated"]),
+        }
+
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "turns": len(records),
+        "throughput_turns_per_s": round(len(records) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": latency_summary([r["latency_ms"] for r in records]),
+        "errors": sum(1 for r in records if r["status"] != "success"),
+        "per_persona": per_persona,
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    latency = report["latency_ms"]
+    memory = report["memory"]
+    lines = [
+        f"{report['turns']} turns in {report['elapsed_s']} s: {report['throughput_turns_per_s']} turns/s, {report['errors']} errors",
+        f"latency ms  p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}",
+        f"{'persona':<28} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7} {'plans':>6}",
+    ]
+    for persona, stats in report["per_persona"].items():
+        persona_latency = stats["latency_ms"]
+        lines.append(f"{persona:<28} {persona_latency['p50']:>9} {persona_latency['p95']:>9} {persona_latency['p99']:>9} {stats['errors']:>7} {stats['plans_generated']:>6}")
+    if memory:
+        lines.append(
+            f"memory: RSS {memory['rss_start_mb']} -> {memory['rss_end_mb']} MB "
+            f"({memory['growth_per_consultation_kb']} KB per consultation), tracemalloc peak {memory.get('tracemalloc_peak_mb')} MB"
+        )
+    return "\n".join(lines)
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx
+    from agent.personas import PERSONAS
+
+    personas = list(PERSONAS) if args.personas == "all" else [p.strip() for p in args.personas.split(",")]
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            report = await run_load(client, personas, args.consultations, args.turns, args.concurrency, args.seed)
+        report["memory"] = {}
+        return report
+
+    app = create_stub_app()
+    if args.warm_up:
+        import agent.__main__ as server
+        await server.persona_registry.warm_up(personas)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    gc.collect()
+    rss_start = rss_bytes()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout) as client:
+        report = await run_load(client, personas, args.consultations, args.turns, args.concurrency, args.seed)
+
+    gc.collect()
+    rss_end = rss_bytes()
+    total_consultations = len(personas) * args.consultations
+    report["memory"] = {
+        "rss_start_mb": round(rss_start / 1e6, 1),
+        "rss_end_mb": round(rss_end / 1e6, 1),
+        "growth_mb": round((rss_end - rss_start) / 1e6, 2),
+        "growth_per_consultation_kb": round((rss_end - rss_start) / 1e3 / total_consultations, 1),
+    }
+    if args.tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report["memory"].update({"tracemalloc_current_mb": round(current / 1e6, 2), "tracemalloc_peak_mb": round(peak / 1e6, 2)})
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the consultation server")
+    parser.add_argument("--personas", default="all", help="Comma-separated persona routes, or 'all'")
+    parser.add_argument("--consultations", type=int, default=10, help="Consultations per persona")
+    parser.add_argument("--turns", type=int, default=10, help="User turns per consultation")
+    parser.add_argument("--concurrency", type=int, default=16, help="Consultations in flight at once")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for simulated user answers")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--url", help="Load-test a running server instead of an in-process stub server")
+    parser.add_argument("--no-warm-up", dest="warm_up", action="store_false", help="Include persona construction in measured latency")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also trace Python allocations (slower)")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit non-zero if overall p95 latency exceeds this")
+    parser.add_argument("--max-growth-kb", type=float, help="Exit non-zero if RSS growth per consultation exceeds this")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = report["errors"] > 0
+    if args.max_p95_ms is not None and report["latency_ms"]["p95"] > args.max_p95_ms:
+        print(f"p95 latency {report['latency_ms']['p95']} ms exceeds budget of {args.max_p95_ms} ms")
+        failed = True
+    growth = report["memory"].get("growth_per_consultation_kb")
+    if args.max_growth_kb is not None and growth is not None and growth > args.max_growth_kb:
+        print(f"Memory growth {growth} KB per consultation exceeds budget of {args.max_growth_kb} KB")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
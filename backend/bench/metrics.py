@@ -0,0 +1,64 @@
+"""
+Measurement helpers shared by the benchmark and load-testing tools.
+"""
+
+import os
+import time
+import resource
+from typing import Any, Callable, Dict, List, Sequence
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Return the ``pct`` percentile (0-100) of ``values`` using linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    """Summarise a list of latencies in milliseconds."""
+    if not latencies_ms:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "count": len(latencies_ms),
+        "mean": round(sum(latencies_ms) / len(latencies_ms), 2),
+        "p50": round(percentile(latencies_ms, 50), 2),
+        "p95": round(percentile(latencies_ms, 95), 2),
+        "p99": round(percentile(latencies_ms, 99), 2),
+        "max": round(max(latencies_ms), 2),
+    }
+
+
+def rss_bytes() -> int:
+    """Return the current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # No procfs (e.g. macOS): fall back to the peak, reported in bytes there
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def time_call(func: Callable[[], Any], repeats: int = 5, target_seconds: float = 0.05) -> Dict[str, float]:
+    """Return per-call timings in microseconds (best and median of ``repeats`` runs)."""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - started >= target_seconds / 5 or loops >= 1_000_000:
+            break
+        loops *= 2
+
+    runs = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        runs.append((time.perf_counter() - started) / loops * 1e6)
+    runs.sort()
+    return {"best_us": round(runs[0], 3), "median_us": round(runs[len(runs) // 2], 3), "loops": loops}
@@ -0,0 +1,185 @@
+"""
+Benchmark of per-request middleware overhead on the ASGI stack. Drives apps
+in-process with synthetic ASGI messages (no sockets), so the numbers isolate
+middleware and routing cost from the network and the model.
+
+Cases:
+    bare                 Starlette app with one JSON route, no middleware
+    cors                 the same app behind CORSMiddleware (the server's configuration)
+    cors_http_middleware CORSMiddleware plus an @app.middleware("http") header rewrite,
+                         the layering the server used before the CORS layers were merged
+    preflight            an OPTIONS preflight answered by CORSMiddleware
+    server_health        GET /health on the full server app (stub model)
+    server_preflight     OPTIONS /run on the full server app
+
+Usage (from the backend directory):
+    python -m bench.middleware_bench
+    python -m bench.middleware_bench --requests 5000 --cases cors,cors_http_middleware
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, Any, List, Optional, Tuple
+
+from bench.metrics import percentile
+
+ORIGIN = b"https://consult.example.edu.au"
+
+
+def make_scope(method: str, path: str, headers: List[Tuple[bytes, bytes]]) -> Dict[str, Any]:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8004),
+    }
+
+
+def simple_request(path: str = "/health") -> Dict[str, Any]:
+    return make_scope("GET", path, [(b"host", b"localhost"), (b"origin", ORIGIN), (b"accept", b"application/json")])
+
+
+def preflight_request(path: str = "/run") -> Dict[str, Any]:
+    return make_scope("OPTIONS", path, [
+        (b"host", b"localhost"),
+        (b"origin", ORIGIN),
+        (b"access-control-request-method", b"POST"),
+        (b"access-control-request-headers", b"content-type,idempotency-key"),
+    ])
+
+
+async def call(app: Any, scope: Dict[str, Any]) -> int:
+    """Send one request through ``app`` and return the response status."""
+    status = 0
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(dict(scope), receive, send)
+    return status
+
+
+def build_starlette_apps() -> Dict[str, Any]:
+    from starlette.applications import Starlette
+    from starlette.middleware.cors import CORSMiddleware
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+    from common.a2a_server import cors_options
+
+    async def health(request):
+        return JSONResponse({"status": "healthy", "agent": "bench"})
+
+    def app() -> Any:
+        return Starlette(routes=[Route("/health", health), Route("/run", health, methods=["POST"])])
+
+    cors = app()
+    cors.add_middleware(CORSMiddleware, **cors_options())
+
+    legacy = app()
+    legacy.add_middleware(CORSMiddleware, **cors_options())
+
+    @legacy.middleware("http")
+    async def add_cors_headers(request, call_next):
+        response = await call_next(request)
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS, HEAD, PATCH"
+        response.headers["Access-Control-Max-Age"] = "86400"
+        return response
+
+    return {"bare": app(), "cors": cors, "cors_http_middleware": legacy}
+
+
+def build_cases(names: List[str]) -> Dict[str, Tuple[Any, Dict[str, Any]]]:
+    cases: Dict[str, Tuple[Any, Dict[str, Any]]] = {}
+    if any(not name.startswith("server") for name in names):
+        apps = build_starlette_apps()
+        cases.update({
+            "bare": (apps["bare"], simple_request()),
+            "cors": (apps["cors"], simple_request()),
+            "cors_http_middleware": (apps["cors_http_middleware"], simple_request()),
+            "preflight": (apps["cors"], preflight_request()),
+        })
+    if any(name.startswith("server") for name in names):
+        from bench.load_test import create_stub_app
+        server = create_stub_app()
+        cases.update({
+            "server_health": (server, simple_request()),
+            "server_preflight": (server, preflight_request()),
+        })
+    return {name: cases[name] for name in names}
+
+
+async def time_requests(app: Any, scope: Dict[str, Any], requests: int, repeats: int) -> Dict[str, Any]:
+    """Per-request time in microseconds over ``repeats`` runs of ``requests`` sequential requests."""
+    status = await call(app, scope)
+    for _ in range(min(requests, 200)):
+        await call(app, scope)
+
+    runs = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(requests):
+            await call(app, scope)
+        runs.append((time.perf_counter() - started) / requests * 1e6)
+    return {
+        "status": status,
+        "best_us": round(min(runs), 2),
+        "median_us": round(percentile(runs, 50), 2),
+        "requests": requests,
+    }
+
+
+async def run_suite(cases: Dict[str, Tuple[Any, Dict[str, Any]]], requests: int, repeats: int) -> Dict[str, Dict[str, Any]]:
+    return {name: await time_requests(app, scope, requests, repeats) for name, (app, scope) in cases.items()}
+
+
+def format_report(results: Dict[str, Dict[str, Any]]) -> str:
+    lines = [f"{'case':<22} {'status':>6} {'best_us':>9} {'median_us':>10}  overhead"]
+    bare = results.get("bare")
+    for name, result in results.items():
+        overhead = ""
+        if bare and name != "bare" and not name.startswith("server"):
+            overhead = f"+{result['median_us'] - bare['median_us']:.1f} us vs bare"
+        lines.append(f"{name:<22} {result['status']:>6} {result['best_us']:>9.1f} {result['median_us']:>10.1f}  {overhead}")
+    return "\n".join(lines)
+
+
+DEFAULT_CASES = ["bare", "cors", "cors_http_middleware", "preflight", "server_health", "server_preflight"]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark per-request ASGI middleware overhead")
+    parser.add_argument("--requests", type=int, default=2000, help="Sequential requests per timing run")
+    parser.add_argument("--repeats", type=int, default=5, help="Timing runs per case")
+    parser.add_argument("--cases", default="all", help="Comma-separated case names, or 'all'")
+    parser.add_argument("--output", help="Write the JSON results to this path")
+    args = parser.parse_args(argv)
+
+    names = DEFAULT_CASES if args.cases == "all" else [c.strip() for c in args.cases.split(",")]
+    results = asyncio.run(run_suite(build_cases(names), args.requests, args.repeats))
+    print(format_report(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Replay benchmark for the per-request prompt-building and stage-tracking paths.
+Loads recorded consultations (anonymised transcripts) and synthetic ones of
+increasing length, times each hot path and measures its peak allocation, and
+compares the results against a stored baseline so CPU regressions fail CI.
+
+Cases:
+    stage_tracker       ConsultationStageTracker.analyze_conversation_stage
+    riley_context       TaskManager._build_riley_context
+    riley_history       TaskManager._format_conversation_history
+    delivery_history    format_delivery_staff_history
+    delivery_summary    build_conversation_summary (the ID[74] insights prompt)
+    format_question     format_question_for_agent over the whole question bank
+    question_lookup     get_question_by_id over the whole question bank
+
+Transcripts are JSON lists of {sender, message}, objects with a
+"conversationHistory" or "transcript" list, or JSONL batch job files.
+
+Usage (from the backend directory):
+    python -m bench.replay_bench --save-baseline
+    python -m bench.replay_bench --transcripts recorded/ --threshold 0.25
+"""
+
+import os
+import sys
+import json
+import glob
+import random
+import argparse
+import platform
+import tracemalloc
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+from bench.metrics import time_call
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "replay_baseline.json")
+DEFAULT_SIZES = [10, 50, 100, 250, 500]
+
+# User answers avoid the greeting keywords (even as substrings, e.g. "hi" in "leadership")
+# so the stage tracker takes its full path
+SYNTHETIC_ANSWERS = [
+    "About six years in the role and twelve years overall at TAFE NSW.",
+    "Eight direct reports across two campuses.",
+    "Our faculty executive team and student services are the key internal contacts.",
+    "Local employers, industry associations and the regional health network.",
+    "Fairly familiar, we review enrolment and completion data every term.",
+    "Staffing shortages and outdated equipment are the top concerns.",
+    "Expanding flexible delivery and growing apprentice numbers.",
+    "Around 400 students, limited by teacher availability.",
+]
+
+
+def synthetic_transcript(turns: int, seed: int = 0) -> List[Dict[str, str]]:
+    """Build a Riley-style transcript of ``turns`` exchanges cycling through every stage question."""
+    from agent.task_manager import ConsultationStageTracker
+
+    rng = random.Random(seed)
+    patterns = [
+        question
+        for stage in ConsultationStageTracker.CONSULTATION_STAGES.values()
+        for question in stage.get("questions", [])
+    ]
+    transcript = []
+    for turn in range(turns):
+        pattern = patterns[turn % len(patterns)]
+        transcript.append({"sender": "ai", "message": f"Thank you. Could you tell me, {pattern}? Please share as much detail as you can."})
+        transcript.append({"sender": "user", "message": rng.choice(SYNTHETIC_ANSWERS)})
+    return transcript
+
+
+def load_recorded_transcripts(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Load recorded transcripts from a file or directory of .json/.jsonl files."""
+    files = sorted(glob.glob(os.path.join(path, "*.json*"))) if os.path.isdir(path) else [path]
+    transcripts = {}
+    for file_path in files:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        with open(file_path, "r") as f:
+            if file_path.endswith(".jsonl"):
+                records = [json.loads(line) for line in f if line.strip()]
+            else:
+                records = [json.load(f)]
+        for index, record in enumerate(records):
+            if isinstance(record, dict):
+                record = record.get("conversationHistory") or record.get("transcript") or []
+            if record:
+                transcripts[f"{name}-{index}" if len(records) > 1 else name] = record
+    return transcripts
+
+
+def build_cases() -> Dict[str, Callable[[List[Dict[str, Any]]], Callable[[], Any]]]:
+    """Return case name -> factory taking a transcript and returning the call to measure."""
+    from agent.task_manager import ConsultationStageTracker, TaskManager
+    from agent.task_manager_delivery_staff import format_delivery_staff_history, build_conversation_summary
+    from agent.agent_delivery_staff import load_questions, get_question_by_id, format_question_for_agent
+
+    # The prompt helpers only need the instance for method dispatch, not its ADK runner
+    riley = TaskManager.__new__(TaskManager)
+    context = {"name": "Alex Citizen", "role": "Head Teacher", "department": "Health", "user_id": "bench"}
+    questions = load_questions()["questions"]
+    question_ids = [q["id"] for q in questions if q.get("id")]
+
+    def last_user_message(history: List[Dict[str, Any]]) -> str:
+        return next((m.get("message", "") for m in reversed(history) if m.get("sender") == "user"), "")
+
+    def stage_tracker(history):
+        message = last_user_message(history)
+        return lambda: ConsultationStageTracker.analyze_conversation_stage(message, history)
+
+    def riley_context(history):
+        message = last_user_message(history)
+        stage = ConsultationStageTracker.analyze_conversation_stage(message, history)
+        return lambda: riley._build_riley_context(message, context, "Health", history, stage)
+
+    def riley_history(history):
+        return lambda: riley._format_conversation_history(history)
+
+    def delivery_history(history):
+        message = last_user_message(history)
+        return lambda: format_delivery_staff_history(history, message)
+
+    def delivery_summary(history):
+        return lambda: build_conversation_summary(history)
+
+    def format_question(history):
+        return lambda: [format_question_for_agent(q) for q in questions]
+
+    def question_lookup(history):
+        return lambda: [get_question_by_id(qid) for qid in question_ids]
+
+    return {
+        "stage_tracker": stage_tracker,
+        "riley_context": riley_context,
+        "riley_history": riley_history,
+        "delivery_history": delivery_history,
+        "delivery_summary": delivery_summary,
+        "format_question": format_question,
+        "question_lookup": question_lookup,
+    }
+
+
+# Cases whose cost does not depend on the transcript run once rather than per transcript
+TRANSCRIPT_INDEPENDENT = {"format_question", "question_lookup"}
+
+
+def measure_allocations(func: Callable[[], Any]) -> Dict[str, int]:
+    """Return the peak traced memory of one call and the bytes still held by its result."""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {"peak_bytes": peak - before, "retained_bytes": current - before}
+
+
+def run_suite(transcripts: Dict[str, List[Dict[str, Any]]], cases: List[str], repeats: int) -> Dict[str, Dict[str, Any]]:
+    """Measure every case against every transcript; keys are "case/transcript"."""
+    factories = build_cases()
+    results = {}
+    for case in cases:
+        sources: List[Tuple[str, List[Dict[str, Any]]]] = list(transcripts.items())
+        if case in TRANSCRIPT_INDEPENDENT:
+            sources = [("question-bank", [])]
+        for source, history in sources:
+            func = factories[case](history)
+            results[f"{case}/{source}"] = {
+                "messages": len(history),
+                **time_call(func, repeats),
+                **measure_allocations(func),
+            }
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """Return a description of every result slower or more allocation-heavy than baseline * (1 + threshold)."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in ("median_us", "peak_bytes"):
+            if base.get(metric) and result[metric] > base[metric] * (1 + threshold):
+                change = (result[metric] / base[metric] - 1) * 100
+                regressions.append(f"{key}: {metric} {base[metric]} -> {result[metric]} (+{change:.0f}%)")
+    return regressions
+
+
+def format_report(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> str:
+    lines = [f"{'case':<44} {'msgs':>5} {'median us':>11} {'vs base':>8} {'peak KB':>9} {'vs base':>8}"]
+    for key, result in results.items():
+        base = baseline.get(key, {})
+        time_change = f"{(result['median_us'] / base['median_us'] - 1) * 100:+.0f}%" if base.get("median_us") else "-"
+        alloc_change = f"{(result['peak_bytes'] / base['peak_bytes'] - 1) * 100:+.0f}%" if base.get("peak_bytes") else "-"
+        lines.append(
+            f"{key:<44} {result['messages']:>5} {result['median_us']:>11.1f} {time_change:>8} "
+            f"{result['peak_bytes'] / 1024:>9.1f} {alloc_change:>8}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark prompt building and stage tracking on replayed transcripts")
+    parser.add_argument("--transcripts", help="File or directory of recorded transcripts")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="Synthetic transcript lengths in turns ('' for none)")
+    parser.add_argument("--cases", default="all", help="Comma-separated case names, or 'all'")
+    parser.add_argument("--repeats", type=int, default=5, help="Timing repeats per case")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown/allocation growth before failing (0.25 = 25%%)")
+    parser.add_argument("--output", help="Write the JSON results to this path")
+    args = parser.parse_args(argv)
+
+    transcripts: Dict[str, List[Dict[str, Any]]] = {}
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        transcripts[f"synthetic-{size}"] = synthetic_transcript(size)
+    if args.transcripts:
+        transcripts.update(load_recorded_transcripts(args.transcripts))
+
+    cases = list(build_cases()) if args.cases == "all" else [c.strip() for c in args.cases.split(",")]
+    results = run_suite(transcripts, cases, args.repeats)
+
+    baseline: Dict[str, Dict[str, Any]] = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f).get("results", {})
+
+    print(format_report(results, baseline))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "results": results}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
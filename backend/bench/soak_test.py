@@ -0,0 +1,185 @@
+"""
+Memory soak test for the A2A server.
+Drives thousands of synthetic consultations through every persona endpoint on
+the stub model, sampling RSS and tracemalloc as sessions accumulate, and
+reports which allocation sites and object types grow per persona. Fails when
+the retained memory per session exceeds a budget.
+
+Usage (from the backend directory):
+    python -m bench.soak_test --sessions 500 --turns 6 --budget-kb 64
+    python -m bench.soak_test --personas delivery_staff_agent --output soak.json
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tracemalloc
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from bench.load_test import create_stub_app, simulate_consultation
+from bench.metrics import rss_bytes
+
+
+def object_type_counts() -> Counter:
+    """Count live gc-tracked objects by type name."""
+    return Counter(type(obj).__name__ for obj in gc.get_objects())
+
+
+def stored_sessions(task_manager: Any) -> Optional[int]:
+    """Return how many sessions a persona's in-memory session service holds, if it is one."""
+    service = getattr(task_manager, "session_service", None)
+    sessions = getattr(service, "sessions", None)
+    if not isinstance(sessions, dict):
+        return None
+    # InMemorySessionService keeps app_name -> user_id -> session_id -> Session
+    return sum(len(by_session) for by_user in sessions.values() for by_session in by_user.values())
+
+
+async def soak_persona(client: Any, persona: str, sessions: int, turns: int, concurrency: int,
+                       sample_every: int, seed: int, top: int) -> Dict[str, Any]:
+    """Run ``sessions`` consultations for one persona and measure what they leave behind."""
+    rng = random.Random(seed)
+    gc.collect()
+    types_before = object_type_counts()
+    snapshot_before = tracemalloc.take_snapshot()
+    traced_before, _ = tracemalloc.get_traced_memory()
+    rss_before = rss_bytes()
+
+    samples = []
+    errors = 0
+    started = time.perf_counter()
+    for wave_start in range(0, sessions, sample_every):
+        wave = range(wave_start, min(wave_start + sample_every, sessions))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(index: int) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await simulate_consultation(client, persona, index, turns, random.Random(rng.random()))
+
+        for records in await asyncio.gather(*(one(i) for i in wave)):
+            errors += sum(1 for r in records if r["status"] != "success")
+        gc.collect()
+        samples.append({
+            "sessions": wave.stop,
+            "elapsed_s": round(time.perf_counter() - started, 2),
+            "rss_mb": round(rss_bytes() / 1e6, 2),
+            "traced_mb": round(tracemalloc.get_traced_memory()[0] / 1e6, 2),
+        })
+
+    gc.collect()
+    traced_after, _ = tracemalloc.get_traced_memory()
+    rss_after = rss_bytes()
+    snapshot_after = tracemalloc.take_snapshot()
+    type_growth = object_type_counts() - types_before
+
+    top_sites = [
+        {
+            "site": str(stat.traceback),
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "count_diff": stat.count_diff,
+        }
+        for stat in snapshot_after.compare_to(snapshot_before, "lineno")[:top]
+        if stat.size_diff > 0
+    ]
+
+    return {
+        "sessions": sessions,
+        "turns": turns,
+        "errors": errors,
+        "traced_growth_per_session_kb": round((traced_after - traced_before) / 1024 / sessions, 2),
+        "rss_growth_per_session_kb": round((rss_after - rss_before) / 1024 / sessions, 2),
+        "top_allocation_sites": top_sites,
+        "top_object_types": [
+            {"type": name, "count_diff": count, "per_session": round(count / sessions, 2)}
+            for name, count in type_growth.most_common(top)
+        ],
+        "samples": samples,
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = []
+    for persona, result in report["personas"].items():
+        lines.append(
+            f"{persona}: {result['sessions']} sessions, {result['errors']} errors, "
+            f"traced +{result['traced_growth_per_session_kb']} KB/session, RSS +{result['rss_growth_per_session_kb']} KB/session, "
+            f"{result.get('stored_sessions')} sessions still stored"
+        )
+        for site in result["top_allocation_sites"][:5]:
+            lines.append(f"    +{site['size_diff_kb']:>9.1f} KB  {site['site']}")
+        types = ", ".join(f"{t['type']} +{t['per_session']}/session" for t in result["top_object_types"][:5])
+        lines.append(f"    objects: {types}")
+    return "\n".join(lines)
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx
+    from agent.personas import PERSONAS
+
+    # Model latency only stretches the run; what matters is what each session leaves behind
+    os.environ.setdefault("STUB_LATENCY", "fixed:0")
+    os.environ.setdefault("STUB_TOKENS_PER_SECOND", "0")
+    app = create_stub_app()
+    import agent.__main__ as server
+
+    personas = list(PERSONAS) if args.personas == "all" else [p.strip() for p in args.personas.split(",")]
+    await server.persona_registry.warm_up(personas)
+
+    tracemalloc.start(args.frames)
+    report: Dict[str, Any] = {"config": vars(args), "personas": {}}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://soak", timeout=120.0) as client:
+        # One short warm-up pass per persona so first-use caches don't count as growth
+        for persona in personas:
+            await simulate_consultation(client, persona, -1, args.turns, random.Random(args.seed))
+
+        for persona in personas:
+            result = await soak_persona(
+                client, persona, args.sessions, args.turns, args.concurrency,
+                max(1, args.sessions // args.samples), args.seed, args.top,
+            )
+            result["stored_sessions"] = stored_sessions(server.persona_registry.get(persona))
+            report["personas"][persona] = result
+    tracemalloc.stop()
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Soak-test the consultation server for memory growth")
+    parser.add_argument("--personas", default="all", help="Comma-separated persona routes, or 'all'")
+    parser.add_argument("--sessions", type=int, default=500, help="Consultations per persona")
+    parser.add_argument("--turns", type=int, default=6, help="User turns per consultation")
+    parser.add_argument("--concurrency", type=int, default=32, help="Consultations in flight at once")
+    parser.add_argument("--samples", type=int, default=10, help="Memory samples per persona")
+    parser.add_argument("--frames", type=int, default=1, help="tracemalloc frames kept per allocation")
+    parser.add_argument("--top", type=int, default=15, help="Growing allocation sites and object types to report")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for simulated user answers")
+    parser.add_argument("--budget-kb", type=float, help="Fail if traced growth per session exceeds this for any persona")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    for persona, result in report["personas"].items():
+        if result["errors"]:
+            print(f"{persona}: {result['errors']} turns failed")
+            failed = True
+        if args.budget_kb is not None and result["traced_growth_per_session_kb"] > args.budget_kb:
+            print(f"{persona}: {result['traced_growth_per_session_kb']} KB per session exceeds budget of {args.budget_kb} KB")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
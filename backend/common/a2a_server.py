@@ -1,256 +1,239 @@
-"""
-Standardized Agent to Agent (A2A) server implementation following Google ADK standards.
-This module provides a FastAPI server implementation for agent-to-agent communication.
-"""
-
-import os
-import json
-import inspect
-from typing import Dict, Any, Callable, Optional
-
-from fastapi import FastAPI, Body, HTTPException, Request, Response
-from fastapi.responses import JSONResponse
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-
-class AgentRequest(BaseModel):
-    """Standard A2A agent request format."""
-    message: str = Field(..., description="The message to process")
-    context: Dict[str, Any] = Field(default_factory=dict, description="Additional context for the request")
-    session_id: Optional[str] = Field(None, description="Session identifier for stateful interactions")
-
-class AgentResponse(BaseModel):
-    """Standard A2A agent response format."""
-    message: str = Field(..., description="The response message")
-    status: str = Field(default="success", description="Status of the response (success, error)")
-    data: Dict[str, Any] = Field(default_factory=dict, description="Additional data returned by the agent")
-    session_id: Optional[str] = Field(None, description="Session identifier for stateful interactions")
-
-def create_agent_server(
-    name: str, 
-    description: str, 
-    task_manager: Any, 
-    endpoints: Optional[Dict[str, Callable]] = None,
-    well_known_path: Optional[str] = None,
-    capacity_task_manager: Optional[Any] = None,
-    risk_task_manager: Optional[Any] = None,
-    engagement_task_manager: Optional[Any] = None,
-    delivery_staff_task_manager: Optional[Any] = None,
-    external_stakeholder_task_manager: Optional[Any] = None
-) -> FastAPI:
-    """
-    Create a FastAPI server for an agent following A2A protocol.
-    
-    Args:
-        name: Agent name
-        description: Agent description
-        task_manager: TaskManager instance that handles agent processing
-        endpoints: Optional additional endpoints to register
-        well_known_path: Optional path for .well-known directory
-    
-    Returns:
-        FastAPI application instance
-    """
-    app = FastAPI(title=f"{name} Agent", description=description)
-    
-    # CRITICAL: Add CORS middleware with VERY permissive settings first
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=["*"],  # Allow ALL origins temporarily
-        allow_credentials=False,  # Set to False when using wildcard
-        allow_methods=["*"],  # Allow ALL methods
-        allow_headers=["*"],  # Allow ALL headers
-    )
-    
-    # Add a middleware to manually add CORS headers to ALL responses
-    @app.middleware("http")
-    async def add_cors_headers(request: Request, call_next):
-        response = await call_next(request)
-        
-        # Add CORS headers to every response
-        response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS, HEAD, PATCH"
-        response.headers["Access-Control-Allow-Headers"] = "Accept, Accept-Language, Content-Language, Content-Type, Authorization, X-Requested-With, Origin"
-        response.headers["Access-Control-Max-Age"] = "86400"
-        
-        return response
-
-    # Create .well-known directory if it doesn't exist
-    if well_known_path is None:
-        module_path = inspect.getmodule(inspect.stack()[1][0]).__file__
-        well_known_path = os.path.join(os.path.dirname(module_path), ".well-known")
-    
-    os.makedirs(well_known_path, exist_ok=True)
-    
-    # Generate agent.json if it doesn't exist
-    agent_json_path = os.path.join(well_known_path, "agent.json")
-    if not os.path.exists(agent_json_path):
-        endpoint_names = ["run"]
-        if endpoints:
-            endpoint_names.extend(endpoints.keys())
-        
-        agent_metadata = {
-            "name": name,
-            "description": description,
-            "endpoints": endpoint_names,
-            "version": "1.0.0"
-        }
-        
-        with open(agent_json_path, "w") as f:
-            json.dump(agent_metadata, f, indent=2)
-    
-    # Standard A2A run endpoint: Riley
-    @app.post("/run", response_model=AgentResponse)
-    async def run(request: AgentRequest = Body(...)):
-        try:
-            result = await task_manager.process_task(request.message, request.context, request.session_id)
-            return AgentResponse(
-                message=result.get("message", "Task completed"),
-                status=result.get("status", "success"),
-                data=result.get("data", {}),
-                session_id=result.get("session_id", request.session_id)
-            )
-        except Exception as e:
-            return AgentResponse(
-                message=f"Error processing request: {str(e)}",
-                status="error",
-                data={"error_type": type(e).__name__},
-                session_id=request.session_id
-            )
-    
-    # CAPACITY_AGENT:
-    @app.post("/capacity_agent", response_model=AgentResponse)
-    async def capacity_agent(request: AgentRequest = Body(...)):
-        try:
-            if not capacity_task_manager:
-                raise ValueError("CapacityAgent TaskManager not configured")
-            result = await capacity_task_manager.process_task(request.message, request.context, request.session_id)
-            return AgentResponse(
-                message=result.get("message", "Task completed"),
-                status=result.get("status", "success"),
-                data=result.get("data", {}),
-                session_id=result.get("session_id", request.session_id)
-            )
-        except Exception as e:
-            return AgentResponse(
-                message=f"Error processing request: {str(e)}",
-                status="error",
-                data={"error_type": type(e).__name__},
-                session_id=request.session_id
-            )
-        
-    @app.post("/risk_agent", response_model=AgentResponse)
-    async def risk_agent(request: AgentRequest = Body(...)):
-        try:
-            if not risk_task_manager:
-                raise ValueError("RiskAgent TaskManager not configured")
-            result = await risk_task_manager.process_task(request.message, request.context, request.session_id)
-            return AgentResponse(
-                message=result.get("message", "Task completed"),
-                status=result.get("status", "success"),
-                data=result.get("data", {}),
-                session_id=result.get("session_id", request.session_id)
-            )
-        except Exception as e:
-            return AgentResponse(
-                message=f"Error processing request: {str(e)}",
-                status="error",
-                data={"error_type": type(e).__name__},
-                session_id=request.session_id
-            )
-        
-    @app.post("/engagement_agent", response_model=AgentResponse)
-    async def engagement_agent(request: AgentRequest = Body(...)):
-        try:
-            if not engagement_task_manager:
-                raise ValueError("EngagementAgent TaskManager not configured")
-            result = await engagement_task_manager.process_task(request.message, request.context, request.session_id)
-            return AgentResponse(
-                message=result.get("message", "Task completed"),
-                status=result.get("status", "success"),
-                data=result.get("data", {}),
-                session_id=result.get("session_id", request.session_id)
-            )
-        except Exception as e:
-            return AgentResponse(
-                message=f"Error processing request: {str(e)}",
-                status="error",
-                data={"error_type": type(e).__name__},
-                session_id=request.session_id
-            )
-        
-    @app.post("/external_stakeholder_agent", response_model=AgentResponse)
-    async def external_stakeholder_agent(request: AgentRequest = Body(...)):
-        try:
-            if not external_stakeholder_task_manager:
-                raise ValueError("ExternalStakeholderAgent TaskManager not configured")
-            result = await external_stakeholder_task_manager.process_task(request.message, request.context, request.session_id)
-            return AgentResponse(
-                message=result.get("message", "Task completed"),
-                status=result.get("status", "success"),
-                data=result.get("data", {}),
-                session_id=result.get("session_id", request.session_id)
-            )
-        except Exception as e:
-            return AgentResponse(
-                message=f"Error processing request: {str(e)}",
-                status="error",
-                data={"error_type": type(e).__name__},
-                session_id=request.session_id
-            )
-        
-    @app.post("/delivery_staff_agent", response_model=AgentResponse)
-    async def delivery_staff_agent(request: AgentRequest = Body(...)):
-        try:
-            if not delivery_staff_task_manager:
-                raise ValueError("DeliveryStaffAgent TaskManager not configured")
-            result = await delivery_staff_task_manager.process_task(request.message, request.context, request.session_id)
-            return AgentResponse(
-                message=result.get("message", "Task completed"),
-                status=result.get("status", "success"),
-                data=result.get("data", {}),
-                session_id=result.get("session_id", request.session_id)
-            )
-        except Exception as e:
-            return AgentResponse(
-                message=f"Error processing request: {str(e)}",
-                status="error",
-                data={"error_type": type(e).__name__},
-                session_id=request.session_id
-            )
-
-    # Health check endpoint
-    @app.get("/health")
-    async def health_check():
-        """Health check endpoint."""
-        return {"status": "healthy", "agent": name}
-    
-    # CORS test endpoint
-    @app.get("/cors-test")
-    async def cors_test():
-        """Test CORS configuration."""
-        return {"message": "CORS is working", "timestamp": "2025-01-01", "cors": "enabled"}
-    
-    # Metadata endpoint
-    @app.get("/.well-known/agent.json")
-    async def get_metadata():
-        """Retrieve the agent metadata."""
-        with open(agent_json_path, "r") as f:
-            return JSONResponse(content=json.load(f))
-    
-    # Debug endpoint for testing
-    @app.get("/debug")
-    async def debug_info():
-        """Debug information endpoint."""
-        return {
-            "agent_name": name,
-            "app_name": task_manager.runner.app_name if hasattr(task_manager, 'runner') else "unknown",
-            "available_endpoints": ["run", "health", "debug", "cors-test", ".well-known/agent.json"] + (list(endpoints.keys()) if endpoints else [])
-        }
-    
-    # Register additional endpoints if provided
-    if endpoints:
-        for path, handler in endpoints.items():
-            app.add_api_route(f"/{path}", handler, methods=["POST"])
-    
+"""
+Standardized Agent to Agent (A2A) server implementation following Google ADK standards.
+This module provides a FastAPI server implementation for agent-to-agent communication.
+
+Environment:
+    CORS_ALLOW_ORIGINS   Comma-separated origins allowed to call the API (default: "*")
+    CORS_MAX_AGE         Seconds browsers may cache a preflight response (default: 86400)
+"""
+
+import os
+from typing import Dict, Any, Callable, Optional, List, Union
+
+from fastapi import FastAPI, Body, HTTPException, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
+
+from common.agent_card import AgentCard
+from common.circuit_breaker import all_breakers
+from common.fast_json import FastJSONResponse, install_fast_json
+from common.rate_limit import client_ip, get_rate_limiter
+from common.shutdown import get_shutdown_coordinator
+from common.startup_timing import startup_timer
+from common.turn_guard import TurnGuard
+from common.ws_channel import register_ws_channel
+
+class AgentRequest(BaseModel):
+    """Standard A2A agent request format."""
+    message: str = Field(..., description="The message to process")
+    context: Dict[str, Any] = Field(default_factory=dict, description="Additional context for the request")
+    session_id: Optional[str] = Field(None, description="Session identifier for stateful interactions")
+
+class AgentResponse(BaseModel):
+    """Standard A2A agent response format."""
+    message: str = Field(..., description="The response message")
+    status: str = Field(default="success", description="Status of the response (success, error)")
+    data: Dict[str, Any] = Field(default_factory=dict, description="Additional data returned by the agent")
+    session_id: Optional[str] = Field(None, description="Session identifier for stateful interactions")
+
+def cors_options() -> Dict[str, Any]:
+    """CORSMiddleware settings from the environment."""
+    origins = [o.strip() for o in os.getenv("CORS_ALLOW_ORIGINS", "*").split(",") if o.strip()] or ["*"]
+    return {
+        "allow_origins": origins,
+        # Credentials can't be combined with a wildcard origin
+        "allow_credentials": "*" not in origins,
+        "allow_methods": ["*"],
+        "allow_headers": ["*"],
+        # Let browser code read rate limit and caching headers
+        "expose_headers": ["Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset", "ETag"],
+        "max_age": int(os.getenv("CORS_MAX_AGE", "86400")),
+    }
+
+def create_agent_server(
+    name: str, 
+    description: str, 
+    task_manager: Any, 
+    endpoints: Optional[Dict[str, Callable]] = None,
+    capacity_task_manager: Optional[Any] = None,
+    risk_task_manager: Optional[Any] = None,
+    engagement_task_manager: Optional[Any] = None,
+    delivery_staff_task_manager: Optional[Any] = None,
+    external_stakeholder_task_manager: Optional[Any] = None,
+    routers: Optional[List[Any]] = None,
+    personas: Optional[Dict[str, Any]] = None
+) -> FastAPI:
+    """
+    Create a FastAPI server for an agent following A2A protocol.
+    
+    Args:
+        name: Agent name
+        description: Agent description
+        task_manager: TaskManager instance that handles agent processing
+        endpoints: Optional additional endpoints to register
+        routers: Optional APIRouters for feature endpoints (e.g. /analytics)
+        personas: Optional persona specs by route, described in the agent card
+    
+    Returns:
+        FastAPI application instance
+    """
+    app = FastAPI(title=f"{name} Agent", description=description, default_response_class=FastJSONResponse)
+    # orjson request decoding for the routes below, and gzip/brotli for large responses
+    install_fast_json(app)
+    
+    # Single CORS layer: preflights are answered by the middleware without entering the app
+    app.add_middleware(CORSMiddleware, **cors_options())
+
+    # Serialises turns per session and collapses duplicate submissions
+    turn_guard = TurnGuard()
+    # Token buckets per email, session and client IP (None when RATE_LIMIT=0)
+    rate_limiter = get_rate_limiter()
+    # Refuses new turns once a SIGTERM has started draining this instance
+    shutdown = get_shutdown_coordinator()
+
+    async def run_task(route: str, manager: Optional[Any], label: str, request: AgentRequest, http_request: Request) -> Union[AgentResponse, Response]:
+        """Run one turn through a persona's TaskManager and wrap the result (503/429 refusals are sent as-is)."""
+        if not shutdown.accepting():
+            return FastJSONResponse(
+                status_code=503,
+                headers={"Retry-After": "5", "Connection": "close"},
+                content=AgentResponse(
+                    message="The server is restarting; please send your message again in a few seconds.",
+                    status="error",
+                    data={"error_type": "ShuttingDown"},
+                    session_id=request.session_id,
+                ).model_dump(),
+            )
+        if rate_limiter is not None:
+            decision = await rate_limiter.check_async(
+                request.context.get("email"), request.session_id, client_ip(http_request.headers, http_request.client)
+            )
+            if not decision.allowed:
+                return FastJSONResponse(
+                    status_code=429,
+                    headers=decision.headers(),
+                    content=AgentResponse(
+                        message=f"Too many requests; please wait {decision.headers()['Retry-After']} seconds and try again.",
+                        status="error",
+                        data={"error_type": "RateLimited", "limited_by": decision.limited_by, "retry_after": round(decision.retry_after, 1)},
+                        session_id=request.session_id,
+                    ).model_dump(),
+                )
+        try:
+            if not manager:
+                raise ValueError(f"{label} TaskManager not configured")
+            result = await turn_guard.run(
+                route,
+                request.message,
+                request.context,
+                request.session_id,
+                lambda: manager.process_task(request.message, request.context, request.session_id),
+                idempotency_key=http_request.headers.get("Idempotency-Key"),
+            )
+            return AgentResponse(
+                message=result.get("message", "Task completed"),
+                status=result.get("status", "success"),
+                data=result.get("data", {}),
+                session_id=result.get("session_id", request.session_id)
+            )
+        except Exception as e:
+            return AgentResponse(
+                message=f"Error processing request: {str(e)}",
+                status="error",
+                data={"error_type": type(e).__name__},
+                session_id=request.session_id
+            )
+
+    # Standard A2A run endpoint: Riley
+    @app.post("/run", response_model=AgentResponse)
+    async def run(http_request: Request, request: AgentRequest = Body(...)):
+        return await run_task("run", task_manager, "Riley", request, http_request)
+    
+    # CAPACITY_AGENT:
+    @app.post("/capacity_agent", response_model=AgentResponse)
+    async def capacity_agent(http_request: Request, request: AgentRequest = Body(...)):
+        return await run_task("capacity_agent", capacity_task_manager, "CapacityAgent", request, http_request)
+        
+    @app.post("/risk_agent", response_model=AgentResponse)
+    async def risk_agent(http_request: Request, request: AgentRequest = Body(...)):
+        return await run_task("risk_agent", risk_task_manager, "RiskAgent", request, http_request)
+        
+    @app.post("/engagement_agent", response_model=AgentResponse)
+    async def engagement_agent(http_request: Request, request: AgentRequest = Body(...)):
+        return await run_task("engagement_agent", engagement_task_manager, "EngagementAgent", request, http_request)
+        
+    @app.post("/external_stakeholder_agent", response_model=AgentResponse)
+    async def external_stakeholder_agent(http_request: Request, request: AgentRequest = Body(...)):
+        return await run_task("external_stakeholder_agent", external_stakeholder_task_manager, "ExternalStakeholderAgent", request, http_request)
+        
+    @app.post("/delivery_staff_agent", response_model=AgentResponse)
+    async def delivery_staff_agent(http_request: Request, request: AgentRequest = Body(...)):
+        return await run_task("delivery_staff_agent", delivery_staff_task_manager, "DeliveryStaffAgent", request, http_request)
+
+    persona_managers = {
+        "run": task_manager,
+        "capacity_agent": capacity_task_manager,
+        "risk_agent": risk_task_manager,
+        "engagement_agent": engagement_task_manager,
+        "external_stakeholder_agent": external_stakeholder_task_manager,
+        "delivery_staff_agent": delivery_staff_task_manager,
+    }
+
+    # Persistent per-consultation channel: /ws/{persona} with streamed output
+    register_ws_channel(app, persona_managers, turn_guard, rate_limiter)
+
+    # Discovery card, built in memory from the persona registry
+    agent_card = AgentCard(
+        name,
+        description,
+        personas if personas is not None else {route: None for route, manager in persona_managers.items() if manager},
+        list(endpoints.keys()) if endpoints else [],
+    )
+
+    # Health check endpoint
+    @app.get("/health")
+    async def health_check():
+        """Health check endpoint."""
+        return {"status": "healthy", "agent": name}
+    
+    # CORS test endpoint
+    @app.get("/cors-test")
+    async def cors_test():
+        """Test CORS configuration."""
+        return {"message": "CORS is working", "timestamp": "2025-01-01", "cors": "enabled"}
+    
+    # Metadata endpoint
+    @app.get("/.well-known/agent.json")
+    async def get_metadata(request: Request):
+        """Retrieve the agent card (304 if the client's copy is current)."""
+        body, etag = agent_card.current()
+        headers = {"ETag": etag, "Cache-Control": agent_card.cache_control}
+        if agent_card.not_modified(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+    
+    # Debug endpoint for testing
+    @app.get("/debug")
+    async def debug_info():
+        """Debug information endpoint."""
+        return {
+            "agent_name": name,
+            "app_name": task_manager.runner.app_name if hasattr(task_manager, 'runner') else "unknown",
+            "available_endpoints": ["run", "health", "debug", "cors-test", ".well-known/agent.json"] + (list(endpoints.keys()) if endpoints else []),
+            "model_circuits": [breaker.snapshot() for breaker in all_breakers().values()],
+            "startup": startup_timer.report(),
+            "duplicate_requests": turn_guard.cache.stats(),
+            "coalesced_turns": turn_guard.coalescer.stats(),
+            "rate_limits": rate_limiter.stats() if rate_limiter else None,
+            "shutdown": shutdown.status(),
+        }
+    
+    # Register additional endpoints if provided
+    if endpoints:
+        for path, handler in endpoints.items():
+            app.add_api_route(f"/{path}", handler, methods=["POST"])
+
+    for router in routers or []:
+        app.include_router(router)
+    
     return app
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+Agent card served at /.well-known/agent.json.
+The card is built in memory from the persona registry, listing each persona's
+HTTP and WebSocket routes, capabilities and version, and is serialised once
+with an ETag. Discovery requests are answered from memory (304 when the client
+already holds the current card), and the card is rebuilt only when the persona
+specs change.
+
+Environment:
+    AGENT_CARD_MAX_AGE   Cache-Control max-age for the card, in seconds (default: 300)
+"""
+
+import os
+import hashlib
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from common.fast_json import dumps
+
+CARD_VERSION = "1.0.0"
+
+
+class AgentCard:
+    """Serialised agent card with its ETag, rebuilt when the persona specs it was built from change."""
+
+    def __init__(self, name: str, description: str, personas: Dict[str, Any], endpoints: Optional[List[str]] = None):
+        self.name = name
+        self.description = description
+        self.personas = personas
+        self.endpoints = list(endpoints or [])
+        self.cache_control = f"public, max-age={int(os.getenv('AGENT_CARD_MAX_AGE', '300'))}"
+        self._fingerprint: Optional[int] = None
+        self._body = b""
+        self._etag = ""
+        self._lock = threading.Lock()
+
+    def _persona_entry(self, route: str, spec: Any) -> Dict[str, Any]:
+        return {
+            "route": route,
+            "name": getattr(spec, "agent_name", route),
+            "description": getattr(spec, "description", ""),
+            "consultation_type": getattr(spec, "consultation_type", None),
+            "version": getattr(spec, "version", CARD_VERSION),
+            "endpoints": {"http": f"/{route}", "websocket": f"/ws/{route}"},
+            "capabilities": {"streaming": True, "batch": "batch" in self.endpoints, "resume": True},
+        }
+
+    def build(self) -> Dict[str, Any]:
+        routes = list(self.personas)
+        return {
+            "name": self.name,
+            "description": self.description,
+            "version": CARD_VERSION,
+            "endpoints": routes + [e for e in self.endpoints if e not in routes],
+            "personas": [self._persona_entry(route, spec) for route, spec in self.personas.items()],
+            "capabilities": {
+                "streaming": {"websocket": "/ws/{persona}"},
+                "batch": "/batch" if "batch" in self.endpoints else None,
+                "idempotency_header": "Idempotency-Key",
+            },
+        }
+
+    def current(self) -> Tuple[bytes, str]:
+        """Return the serialised card and its ETag, rebuilding only if the personas changed."""
+        # Persona specs are frozen dataclasses, so hashing them is cheap and catches any edit
+        fingerprint = hash(tuple(self.personas.items()))
+        if fingerprint != self._fingerprint:
+            with self._lock:
+                if fingerprint != self._fingerprint:
+                    body = dumps(self.build())
+                    self._etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+                    self._body = body
+                    self._fingerprint = fingerprint
+        return self._body, self._etag
+
+    def not_modified(self, if_none_match: Optional[str], etag: str) -> bool:
+        """True when an If-None-Match header already names the current card."""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison, as for GET: W/"x" matches "x"
+        return "*" in tags or any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
@@ -0,0 +1,220 @@
+"""
+Batch processing of consultation transcripts.
+Runs many (persona, transcript, context) jobs through the persona TaskManagers
+with a bounded worker pool and a per-model concurrency limit, streaming each
+result as soon as it finishes. Completed jobs are appended to a checkpoint
+file so an interrupted batch can be resumed without repeating model calls.
+
+Environment:
+    BATCH_WORKERS             Concurrent jobs per batch (default: 8)
+    BATCH_MODEL_CONCURRENCY   Concurrent jobs per model endpoint (default: 4)
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Any, Optional, List, AsyncIterator, Callable
+
+from pydantic import BaseModel, Field
+
+from common.circuit_breaker import model_endpoint
+from common.local_state import state_path
+
+logger = logging.getLogger(__name__)
+
+
+class BatchJob(BaseModel):
+    """One transcript to replay through a persona."""
+    persona: str = Field(..., description="Persona route, e.g. 'risk_agent'")
+    transcript: List[Dict[str, Any]] = Field(default_factory=list, description="Conversation as [{sender, message}]")
+    context: Dict[str, Any] = Field(default_factory=dict, description="Context sent with the turn (email, name, role, department)")
+    message: Optional[str] = Field(None, description="Message to send; defaults to the last user message of the transcript")
+    job_id: Optional[str] = Field(None, description="Stable job identifier used for checkpointing")
+    session_id: Optional[str] = Field(None, description="Session to run in; a fresh one is created if omitted")
+
+
+class BatchRequest(BaseModel):
+    """Request body for the /batch endpoint."""
+    jobs: List[BatchJob] = Field(..., description="Jobs to run")
+    batch_id: Optional[str] = Field(None, description="Name of the batch; enables resuming from its checkpoint")
+    workers: Optional[int] = Field(None, description="Concurrent jobs for this batch")
+    model_concurrency: Optional[int] = Field(None, description="Concurrent jobs per model endpoint")
+
+
+def job_key(job: BatchJob) -> str:
+    """Return the job's id, deriving a stable one from its content when none was given."""
+    if job.job_id:
+        return job.job_id
+    payload = json.dumps([job.persona, job.transcript, job.context, job.message], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def job_message(job: BatchJob) -> str:
+    """Return the message to send for a job: explicit, else the last user message."""
+    if job.message:
+        return job.message
+    for entry in reversed(job.transcript):
+        if entry.get("sender", entry.get("role")) == "user":
+            return entry.get("message", entry.get("content", ""))
+    return ""
+
+
+def checkpoint_path(batch_id: str) -> str:
+    """Return the checkpoint file for a named batch inside the state directory."""
+    safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", batch_id)
+    return state_path(f"batch_{safe_id}.jsonl")
+
+
+class BatchCheckpoint:
+    """Append-only NDJSON file of successfully completed job results."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash; the job simply runs again
+                        continue
+                    self.completed[result["job_id"]] = result
+        self._file = open(path, "a")
+
+    def record(self, result: Dict[str, Any]) -> None:
+        self.completed[result["job_id"]] = result
+        self._file.write(json.dumps(result, default=str) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class BatchRunner:
+    """Runs batch jobs against a mapping of persona route -> TaskManager."""
+
+    def __init__(self, task_managers: Dict[str, Any], workers: int = None, model_concurrency: int = None):
+        self.task_managers = task_managers
+        self.workers = workers or int(os.getenv("BATCH_WORKERS", "8"))
+        self.model_concurrency = model_concurrency or int(os.getenv("BATCH_MODEL_CONCURRENCY", "4"))
+        self._model_limits: Dict[str, asyncio.Semaphore] = {}
+
+    async def _model_limit(self, task_manager: Any) -> asyncio.Semaphore:
+        # Lazily built personas are constructed here so their model is known
+        instance = await task_manager.get() if hasattr(task_manager, "get") else task_manager
+        endpoint = model_endpoint(getattr(instance, "agent", None))
+        if endpoint not in self._model_limits:
+            self._model_limits[endpoint] = asyncio.Semaphore(self.model_concurrency)
+        return self._model_limits[endpoint]
+
+    async def run_job(self, index: int, job: BatchJob) -> Dict[str, Any]:
+        """Run one job and return its NDJSON result record; never raises."""
+        result = {"type": "result", "index": index, "job_id": job_key(job), "persona": job.persona}
+        started = time.perf_counter()
+        try:
+            task_manager = self.task_managers.get(job.persona)
+            if task_manager is None:
+                raise ValueError(f"Unknown persona '{job.persona}'")
+
+            context = dict(job.context)
+            context["conversationHistory"] = job.transcript
+            session_id = job.session_id or str(uuid.uuid4())
+
+            async with await self._model_limit(task_manager):
+                response = await task_manager.process_task(job_message(job), context, session_id)
+
+            data = response.get("data") or {}
+            result.update({
+                "status": "degraded" if data.get("degraded") else response.get("status", "success"),
+                "message": response.get("message", ""),
+                "session_id": response.get("session_id", session_id),
+                "data": data,
+            })
+        except Exception as e:
+            logger.error(f"Batch job {result['job_id']} ({job.persona}) failed: {e}")
+            result.update({"status": "error", "message": str(e), "data": {"error_type": type(e).__name__}})
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    async def run(self, jobs: List[BatchJob], checkpoint: Optional[BatchCheckpoint] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield one result per job in completion order, followed by a summary record.
+
+        Jobs already completed in the checkpoint are yielded from it with
+        ``from_checkpoint`` set instead of being run again.
+        """
+        started = time.perf_counter()
+        counts: Dict[str, int] = {}
+        pending: asyncio.Queue = asyncio.Queue()
+        results: asyncio.Queue = asyncio.Queue()
+
+        for index, job in enumerate(jobs):
+            previous = checkpoint.completed.get(job_key(job)) if checkpoint else None
+            if previous is not None:
+                counts["resumed"] = counts.get("resumed", 0) + 1
+                yield {**previous, "index": index, "from_checkpoint": True}
+            else:
+                pending.put_nowait((index, job))
+
+        async def worker() -> None:
+            while True:
+                try:
+                    index, job = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await results.put(await self.run_job(index, job))
+
+        to_run = pending.qsize()
+        tasks = [asyncio.create_task(worker()) for _ in range(min(self.workers, to_run))]
+        try:
+            for _ in range(to_run):
+                result = await results.get()
+                counts[result["status"]] = counts.get(result["status"], 0) + 1
+                if checkpoint and result["status"] == "success":
+                    checkpoint.record(result)
+                yield result
+        finally:
+            # Stop outstanding work if the consumer goes away (e.g. client disconnect)
+            for task in tasks:
+                task.cancel()
+
+        yield {
+            "type": "summary",
+            "jobs": len(jobs),
+            "counts": counts,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+
+async def stream_batch_ndjson(runner: BatchRunner, jobs: List[BatchJob], batch_id: Optional[str] = None) -> AsyncIterator[str]:
+    """Run a batch and yield its records as NDJSON lines, checkpointing when named."""
+    checkpoint = BatchCheckpoint(checkpoint_path(batch_id)) if batch_id else None
+    try:
+        async for record in runner.run(jobs, checkpoint):
+            yield json.dumps(record, default=str) + "\n"
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+
+def create_batch_endpoint(task_managers: Dict[str, Any]) -> Callable:
+    """Return a POST handler that streams batch results as NDJSON."""
+    from fastapi import Body
+    from fastapi.responses import StreamingResponse
+
+    async def batch(request: BatchRequest = Body(...)):
+        """Run many persona jobs and stream one JSON result per line."""
+        runner = BatchRunner(task_managers, workers=request.workers, model_concurrency=request.model_concurrency)
+        logger.info(f"Starting batch {request.batch_id or '(unnamed)'} with {len(request.jobs)} jobs")
+        return StreamingResponse(
+            stream_batch_ndjson(runner, request.jobs, request.batch_id),
+            media_type="application/x-ndjson",
+        )
+
+    return batch
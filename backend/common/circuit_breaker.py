@@ -0,0 +1,175 @@
+"""
+Circuit breaker for model provider calls.
+Each model endpoint gets its own breaker that trips after repeated errors or
+slow calls, so requests fail fast during a provider incident instead of every
+request waiting out the full failure time.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit for its endpoint is open."""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"Model endpoint '{endpoint}' is unavailable (circuit open)")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker tracking consecutive failures and slow calls."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        slow_call_seconds: float = 45.0,
+        reset_timeout: float = 30.0,
+        call_timeout: Optional[float] = None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.call_timeout = call_timeout
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.last_error: Optional[str] = None
+        self.total_calls = 0
+        self.total_failures = 0
+        self.total_rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow_request(self) -> bool:
+        """Return True if a call may go to the provider right now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self._retry_after() > 0:
+                self.total_rejected += 1
+                return False
+            # Cool-down elapsed: let exactly one probe through
+            if self._probe_in_flight:
+                self.total_rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self, duration: float) -> None:
+        """Record a completed call; slow calls count as failures."""
+        if duration > self.slow_call_seconds:
+            self.record_failure(f"slow call ({duration:.1f}s)")
+            return
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for model '{self.name}' closed after successful probe")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, reason: str) -> None:
+        """Record a failed call and trip the breaker if the threshold is reached."""
+        with self._lock:
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            self.last_error = reason
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.error(f"Circuit for model '{self.name}' opened: {reason}")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    async def call(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run an async provider call through the breaker."""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self._retry_after())
+
+        self.total_calls += 1
+        started = time.monotonic()
+        try:
+            if self.call_timeout:
+                result = await asyncio.wait_for(func(), timeout=self.call_timeout)
+            else:
+                result = await func()
+        except asyncio.CancelledError:
+            # Client went away; not the provider's fault
+            with self._lock:
+                self._probe_in_flight = False
+            raise
+        except asyncio.TimeoutError:
+            self.record_failure(f"timeout after {self.call_timeout}s")
+            raise
+        except Exception as e:
+            self.record_failure(f"{type(e).__name__}: {e}")
+            raise
+
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the breaker state for health and debug endpoints."""
+        return {
+            "endpoint": self.name,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after": round(self._retry_after(), 1) if self.state != self.CLOSED else 0,
+            "last_error": self.last_error,
+            "total_calls": self.total_calls,
+            "total_failures": self.total_failures,
+            "total_rejected": self.total_rejected,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    """Return the shared breaker for a model endpoint, creating it from env config."""
+    with _registry_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            call_timeout = float(os.getenv("MODEL_CALL_TIMEOUT_SECONDS", "0")) or None
+            breaker = CircuitBreaker(
+                name=endpoint,
+                failure_threshold=int(os.getenv("MODEL_BREAKER_FAILURE_THRESHOLD", "5")),
+                slow_call_seconds=float(os.getenv("MODEL_BREAKER_SLOW_CALL_SECONDS", "45")),
+                reset_timeout=float(os.getenv("MODEL_BREAKER_RESET_SECONDS", "30")),
+                call_timeout=call_timeout,
+            )
+            _breakers[endpoint] = breaker
+        return breaker
+
+
+def all_breakers() -> Dict[str, CircuitBreaker]:
+    """Return every breaker created so far, keyed by endpoint."""
+    with _registry_lock:
+        return dict(_breakers)
+
+
+def model_endpoint(agent: Any) -> str:
+    """Return the model endpoint name an ADK agent calls (plain string or LiteLlm wrapper)."""
+    model = getattr(agent, "model", None)
+    if isinstance(model, str):
+        return model or "default"
+    return getattr(model, "model", None) or type(model).__name__
@@ -0,0 +1,180 @@
+"""
+Fast JSON encoding and decoding, and response compression, for the A2A server.
+Plan turns return large HTML documents inside the JSON response, and every turn
+posts the whole conversation history, so both directions go through orjson
+when it is installed (falling back to the standard library otherwise).
+Responses above a size threshold are compressed with brotli or gzip,
+whichever the client prefers and the server has available.
+
+Environment:
+    RESPONSE_COMPRESSION             "0" to disable response compression (default: enabled)
+    RESPONSE_COMPRESSION_MIN_BYTES   Smallest response body worth compressing (default: 1024)
+"""
+
+import os
+import gzip
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialise to UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(body: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class FastJSONRequest(Request):
+    """Request whose JSON body is parsed with orjson when available."""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = loads(await self.body())
+        return self._json
+
+
+class FastJSONRoute(APIRoute):
+    """APIRoute that hands endpoints a FastJSONRequest, so body validation starts from orjson output."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def fast_json_handler(request: Request) -> Response:
+            return await handler(FastJSONRequest(request.scope, request.receive))
+
+        return fast_json_handler
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick 'br' or 'gzip' from an Accept-Encoding header, honouring q-values; None if neither is acceptable."""
+    preferences: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        preferences[token.strip().lower()] = quality
+
+    candidates: List[Tuple[float, int, str]] = []
+    for rank, encoding in enumerate(("br", "gzip")):
+        if encoding == "br" and brotli is None:
+            continue
+        quality = preferences.get(encoding, preferences.get("*", 0.0))
+        if quality > 0:
+            # Ties go to brotli, which is smaller for HTML-heavy JSON
+            candidates.append((-quality, rank, encoding))
+    return min(candidates)[2] if candidates else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        # Quality 4-5 is the usual sweet spot for dynamic responses: close to gzip -9 size at gzip -6 speed
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=6)
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing complete JSON/text responses above a size threshold.
+
+    Only single-message bodies are compressed. Streaming responses (NDJSON
+    batches, exports, event streams) pass through untouched, so they are never
+    buffered.
+    """
+
+    def __init__(self, app: Any, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Dict[str, Any]] = None
+
+        async def compressing_send(message: Dict[str, Any]) -> None:
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Hold the headers until the first body chunk shows whether to compress
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start_message)
+                start_message = None
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            start_message = None
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
+
+
+def install_fast_json(app: Any) -> None:
+    """Route new endpoints through the fast JSON request class and add response compression."""
+    app.router.route_class = FastJSONRoute
+    if os.getenv("RESPONSE_COMPRESSION", "1") != "0":
+        app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024")))
+    logger.info(
+        f"JSON via {'orjson' if orjson is not None else 'stdlib json'}; "
+        f"compression: {'brotli+gzip' if brotli is not None else 'gzip'}"
+    )
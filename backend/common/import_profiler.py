@@ -0,0 +1,106 @@
+"""
+Import-time profiler for the agent server.
+Runs a fresh interpreter with ``-X importtime`` and turns its output into a
+report of the slowest imports, optionally failing when the total exceeds a
+budget so cold-start regressions can be caught in CI.
+
+Usage (from the backend directory):
+    python -m common.import_profiler --module agent.__main__ --top 25 --max-ms 1500
+
+tests/test_import_time.py runs the same check under pytest, with the budget
+taken from IMPORT_BUDGET_MS.
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, Any, List, Optional
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# "import time:       123 |       4567 |     package.module"
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Parse ``-X importtime`` output into entries with self/cumulative microseconds."""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        entries.append({
+            "module": name,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            # importtime indents nested imports by two spaces per level
+            "depth": max(0, (len(indent) - 1) // 2),
+        })
+    return entries
+
+
+def profile_imports(module: str = "agent.__main__", cwd: str = BACKEND_DIR) -> Dict[str, Any]:
+    """Import ``module`` in a clean interpreter and return the parsed timing report."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    entries = parse_importtime(completed.stderr)
+    top_level = [e for e in entries if e["depth"] == 0]
+    errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+    return {
+        "module": module,
+        "ok": completed.returncode == 0,
+        "errors": errors[-20:],
+        "total_ms": round(sum(e["cumulative_us"] for e in top_level) / 1000, 1),
+        "module_count": len(entries),
+        "entries": entries,
+    }
+
+
+def format_report(report: Dict[str, Any], top: int = 25) -> str:
+    """Render the slowest imports by cumulative time as a text table."""
+    lines = [
+        f"Import profile for {report['module']}: {report['total_ms']} ms across {report['module_count']} modules",
+        f"{'cumulative ms':>14} {'self ms':>9}  module",
+    ]
+    slowest = sorted(report["entries"], key=lambda e: e["cumulative_us"], reverse=True)[:top]
+    for entry in slowest:
+        lines.append(f"{entry['cumulative_us'] / 1000:>14.1f} {entry['self_us'] / 1000:>9.1f}  {'  ' * entry['depth']}{entry['module']}")
+    if not report["ok"]:
+        lines.append("Import failed:")
+        lines.extend(f"  {line}" for line in report["errors"])
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Profile import time of the agent server")
+    parser.add_argument("--module", default="agent.__main__", help="Module to import")
+    parser.add_argument("--top", type=int, default=25, help="Number of slowest imports to show")
+    parser.add_argument("--output", help="Write the full JSON report to this path")
+    parser.add_argument("--max-ms", type=float, help="Exit non-zero if total import time exceeds this budget")
+    args = parser.parse_args(argv)
+
+    report = profile_imports(args.module)
+    print(format_report(report, args.top))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if not report["ok"]:
+        return 2
+    if args.max_ms is not None and report["total_ms"] > args.max_ms:
+        print(f"Import time {report['total_ms']} ms exceeds budget of {args.max_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""
+Local on-disk state for the agent server.
+Provides the state directory and SQLite connections shared by the plan queue
+and other stores that must survive restarts and be visible to every worker.
+"""
+
+import os
+import sqlite3
+
+# Default state directory lives next to the backend package
+DEFAULT_STATE_DIR = os.path.join(os.path.dirname(__file__), '..', '.state')
+
+
+def state_dir() -> str:
+    """Return the local state directory, creating it if needed."""
+    path = os.path.abspath(os.getenv("LOCAL_STATE_DIR", DEFAULT_STATE_DIR))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def state_path(filename: str) -> str:
+    """Return the absolute path of a file inside the state directory."""
+    return os.path.join(state_dir(), filename)
+
+
+def connect(filename: str) -> sqlite3.Connection:
+    """
+    Open a SQLite database inside the state directory.
+
+    WAL mode lets several worker processes read while one writes, and the busy
+    timeout makes concurrent writers wait instead of failing immediately.
+    """
+    conn = sqlite3.connect(state_path(filename), timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
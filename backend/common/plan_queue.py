@@ -0,0 +1,155 @@
+"""
+Deferred plan generation queue.
+While the model provider is unavailable, turns that would produce a plan are
+parked here and replayed once the circuit breaker lets calls through again.
+A job is dropped if its session has a turn served normally before the job is
+replayed: the conversation has moved on, and replaying the parked turn would
+run it out of order against the session.
+"""
+
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, and no multi-worker deployments to coordinate
+    fcntl = None
+
+from common.local_state import connect, state_path
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DB = "plan_queue.sqlite3"
+
+
+class PlanQueue:
+    """SQLite-backed queue of plan generation jobs, one pending job per persona session."""
+
+    def __init__(self, filename: str = QUEUE_DB):
+        self.conn = connect(filename)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS plan_jobs (
+                persona TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                message TEXT NOT NULL,
+                context TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                queued_at REAL NOT NULL,
+                PRIMARY KEY (persona, session_id)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def enqueue(self, persona: str, message: str, context: Dict[str, Any], session_id: str) -> None:
+        """Queue a job; a newer turn for the same session replaces the older one."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO plan_jobs (persona, session_id, message, context, attempts, queued_at) "
+                "VALUES (?, ?, ?, ?, 0, ?)",
+                (persona, session_id, message, json.dumps(context or {}), time.time()),
+            )
+        logger.info(f"Queued deferred plan generation for {persona} session {session_id}")
+
+    def pending(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Return the oldest pending jobs."""
+        rows = self.conn.execute(
+            "SELECT persona, session_id, message, context, attempts FROM plan_jobs ORDER BY queued_at LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [
+            {
+                "persona": row["persona"],
+                "session_id": row["session_id"],
+                "message": row["message"],
+                "context": json.loads(row["context"]),
+                "attempts": row["attempts"],
+            }
+            for row in rows
+        ]
+
+    def complete(self, persona: str, session_id: str) -> bool:
+        """Remove the session's job; returns whether there was one."""
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM plan_jobs WHERE persona = ? AND session_id = ?", (persona, session_id))
+        return cursor.rowcount > 0
+
+    def mark_attempt(self, persona: str, session_id: str) -> None:
+        with self.conn:
+            self.conn.execute(
+                "UPDATE plan_jobs SET attempts = attempts + 1 WHERE persona = ? AND session_id = ?",
+                (persona, session_id),
+            )
+
+    def depth(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM plan_jobs").fetchone()[0]
+
+
+_queue: Optional[PlanQueue] = None
+
+
+def get_plan_queue() -> PlanQueue:
+    """Return the process-wide plan queue."""
+    global _queue
+    if _queue is None:
+        _queue = PlanQueue()
+    return _queue
+
+
+async def drain_plan_queue(task_managers: Dict[str, Any], interval: float = 30.0, max_attempts: int = 5) -> None:
+    """
+    Periodically replay queued plan jobs through their persona's TaskManager.
+
+    A replayed turn that still comes back degraded means the provider is not
+    back yet, so draining stops until the next interval. With several workers
+    only the one holding the drain lock replays jobs; another takes over if it exits.
+    """
+    queue = get_plan_queue()
+    lock_file = open(state_path("plan_queue.lock"), "w")
+    is_leader = False
+    while True:
+        await asyncio.sleep(interval)
+        if not is_leader:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                is_leader = True
+            except OSError:
+                continue
+
+        for job in queue.pending():
+            task_manager = task_managers.get(job["persona"])
+            if task_manager is None:
+                logger.warning(f"Dropping queued plan job for unknown persona '{job['persona']}'")
+                queue.complete(job["persona"], job["session_id"])
+                continue
+
+            try:
+                result = await task_manager.process_task(job["message"], job["context"], job["session_id"])
+            except Exception as e:
+                logger.error(f"Deferred plan job failed for {job['persona']} session {job['session_id']}: {e}")
+                result = {"status": "error"}
+
+            if result.get("data", {}).get("degraded"):
+                break
+
+            if result.get("status") == "success" or job["attempts"] + 1 >= max_attempts:
+                queue.complete(job["persona"], job["session_id"])
+                logger.info(f"Deferred plan job finished for {job['persona']} session {job['session_id']} ({result.get('status')})")
+            else:
+                queue.mark_attempt(job["persona"], job["session_id"])
+
+
+async def supersede_plan_job(persona: str, session_id: Optional[str]) -> None:
+    """Drop a session's queued job after one of its turns was served normally."""
+    if not session_id:
+        return
+    try:
+        if await asyncio.to_thread(get_plan_queue().complete, persona, session_id):
+            logger.info(f"Dropped queued plan job for {persona} session {session_id}: the conversation continued")
+    except Exception as e:
+        logger.error(f"Could not check plan queue for {persona} session {session_id}: {e}")
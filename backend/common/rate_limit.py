@@ -0,0 +1,277 @@
+"""
+Token-bucket rate limiting for consultation turns.
+Each turn takes one token from up to three buckets: the user's email (from the
+request context), the session, and the client IP. A turn is refused with 429
+if any of its buckets is empty, and then takes nothing from the others, so a
+runaway retry loop on one session can't drain the user's or campus's quota.
+Buckets live in memory for a single worker, or in a SQLite table in the local
+state directory so every worker on the host shares them. SQLite checks run in
+a worker thread and wait only briefly for another worker's write lock; a
+check that can't get it lets the turn through rather than stall it.
+
+Limits are "<burst>/<seconds>": a bucket holds up to <burst> tokens and refills
+at <burst> tokens per <seconds>. "0" disables that key.
+
+Environment:
+    RATE_LIMIT                   "0" to disable rate limiting (default: enabled)
+    RATE_LIMIT_EMAIL             Per-user limit (default: 40/60)
+    RATE_LIMIT_SESSION           Per-session limit (default: 20/60)
+    RATE_LIMIT_IP                Per-client-IP limit; campuses share NAT addresses (default: 300/60)
+    RATE_LIMIT_STORE             "memory" or "sqlite" (default: memory, sqlite when WEB_CONCURRENCY > 1)
+    RATE_LIMIT_BUSY_TIMEOUT_MS   How long a SQLite check waits for the write lock before allowing the turn (default: 200)
+    RATE_LIMIT_TRUST_FORWARDED   "1" to take the client IP from X-Forwarded-For (behind a proxy)
+"""
+
+import os
+import math
+import time
+import asyncio
+import threading
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+from common.local_state import connect
+from common.session_store import worker_count
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_DB = "rate_limits.sqlite3"
+
+DEFAULT_LIMITS = {"email": "40/60", "session": "20/60", "ip": "300/60"}
+
+
+@dataclass(frozen=True)
+class Limit:
+    """A bucket size and the time it takes to refill completely."""
+    capacity: float
+    per_seconds: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.per_seconds
+
+
+def parse_limit(value: str) -> Optional[Limit]:
+    """Parse "<burst>/<seconds>"; returns None for "0" or an empty value."""
+    value = (value or "").strip()
+    if not value or value == "0":
+        return None
+    burst, _, seconds = value.partition("/")
+    return Limit(float(burst), float(seconds or 1))
+
+
+@dataclass
+class RateDecision:
+    allowed: bool
+    limit: Optional[Limit] = None
+    remaining: int = 0
+    retry_after: float = 0.0
+    reset_after: float = 0.0
+    limited_by: Optional[str] = None
+
+    def headers(self) -> Dict[str, str]:
+        """Rate limit response headers (Retry-After only when refused)."""
+        if self.limit is None:
+            return {}
+        headers = {
+            "X-RateLimit-Limit": f"{self.limit.capacity:g}",
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def _refill(tokens: float, updated: float, now: float, limit: Limit) -> float:
+    return min(limit.capacity, tokens + max(0.0, now - updated) * limit.rate)
+
+
+def _decide(buckets: List[Tuple[str, Limit, float]]) -> RateDecision:
+    """Decide from (kind, limit, available tokens) for every bucket the turn draws on."""
+    empty = [(kind, limit, tokens) for kind, limit, tokens in buckets if tokens < 1]
+    if empty:
+        kind, limit, tokens = max(empty, key=lambda b: (1 - b[2]) / b[1].rate)
+        return RateDecision(
+            False, limit, 0, retry_after=(1 - tokens) / limit.rate,
+            reset_after=(limit.capacity - tokens) / limit.rate, limited_by=kind,
+        )
+    # Report the bucket closest to running out
+    kind, limit, tokens = min(buckets, key=lambda b: b[2] / b[1].capacity)
+    remaining = tokens - 1
+    return RateDecision(True, limit, int(remaining), reset_after=(limit.capacity - remaining) / limit.rate)
+
+
+class MemoryBucketStore:
+    """Buckets for one process, bounded by evicting the least recently used keys."""
+
+    # take() never waits on I/O, so it runs on the event loop
+    blocking = False
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, keys: List[Tuple[str, str, Limit]]) -> RateDecision:
+        now = time.monotonic()
+        with self._lock:
+            buckets = []
+            for kind, key, limit in keys:
+                tokens, updated = self._buckets.get(key, (limit.capacity, now))
+                buckets.append((kind, limit, _refill(tokens, updated, now, limit)))
+            decision = _decide(buckets)
+            for (kind, key, limit), (_, _, tokens) in zip(keys, buckets):
+                self._buckets[key] = (tokens - 1 if decision.allowed else tokens, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return decision
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteBucketStore:
+    """Buckets shared by every worker on the host, updated in one write transaction per turn."""
+
+    PRUNE_EVERY = 1000
+    blocking = True
+
+    def __init__(self, filename: str = RATE_LIMIT_DB, busy_timeout_ms: int = None):
+        self.conn = connect(filename)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+        # Transactions are managed explicitly so the read-modify-write takes the write lock up front
+        self.conn.isolation_level = None
+        # Setup above waits out other workers as usual; a turn is better let through than held
+        # behind another worker's write lock
+        if busy_timeout_ms is None:
+            busy_timeout_ms = int(os.getenv("RATE_LIMIT_BUSY_TIMEOUT_MS", "200"))
+        self.conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, keys: List[Tuple[str, str, Limit]]) -> RateDecision:
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                buckets = []
+                for kind, key, limit in keys:
+                    row = self.conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+                    tokens, updated = (row["tokens"], row["updated"]) if row else (limit.capacity, now)
+                    buckets.append((kind, limit, _refill(tokens, updated, now, limit)))
+                decision = _decide(buckets)
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    [(key, tokens - 1 if decision.allowed else tokens, now) for (_, key, _), (_, _, tokens) in zip(keys, buckets)],
+                )
+                self._calls += 1
+                if self._calls % self.PRUNE_EVERY == 0:
+                    # A bucket untouched for an hour has refilled under any sensible limit
+                    self.conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - 3600,))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return decision
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0]
+
+
+class RateLimiter:
+    """Checks turns against the per-email, per-session and per-IP limits and counts the outcomes."""
+
+    def __init__(self, limits: Dict[str, Optional[Limit]], store: Any):
+        self.limits = {kind: limit for kind, limit in limits.items() if limit is not None}
+        self.store = store
+        self.allowed = 0
+        self.limited: Dict[str, int] = {kind: 0 for kind in self.limits}
+        # Last warning per limited key, so a retry loop logs once a minute rather than per request
+        self._warned: "OrderedDict[str, float]" = OrderedDict()
+
+    def check(self, email: Optional[str] = None, session_id: Optional[str] = None, ip: Optional[str] = None) -> RateDecision:
+        """Take one token for a turn, or refuse it if any of its buckets is empty."""
+        identities = {"email": (email or "").strip().lower(), "session": session_id or "", "ip": ip or ""}
+        keys = [
+            (kind, f"{kind}:{identities[kind]}", limit)
+            for kind, limit in self.limits.items()
+            if identities.get(kind)
+        ]
+        if not keys:
+            return RateDecision(True)
+        try:
+            decision = self.store.take(keys)
+        except Exception as e:
+            # The limiter protects quota; it must never take the service down with it
+            logger.error(f"Rate limit check failed, allowing turn: {e}")
+            return RateDecision(True)
+        if decision.allowed:
+            self.allowed += 1
+        else:
+            self.limited[decision.limited_by] += 1
+            key = f"{decision.limited_by}:{identities[decision.limited_by]}"
+            now = time.monotonic()
+            if now - self._warned.get(key, -60.0) >= 60:
+                logger.warning(f"Rate limited {key[:80]} (retry in {decision.retry_after:.1f}s)")
+                self._warned[key] = now
+                self._warned.move_to_end(key)
+                while len(self._warned) > 1000:
+                    self._warned.popitem(last=False)
+        return decision
+
+    async def check_async(self, email: Optional[str] = None, session_id: Optional[str] = None, ip: Optional[str] = None) -> RateDecision:
+        """check() for request handlers: a store that touches the disk is called from a worker thread."""
+        if getattr(self.store, "blocking", True):
+            return await asyncio.to_thread(self.check, email, session_id, ip)
+        return self.check(email, session_id, ip)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "store": type(self.store).__name__,
+            "limits": {kind: f"{limit.capacity:g}/{limit.per_seconds:g}" for kind, limit in self.limits.items()},
+            "allowed": self.allowed,
+            "limited": dict(self.limited),
+            "buckets": len(self.store),
+        }
+
+
+def client_ip(headers: Any, client: Any) -> Optional[str]:
+    """The caller's IP: the first X-Forwarded-For hop when RATE_LIMIT_TRUST_FORWARDED=1, else the peer address."""
+    if os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0") == "1":
+        forwarded = headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return client.host if client else None
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Return the process-wide rate limiter built from the environment, or None if disabled."""
+    global _limiter
+    if os.getenv("RATE_LIMIT", "1") == "0":
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                limits = {kind: parse_limit(os.getenv(f"RATE_LIMIT_{kind.upper()}", default)) for kind, default in DEFAULT_LIMITS.items()}
+                default_store = "sqlite" if worker_count() > 1 else "memory"
+                store = SQLiteBucketStore() if os.getenv("RATE_LIMIT_STORE", default_store).lower() == "sqlite" else MemoryBucketStore()
+                _limiter = RateLimiter(limits, store)
+                logger.info(f"Rate limiting turns: {_limiter.stats()['limits']} ({type(store).__name__})")
+    return _limiter
@@ -0,0 +1,188 @@
+"""
+Liveness and readiness probes.
+/health/live only says the process is serving requests. /health/ready reports
+whether this instance can actually serve consultations: the session store and
+Supabase answer, the plan queue is not backed up, and the personas named in
+WARMUP_PERSONAS are built. Open model circuits are reported as degraded but
+don't fail readiness: the model provider is shared by every instance, and
+degraded mode still serves turns, so taking instances out of rotation would
+only concentrate the same outage on fewer of them.
+The checks run in a background loop and the probe returns the cached report,
+so load balancer probes never touch the database or the model themselves.
+
+Environment:
+    READINESS_REFRESH_SECONDS        Interval between readiness checks (default: 15)
+    READINESS_CHECK_TIMEOUT_SECONDS  A check slower than this fails (default: 5)
+    READINESS_MAX_QUEUE_DEPTH        Not ready above this many queued plan jobs (default: 0, no limit)
+    READINESS_OPTIONAL_CHECKS        Comma-separated checks reported but not required (e.g. "database" in local dev)
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Callable, List, Optional
+
+from fastapi import APIRouter
+
+from common.circuit_breaker import CircuitBreaker, all_breakers
+from common.fast_json import FastJSONResponse
+from common.plan_queue import get_plan_queue
+from common.session_store import session_store_kind, session_db_url
+from common.shutdown import get_shutdown_coordinator
+from common.supabase_client import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+
+def check_session_store() -> Dict[str, Any]:
+    kind = session_store_kind()
+    if kind == "memory":
+        return {"ok": True, "kind": kind}
+    url = session_db_url()
+    if url.startswith("sqlite:///"):
+        conn = sqlite3.connect(url[len("sqlite:///"):], timeout=2)
+        try:
+            conn.execute("SELECT 1").fetchone()
+        finally:
+            conn.close()
+    else:
+        from sqlalchemy import create_engine, text
+        engine = create_engine(url, pool_pre_ping=True)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        finally:
+            engine.dispose()
+    return {"ok": True, "kind": kind}
+
+
+def check_database() -> Dict[str, Any]:
+    if not os.getenv("SUPABASE_URL") or not os.getenv("SUPABASE_ANON_KEY"):
+        # Checked here so a misconfigured instance doesn't log a client error every refresh
+        return {"ok": False, "detail": "Supabase credentials not configured"}
+    supabase = get_supabase_client()
+    if supabase is None:
+        return {"ok": False, "detail": "Supabase client failed to start"}
+    # Cheapest query that exercises the shared client's connection pool and credentials
+    supabase.table("consultation_data").select("id").limit(1).execute()
+    return {"ok": True}
+
+
+def check_models() -> Dict[str, Any]:
+    snapshots = [breaker.snapshot() for breaker in all_breakers().values()]
+    open_endpoints = [s["endpoint"] for s in snapshots if s["state"] == CircuitBreaker.OPEN]
+    # Open circuits mean degraded mode (scripted questions, queued plans), which this instance still serves
+    return {
+        "ok": True,
+        "degraded": bool(open_endpoints),
+        "open": open_endpoints,
+        "endpoints": len(snapshots),
+    }
+
+
+def check_plan_queue() -> Dict[str, Any]:
+    depth = get_plan_queue().depth()
+    limit = int(os.getenv("READINESS_MAX_QUEUE_DEPTH", "0"))
+    return {"ok": not limit or depth <= limit, "depth": depth, "limit": limit or None}
+
+
+class ReadinessMonitor:
+    """Runs the readiness checks periodically and holds the latest report."""
+
+    def __init__(self, persona_status: Callable[[], Dict[str, Any]], warm_up: Optional[List[str]] = None):
+        """
+        Args:
+            persona_status: Returns {route: {"ready": bool, "error": str|None}} for every persona
+            warm_up: Personas that must be built before the instance is ready (None for all)
+        """
+        self.persona_status = persona_status
+        self.warm_up = warm_up
+        self.interval = float(os.getenv("READINESS_REFRESH_SECONDS", "15"))
+        self.timeout = float(os.getenv("READINESS_CHECK_TIMEOUT_SECONDS", "5"))
+        self.optional = {c.strip() for c in os.getenv("READINESS_OPTIONAL_CHECKS", "").split(",") if c.strip()}
+        self.checks: Dict[str, Callable[[], Dict[str, Any]]] = {
+            "session_store": check_session_store,
+            "database": check_database,
+            "models": check_models,
+            "plan_queue": check_plan_queue,
+            "personas": self.check_personas,
+        }
+        self.report: Optional[Dict[str, Any]] = None
+        self.refreshed_at = 0.0
+
+    def check_personas(self) -> Dict[str, Any]:
+        status = self.persona_status()
+        required = list(status) if self.warm_up is None else [r for r in self.warm_up if r in status]
+        pending = [route for route in required if not status[route]["ready"]]
+        return {"ok": not pending, "required": required, "pending": pending, "personas": status}
+
+    async def run_check(self, name: str, check: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(asyncio.to_thread(check), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            result = {"ok": False, "detail": f"timed out after {self.timeout}s"}
+        except Exception as e:
+            result = {"ok": False, "detail": f"{type(e).__name__}: {e}"}
+        result["latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+        if name in self.optional:
+            result["optional"] = True
+        return result
+
+    async def refresh(self) -> Dict[str, Any]:
+        names = list(self.checks)
+        results = await asyncio.gather(*(self.run_check(name, self.checks[name]) for name in names))
+        checks = dict(zip(names, results))
+        ready = all(result["ok"] for name, result in checks.items() if name not in self.optional)
+        if self.report is not None and ready != self.report["ready"]:
+            failing = [name for name, result in checks.items() if not result["ok"]]
+            logger.warning(f"Readiness changed to {'ready' if ready else 'not ready'}" + (f" (failing: {', '.join(failing)})" if failing else ""))
+        self.report = {
+            "ready": ready,
+            "degraded": any(result.get("degraded") for result in checks.values()),
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "checks": checks,
+        }
+        self.refreshed_at = time.monotonic()
+        return self.report
+
+    def current(self) -> Dict[str, Any]:
+        """The cached report, marked not ready if none exists yet, it stopped refreshing, or the instance is draining."""
+        if get_shutdown_coordinator().draining:
+            return {"ready": False, "detail": "instance is shutting down"}
+        if self.report is None:
+            return {"ready": False, "detail": "readiness checks have not completed yet"}
+        age = time.monotonic() - self.refreshed_at
+        if age > max(3 * self.interval, self.timeout + self.interval):
+            return {**self.report, "ready": False, "detail": f"readiness report is stale ({age:.0f}s old)"}
+        return {**self.report, "age_seconds": round(age, 1)}
+
+    async def run(self) -> None:
+        """Refresh the report now and then every READINESS_REFRESH_SECONDS."""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Readiness refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+def create_health_router(monitor: ReadinessMonitor) -> APIRouter:
+    """Return the /health/live and /health/ready probe router."""
+    router = APIRouter(prefix="/health", tags=["health"])
+
+    @router.get("/live")
+    async def live():
+        """Liveness: the process and its event loop are serving requests."""
+        return {"status": "alive", "pid": os.getpid()}
+
+    @router.get("/ready")
+    async def ready():
+        """Readiness: the cached result of the last background checks (503 when not ready)."""
+        report = monitor.current()
+        return FastJSONResponse(report, status_code=200 if report["ready"] else 503)
+
+    return router
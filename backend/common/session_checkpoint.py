@@ -0,0 +1,107 @@
+"""
+Checkpointing of in-memory ADK sessions across restarts.
+With the in-memory session store (a single worker), every session lives only
+in the process. At shutdown each persona's sessions are written to a JSON file
+in the local state directory; the next instance loads the file at startup and
+replays each persona's sessions into its session service when the persona is
+built. Personas that were never built keep their checkpointed sessions for the
+following restart. The shared SQLite store is already durable and is skipped.
+"""
+
+import os
+import json
+import logging
+from typing import Dict, Any, List
+
+from common.local_state import state_path
+from common.session_store import session_store_kind
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "session_checkpoint.json"
+
+# Sessions loaded from the last checkpoint, by persona route, until that persona is built
+_pending: Dict[str, List[Dict[str, Any]]] = {}
+
+
+def load_checkpoint() -> int:
+    """Read the checkpoint left by the previous instance; returns how many sessions are pending restore."""
+    path = state_path(CHECKPOINT_FILE)
+    if session_store_kind() != "memory" or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r") as f:
+            _pending.update(json.load(f).get("personas", {}))
+    except (OSError, ValueError) as e:
+        logger.error(f"Ignoring unreadable session checkpoint {path}: {e}")
+        return 0
+    # Consumed: a crash before the next clean shutdown must not resurrect these sessions twice
+    os.replace(path, path + ".loaded")
+    count = sum(len(sessions) for sessions in _pending.values())
+    logger.info(f"Loaded {count} checkpointed sessions for {len(_pending)} personas")
+    return count
+
+
+def _stored_sessions(session_service: Any) -> List[Any]:
+    """Every session held by an InMemorySessionService (app -> user -> session id)."""
+    stored = getattr(session_service, "sessions", None) or {}
+    return [session for users in stored.values() for sessions in users.values() for session in sessions.values()]
+
+
+def dump_sessions(session_service: Any) -> List[Dict[str, Any]]:
+    return [
+        {
+            "app_name": session.app_name,
+            "user_id": session.user_id,
+            "id": session.id,
+            "state": session.state,
+            "events": [event.model_dump(mode="json", exclude_none=True) for event in session.events],
+        }
+        for session in _stored_sessions(session_service)
+    ]
+
+
+async def restore_sessions(route: str, session_service: Any) -> int:
+    """Replay checkpointed sessions for ``route`` into a freshly built session service."""
+    records = _pending.pop(route, None)
+    if not records:
+        return 0
+    from google.adk.events import Event
+
+    restored = 0
+    for record in records:
+        try:
+            session = await session_service.create_session(
+                app_name=record["app_name"], user_id=record["user_id"], session_id=record["id"], state=record["state"]
+            )
+            for event in record["events"]:
+                await session_service.append_event(session, Event.model_validate(event))
+            restored += 1
+        except Exception as e:
+            logger.warning(f"Could not restore session {record.get('id')} for {route}: {e}")
+    logger.info(f"Restored {restored} checkpointed sessions for persona '{route}'")
+    return restored
+
+
+def checkpoint_sessions(session_services: Dict[str, Any]) -> int:
+    """
+    Write every session of the built personas, plus sessions still pending
+    for unbuilt ones, to the checkpoint file. Returns the number written.
+    """
+    if session_store_kind() != "memory":
+        return 0
+    personas: Dict[str, List[Dict[str, Any]]] = {route: list(records) for route, records in _pending.items()}
+    for route, session_service in session_services.items():
+        try:
+            personas[route] = dump_sessions(session_service)
+        except Exception as e:
+            logger.error(f"Could not checkpoint sessions for {route}: {e}")
+    count = sum(len(records) for records in personas.values())
+    if not count:
+        return 0
+    path = state_path(CHECKPOINT_FILE)
+    with open(path + ".partial", "w") as f:
+        json.dump({"personas": personas}, f)
+    os.replace(path + ".partial", path)
+    logger.info(f"Checkpointed {count} sessions to {path}")
+    return count
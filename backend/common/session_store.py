@@ -0,0 +1,47 @@
+"""
+Session store selection for the ADK runners.
+A single worker keeps sessions in memory; multi-worker deployments use a
+shared SQLite database (or any SQLAlchemy URL) so that any worker can serve
+any turn of a consultation.
+
+Environment:
+    SESSION_STORE   "memory" or "sqlite" (default: memory, sqlite when WEB_CONCURRENCY > 1)
+    SESSION_DB_URL  Explicit database URL; overrides the local SQLite file
+"""
+
+import os
+import logging
+from typing import Any
+
+from common.local_state import state_path
+
+logger = logging.getLogger(__name__)
+
+SESSION_DB_FILE = "sessions.sqlite3"
+
+
+def worker_count() -> int:
+    """Return the configured number of server worker processes."""
+    return max(1, int(os.getenv("WEB_CONCURRENCY", os.getenv("UVICORN_WORKERS", "1"))))
+
+
+def session_store_kind() -> str:
+    """Return the configured session store kind."""
+    default = "sqlite" if worker_count() > 1 or os.getenv("SESSION_DB_URL") else "memory"
+    return os.getenv("SESSION_STORE", default).lower()
+
+
+def session_db_url() -> str:
+    return os.getenv("SESSION_DB_URL") or f"sqlite:///{state_path(SESSION_DB_FILE)}"
+
+
+def create_session_service() -> Any:
+    """Create the ADK session service for the configured store."""
+    if session_store_kind() == "memory":
+        from google.adk.sessions import InMemorySessionService
+        return InMemorySessionService()
+
+    from google.adk.sessions import DatabaseSessionService
+    db_url = session_db_url()
+    logger.info(f"Using shared session store at {db_url.split('@')[-1]}")
+    return DatabaseSessionService(db_url=db_url)
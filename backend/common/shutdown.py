@@ -0,0 +1,111 @@
+"""
+Graceful shutdown for redeploys.
+On SIGTERM the process starts draining: new turns are refused with 503 (and
+readiness reports not ready, so the load balancer stops routing here) and
+turns already running, including detached ones whose client went away, finish
+up to a deadline. Plans and transcripts are saved inside the turn, so a
+drained turn has persisted its work; afterwards __main__ checkpoints in-memory
+ADK sessions to disk for the next instance (see common.session_checkpoint).
+
+Environment:
+    SHUTDOWN_DRAIN_SECONDS   How long shutdown waits for in-flight turns (default: 25)
+"""
+
+import os
+import time
+import signal
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ShutdownCoordinator:
+    """Tracks in-flight turns, refuses new ones once draining, and waits for the rest at shutdown."""
+
+    def __init__(self):
+        self.draining = False
+        self.draining_since: Optional[float] = None
+        self.in_flight = 0
+        self.rejected = 0
+        self._idle: Optional[asyncio.Event] = None
+
+    def _idle_event(self) -> asyncio.Event:
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            if self.in_flight == 0:
+                self._idle.set()
+        return self._idle
+
+    @asynccontextmanager
+    async def track(self):
+        """Count a turn as in flight for the duration of the block."""
+        self.in_flight += 1
+        self._idle_event().clear()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle_event().set()
+
+    def accepting(self) -> bool:
+        """False once draining has started; callers answer 503 instead of starting a turn."""
+        if self.draining:
+            self.rejected += 1
+        return not self.draining
+
+    def begin_drain(self) -> None:
+        if not self.draining:
+            self.draining = True
+            self.draining_since = time.monotonic()
+            logger.info(f"Draining: refusing new turns, {self.in_flight} in flight")
+
+    async def drain(self, deadline: Optional[float] = None) -> None:
+        """Stop accepting turns and wait for in-flight ones for up to ``deadline`` seconds."""
+        self.begin_drain()
+        deadline = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "25")) if deadline is None else deadline
+        try:
+            await asyncio.wait_for(self._idle_event().wait(), timeout=deadline)
+            logger.info("All in-flight turns finished")
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain deadline of {deadline}s passed with {self.in_flight} turns still running")
+
+    def install_signal_handlers(self) -> None:
+        """
+        Start draining as soon as SIGTERM/SIGINT arrives, then hand over to the
+        server's own handler (uvicorn stops accepting connections and waits for
+        open requests). Call after the server has installed its handlers, e.g.
+        from a startup hook.
+        """
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(sig)
+            if not callable(previous):
+                # No server handler to chain to; the default action must stay in place
+                continue
+
+            def handler(signum: int, frame: Any, previous: Callable = previous) -> None:
+                self.begin_drain()
+                previous(signum, frame)
+
+            try:
+                signal.signal(sig, handler)
+            except ValueError:
+                # Not the main thread (e.g. under a test client); uvicorn's shutdown still calls drain()
+                return
+
+    def status(self) -> dict:
+        return {"draining": self.draining, "in_flight": self.in_flight, "rejected": self.rejected}
+
+
+_coordinator: Optional[ShutdownCoordinator] = None
+
+
+def get_shutdown_coordinator() -> ShutdownCoordinator:
+    """Return the process-wide shutdown coordinator."""
+    global _coordinator
+    if _coordinator is None:
+        _coordinator = ShutdownCoordinator()
+    return _coordinator
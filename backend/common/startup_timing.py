@@ -0,0 +1,54 @@
+"""
+Startup timing report.
+Records how long each component takes to import or construct so cold-start
+cost can be attributed per component.
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Collects per-component durations measured since process start."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.components: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, component: str):
+        """Time a block and record it under the given component name."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.components.append({
+                    "component": component,
+                    "seconds": round(elapsed, 4),
+                    "at": round(started - self.started_at, 4),
+                })
+            logger.info(f"Startup: {component} took {elapsed * 1000:.1f} ms")
+
+    def report(self) -> Dict[str, Any]:
+        """Return all recorded timings, slowest first."""
+        with self._lock:
+            components = sorted(self.components, key=lambda c: c["seconds"], reverse=True)
+        return {
+            "uptime_seconds": round(time.perf_counter() - self.started_at, 1),
+            "components": components,
+        }
+
+    def log_report(self) -> None:
+        lines = [f"  {c['component']:<40} {c['seconds'] * 1000:>9.1f} ms" for c in self.report()["components"]]
+        logger.info("Startup timing report:\n" + "\n".join(lines))
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,39 @@
+"""
+Shared Supabase client.
+Creating a client builds an HTTP session, so background jobs (analytics sync,
+exports) reuse one per process instead of creating one per call.
+"""
+
+import os
+import logging
+import threading
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+_client: Optional["Client"] = None
+_lock = threading.Lock()
+
+
+def get_supabase_client() -> Optional["Client"]:
+    """Return the process-wide Supabase client, or None if credentials are missing."""
+    global _client
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is None:
+            supabase_url = os.getenv("SUPABASE_URL")
+            supabase_key = os.getenv("SUPABASE_ANON_KEY")
+            if not supabase_url or not supabase_key:
+                logger.error("Supabase credentials not found in environment variables")
+                return None
+            try:
+                from supabase import create_client
+                _client = create_client(supabase_url, supabase_key)
+            except Exception as e:
+                logger.error(f"Failed to initialize Supabase client: {e}")
+                return None
+    return _client
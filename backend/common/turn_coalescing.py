@@ -0,0 +1,154 @@
+"""
+Single-flight coalescing of identical turns from different users.
+When a cohort opens the portal together, many users send the same opening
+message ("hello", empty history) to the same persona. Turns whose normalised
+inputs match (persona, message, history and context apart from who the user
+is) share one model call: the first runs, the others wait for it, and each
+gets the reply with the first user's name replaced by their own and their own
+session id. A reply is also reused for a short while after it completes.
+
+Only the reply is shared: the followers' ADK sessions don't record the
+exchange. Coalescing is therefore off unless TURN_COALESCING opts a persona
+in, and should only be enabled for personas whose task manager builds each
+prompt from the conversation history the frontend sends rather than from the
+ADK session.
+
+Environment:
+    TURN_COALESCING              Comma-separated persona:stage pairs to coalesce, "*" for any persona;
+                                 stage is "start" (no history yet) or "any", e.g. "run:start" (default: disabled)
+    TURN_COALESCING_TTL_SECONDS  Reuse a completed reply for this long (default: 15; 0 for in-flight only)
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+# Context fields that say who the user is rather than what the model is asked
+IDENTITY_FIELDS = {"name", "email", "user_id", "userName", "userEmail", "idempotency_key", "conversationHistory"}
+
+_NAME_MARK = "\x00name\x00"
+
+
+def _normalise_message(message: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", message.lower())).strip()
+
+
+def _name_variants(name: str) -> List[str]:
+    """Full name first, then the first name, so the longest match is replaced."""
+    name = (name or "").strip()
+    if not name:
+        return []
+    first = name.split()[0]
+    return [name] if first == name else [name, first]
+
+
+def _replace_name(text: str, old: str, new: str) -> str:
+    """Replace the full name with the full name and the first name with the first name."""
+    replacements = _name_variants(new) or [new]
+    for index, variant in enumerate(_name_variants(old)):
+        replacement = replacements[min(index, len(replacements) - 1)]
+        text = re.sub(rf"(?<!\w){re.escape(variant)}(?!\w)", lambda _: replacement, text)
+    return text
+
+
+def parse_coalescing(setting: str) -> Dict[str, str]:
+    """Parse TURN_COALESCING into {persona: stage}."""
+    setting = (setting or "").strip()
+    if not setting or setting == "0":
+        return {}
+    rules = {}
+    for item in setting.split(","):
+        persona, _, stage = item.strip().partition(":")
+        if persona:
+            rules[persona] = (stage or "start").strip().lower()
+    return rules
+
+
+class TurnCoalescer:
+    """Shares one in-flight (or just completed) turn between requests with the same normalised inputs."""
+
+    def __init__(self, rules: Optional[Dict[str, str]] = None, ttl: Optional[float] = None, max_entries: int = 1000):
+        self.rules = parse_coalescing(os.getenv("TURN_COALESCING", "")) if rules is None else rules
+        self.ttl = float(os.getenv("TURN_COALESCING_TTL_SECONDS", "15")) if ttl is None else ttl
+        self.max_entries = max_entries
+        self._flights: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.leaders = 0
+        self.followers = 0
+
+    def key(self, route: str, message: str, context: Dict[str, Any]) -> Optional[str]:
+        """The coalescing key for a turn, or None if its persona and stage aren't configured for coalescing."""
+        stage = self.rules.get(route, self.rules.get("*"))
+        history = (context or {}).get("conversationHistory") or []
+        if stage is None or (stage == "start" and history):
+            return None
+        name = (context or {}).get("name") or ""
+        masked_history = [
+            [entry.get("sender"), _replace_name(str(entry.get("message", "")), name, _NAME_MARK)]
+            for entry in history
+        ]
+        prompt_context = {k: v for k, v in (context or {}).items() if k not in IDENTITY_FIELDS}
+        payload = json.dumps(
+            # Whether a name was given changes the reply ("Hi Sam" vs "Hi there"), so it's part of the key
+            [route, _normalise_message(message), masked_history, prompt_context, bool(name)],
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._flights:
+            key, flight = next(iter(self._flights.items()))
+            expired = flight["task"].done() and now - flight["finished_at"] > self.ttl
+            if expired or len(self._flights) > self.max_entries:
+                self._flights.popitem(last=False)
+            else:
+                break
+
+    def _finished(self, key: str, flight: Dict[str, Any], task: "asyncio.Task") -> None:
+        flight["finished_at"] = time.monotonic()
+        failed = task.cancelled() or task.exception() is not None or task.result().get("status") == "error"
+        if (failed or not self.ttl) and self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def run(self, key: str, context: Dict[str, Any], session_id: Optional[str],
+                  func: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Run ``func`` as the leader for ``key``, or adapt the leader's reply if one is in flight or fresh."""
+        self._evict()
+        flight = self._flights.get(key)
+        if flight is None:
+            self.leaders += 1
+            task = asyncio.create_task(func())
+            flight = {"task": task, "finished_at": 0.0, "name": (context or {}).get("name") or ""}
+            self._flights[key] = flight
+            task.add_done_callback(lambda t: self._finished(key, flight, t))
+            return await asyncio.shield(task)
+
+        try:
+            result = await asyncio.shield(flight["task"])
+        except Exception:
+            result = None
+        if not result or result.get("status") == "error":
+            # The leader failed; this turn runs on its own rather than sharing the error
+            return await func()
+
+        self.followers += 1
+        name = (context or {}).get("name") or ""
+        follower = dict(result)
+        if flight["name"] and name and flight["name"] != name:
+            follower["message"] = _replace_name(str(result.get("message", "")), flight["name"], name)
+        # Never hand a follower the leader's session
+        follower["session_id"] = session_id or str(uuid.uuid4())
+        follower["data"] = {**(result.get("data") or {}), "coalesced": True}
+        return follower
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rules": self.rules, "entries": len(self._flights), "leaders": self.leaders, "followers": self.followers}
@@ -0,0 +1,145 @@
+"""
+Per-session turn serialisation and request idempotency.
+Duplicate submissions (double-clicked send, frontend retries) share the
+in-flight or recently completed result instead of running the model again,
+and turns for the same session never run concurrently. Identical turns from
+different users (a cohort's opening "hello") can be coalesced into one model
+call by common.turn_coalescing, for personas opted in with TURN_COALESCING.
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+from common.shutdown import get_shutdown_coordinator
+from common.turn_coalescing import TurnCoalescer
+
+logger = logging.getLogger(__name__)
+
+# user_id values the frontends and agents use when nobody is signed in; they identify no one
+_SHARED_USER_IDS = {"anonymous", "default_user"}
+
+
+class StripedLocks:
+    """A fixed pool of asyncio locks; keys hash onto a stripe so memory stays bounded."""
+
+    def __init__(self, stripes: int = 256):
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+
+    def lock_for(self, key: str) -> asyncio.Lock:
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return self._locks[int.from_bytes(digest, "big") % len(self._locks)]
+
+
+class IdempotencyCache:
+    """Bounded LRU of in-flight turns and completed results keyed by idempotency key."""
+
+    def __init__(self, ttl: float = 120.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            expired = entry["task"].done() and now - entry["finished_at"] > self.ttl
+            if expired or len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            else:
+                break
+
+    def _finished(self, key: str, entry: Dict[str, Any], task: "asyncio.Task") -> None:
+        entry["finished_at"] = time.monotonic()
+        # Failed turns are shared with concurrent duplicates but not cached, so a retry runs again
+        failed = task.cancelled() or task.exception() is not None or task.result().get("status") == "error"
+        if failed and self._entries.get(key) is entry:
+            del self._entries[key]
+
+    async def run(self, key: str, func: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Return the shared result for ``key``, calling ``func`` only for the first request."""
+        self._evict()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            logger.info(f"Duplicate request {key[:24]} served from {'cache' if entry['task'].done() else 'in-flight turn'}")
+            return await asyncio.shield(entry["task"])
+
+        self.misses += 1
+        # The turn runs as its own task so a disconnecting first caller doesn't cancel
+        # work that duplicates are waiting on (or a plan that is about to be saved)
+        task = asyncio.create_task(func())
+        entry = {"task": task, "finished_at": 0.0}
+        self._entries[key] = entry
+        task.add_done_callback(lambda t: self._finished(key, entry, t))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class TurnGuard:
+    """Combines idempotent de-duplication with per-session serialisation of turns."""
+
+    def __init__(self, stripes: int = None, ttl: float = None):
+        self.locks = StripedLocks(stripes or int(os.getenv("SESSION_LOCK_STRIPES", "256")))
+        self.cache = IdempotencyCache(ttl=ttl or float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "120")))
+        self.coalescer = TurnCoalescer()
+        self.shutdown = get_shutdown_coordinator()
+
+    @staticmethod
+    def request_key(route: str, message: str, context: Dict[str, Any], session_id: Optional[str],
+                    idempotency_key: Optional[str] = None) -> Optional[str]:
+        """
+        Return the de-duplication key for a request.
+
+        An explicit key (Idempotency-Key header or ``context.idempotency_key``) wins.
+        Otherwise a request is a duplicate if it repeats the same message at the
+        same point in the same conversation's history. Personas whose frontend
+        sends no session id are identified by the context email or user_id
+        instead; a request with neither is never treated as a duplicate.
+        """
+        context = context or {}
+        explicit = idempotency_key or context.get("idempotency_key")
+        if explicit:
+            return f"{route}:key:{explicit}"
+        if session_id:
+            owner = f"session:{session_id}"
+        else:
+            user_id = str(context.get("user_id") or "").strip()
+            identity = str(context.get("email") or "").strip().lower() or (
+                user_id if user_id.lower() not in _SHARED_USER_IDS else "")
+            if not identity:
+                return None
+            owner = f"user:{identity}"
+        history_length = len(context.get("conversationHistory", []) or [])
+        # A retried send may differ in case or stray whitespace
+        normalised = " ".join(str(message or "").lower().split())
+        fingerprint = hashlib.sha256(f"{route}\x00{owner}\x00{history_length}\x00{normalised}".encode()).hexdigest()
+        return f"{route}:auto:{fingerprint}"
+
+    async def run(self, route: str, message: str, context: Dict[str, Any], session_id: Optional[str],
+                  func: Callable[[], Awaitable[Dict[str, Any]]], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Run one turn with de-duplication and, when a session is known, the session lock held."""
+        async def locked() -> Dict[str, Any]:
+            # Counted as in flight until the turn itself ends, even if the client has gone
+            async with self.shutdown.track():
+                if not session_id:
+                    return await func()
+                async with self.locks.lock_for(f"{route}:{session_id}"):
+                    return await func()
+
+        key = self.request_key(route, message, context, session_id, idempotency_key)
+        deduplicated = (lambda: locked()) if key is None else (lambda: self.cache.run(key, locked))
+
+        coalescing_key = self.coalescer.key(route, message, context)
+        if coalescing_key is None:
+            return await deduplicated()
+        return await self.coalescer.run(f"{route}:{coalescing_key}", context, session_id, deduplicated)
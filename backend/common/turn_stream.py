@@ -0,0 +1,70 @@
+"""
+Streaming of partial model output for the current turn.
+A channel that can forward text as it is generated (the WebSocket endpoint)
+installs a sink for the duration of a turn; run_agent_turn then asks ADK for
+streamed events and passes each partial text chunk to the sink. Plain HTTP
+turns install no sink and keep the non-streaming path.
+
+Control markers the agents emit for the server ([PLAN_GENERATED], ID[n]) are
+removed from streamed chunks, as they are from final responses; text that
+could be the start of a marker split across chunks is held back until the
+next chunk shows whether it is one.
+"""
+
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, Optional
+
+StreamSink = Callable[[str], Awaitable[None]]
+
+MARKER = re.compile(r"\[PLAN_GENERATED\]|ID\[\d+\]")
+_PLAN_MARKER = "[PLAN_GENERATED]"
+_PARTIAL_ID_MARKER = re.compile(r"ID?|ID\[\d*")
+# Longest tail that can still be an unfinished marker (ID[ followed by a long number)
+_MAX_PARTIAL = 24
+
+_sink: ContextVar[Optional[StreamSink]] = ContextVar("turn_stream_sink", default=None)
+
+
+def current_stream_sink() -> Optional[StreamSink]:
+    """Return the sink partial output should go to for this turn, if any."""
+    return _sink.get()
+
+
+@contextmanager
+def stream_to(sink: Optional[StreamSink]) -> Iterator[None]:
+    """Send partial model output within the block to ``sink`` (None suppresses streaming)."""
+    token = _sink.set(sink)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
+
+
+def _partial_marker_start(text: str) -> int:
+    """Index where an unfinished marker at the end of ``text`` starts (len(text) if there is none)."""
+    for start in range(max(0, len(text) - _MAX_PARTIAL), len(text)):
+        tail = text[start:]
+        if _PLAN_MARKER.startswith(tail) or _PARTIAL_ID_MARKER.fullmatch(tail):
+            return start
+    return len(text)
+
+
+class MarkerFilter:
+    """Strips control markers from a stream of text chunks, including markers split across chunks."""
+
+    def __init__(self):
+        self._held = ""
+
+    def feed(self, chunk: str) -> str:
+        """Return the part of ``chunk`` that is safe to forward now."""
+        text = MARKER.sub("", self._held + chunk)
+        cut = _partial_marker_start(text)
+        self._held = text[cut:]
+        return text[:cut]
+
+    def flush(self) -> str:
+        """Return text held back at the end of the stream (it turned out not to be a marker)."""
+        held, self._held = self._held, ""
+        return held
@@ -0,0 +1,288 @@
+"""
+WebSocket channel for multi-turn consultations.
+A client opens /ws/{persona} once per consultation, binds it to a session with
+its context, and then sends only the new message each turn. The server keeps
+the conversation history for the session, streams model output as it is
+generated, and stores each completed turn so a client that reconnects with
+the same session_id resumes where it left off, on any worker.
+
+Protocol (JSON text frames):
+    client -> {"type": "start", "context": {...}, "session_id": "..."}      session_id optional
+    server <- {"type": "session", "session_id": "...", "resumed": bool, "turns": n}
+    client -> {"type": "resume", "session_id": "...", "last_turn": n}     instead of start
+    server <- {"type": "response", "turn": k, ...}                        for each turn after n
+    client -> {"type": "turn", "message": "...", "turn": n}                turn number optional
+    server <- {"type": "delta", "turn": n, "text": "..."}                 while the model generates
+    server <- {"type": "response", "turn": n, "message": "...", "status": "...", "data": {...}}
+    either -> {"type": "ping"}  /  <- {"type": "pong"}
+    server <- {"type": "error", "code": "...", "detail": "..."}                e.g. code "rate_limited" with retry_after
+
+Environment:
+    WS_HEARTBEAT_SECONDS   Interval between server pings (default: 20)
+    WS_IDLE_SECONDS        Close a connection silent for this long (default: 90)
+    WS_SESSION_TTL_HOURS   Forget resumable sessions idle for this long (default: 48)
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+
+from common.local_state import connect
+from common.rate_limit import client_ip
+from common.shutdown import get_shutdown_coordinator
+from common.turn_stream import stream_to
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_DB = "ws_sessions.sqlite3"
+
+
+class ChannelStore:
+    """Context, history and the last response of each WebSocket session, in the local state directory."""
+
+    def __init__(self, filename: str = CHANNEL_DB):
+        self.conn = connect(filename)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ws_sessions (
+                session_id TEXT PRIMARY KEY,
+                persona TEXT NOT NULL,
+                context TEXT NOT NULL,
+                history TEXT NOT NULL,
+                turns INTEGER NOT NULL,
+                responses TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def load(self, persona: str, session_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT context, history, turns, responses FROM ws_sessions WHERE session_id = ? AND persona = ?",
+            (session_id, persona),
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            "context": json.loads(row["context"]),
+            "history": json.loads(row["history"]),
+            "turns": row["turns"],
+            "responses": json.loads(row["responses"]),
+        }
+
+    def save(self, persona: str, session_id: str, state: Dict[str, Any]) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO ws_sessions (session_id, persona, context, history, turns, responses, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    session_id, persona, json.dumps(state["context"]), json.dumps(state["history"]),
+                    state["turns"], json.dumps(state["responses"]), time.time(),
+                ),
+            )
+
+    def prune(self, ttl: float) -> int:
+        with self.conn:
+            return self.conn.execute("DELETE FROM ws_sessions WHERE updated_at < ?", (time.time() - ttl,)).rowcount
+
+
+class Channel:
+    """One WebSocket connection bound to a persona and, after start/resume, to a session."""
+
+    # Responses kept for replay on resume; a client is rarely more than a turn or two behind
+    KEEP_RESPONSES = 4
+
+    def __init__(self, websocket: Any, persona: str, manager: Any, turn_guard: Any, store: ChannelStore, rate_limiter: Any = None):
+        self.websocket = websocket
+        self.persona = persona
+        self.manager = manager
+        self.turn_guard = turn_guard
+        self.store = store
+        self.rate_limiter = rate_limiter
+        self.session_id: Optional[str] = None
+        self.state: Optional[Dict[str, Any]] = None
+        self.turn_task: Optional[asyncio.Task] = None
+        self._send_lock = asyncio.Lock()
+        self.last_received = time.monotonic()
+        self.closed = False
+
+    async def send(self, payload: Dict[str, Any]) -> None:
+        if self.closed:
+            return
+        async with self._send_lock:
+            try:
+                await self.websocket.send_text(json.dumps(payload, default=str))
+            except Exception:
+                # The client went away; the turn still completes and is stored for resume
+                self.closed = True
+
+    async def error(self, code: str, detail: str) -> None:
+        await self.send({"type": "error", "code": code, "detail": detail})
+
+    async def bind(self, frame: Dict[str, Any]) -> None:
+        """Handle start/resume: load or create the session state and replay missed responses."""
+        session_id = frame.get("session_id") or str(uuid.uuid4())
+        state = self.store.load(self.persona, session_id)
+        resumed = state is not None
+        if frame["type"] == "resume" and not resumed:
+            await self.error("unknown_session", f"No resumable session {session_id} for {self.persona}")
+            return
+        if state is None:
+            state = {"context": {}, "history": [], "turns": 0, "responses": []}
+        if frame.get("context"):
+            # Context (name, email, role, department) is bound once; later starts may update it
+            state["context"] = {k: v for k, v in frame["context"].items() if k != "conversationHistory"}
+            if not resumed and frame["context"].get("conversationHistory"):
+                state["history"] = list(frame["context"]["conversationHistory"])
+        self.session_id, self.state = session_id, state
+        self.store.save(self.persona, session_id, state)
+        await self.send({"type": "session", "session_id": session_id, "resumed": resumed, "turns": state["turns"]})
+
+        last_seen = int(frame.get("last_turn") or 0)
+        for response in state["responses"]:
+            if response["turn"] > last_seen:
+                await self.send(response)
+
+    async def run_turn(self, frame: Dict[str, Any]) -> None:
+        """Run one turn with streamed output, then record it for the session."""
+        # Pick up turns completed by an earlier connection to the same session
+        self.state = self.store.load(self.persona, self.session_id) or self.state
+        message = frame.get("message", "")
+        turn = int(frame.get("turn") or self.state["turns"] + 1)
+        if turn <= self.state["turns"]:
+            # A turn re-sent after a reconnect that already completed: replay its response
+            for response in self.state["responses"]:
+                if response["turn"] == turn:
+                    await self.send(response)
+                    return
+            await self.error("stale_turn", f"Turn {turn} already completed")
+            return
+
+        if not get_shutdown_coordinator().accepting():
+            # The client reconnects (to another instance) and re-sends this turn number
+            await self.send({"type": "error", "code": "shutting_down", "turn": turn, "detail": "Server is restarting; resume and resend", "retry_after": 5})
+            return
+
+        if self.rate_limiter is not None:
+            decision = await self.rate_limiter.check_async(
+                self.state["context"].get("email"), self.session_id, client_ip(self.websocket.headers, self.websocket.client)
+            )
+            if not decision.allowed:
+                await self.send({
+                    "type": "error", "code": "rate_limited", "turn": turn,
+                    "detail": f"Too many requests; retry in {decision.headers()['Retry-After']} seconds",
+                    "retry_after": round(decision.retry_after, 1),
+                })
+                return
+
+        context = {**self.state["context"], "conversationHistory": list(self.state["history"])}
+
+        async def forward(text: str) -> None:
+            await self.send({"type": "delta", "turn": turn, "text": text})
+
+        try:
+            with stream_to(forward):
+                result = await self.turn_guard.run(
+                    self.persona, message, context, self.session_id,
+                    lambda: self.manager.process_task(message, context, self.session_id),
+                    idempotency_key=f"ws:{self.session_id}:{turn}",
+                )
+        except Exception as e:
+            result = {"message": f"Error processing request: {str(e)}", "status": "error", "data": {"error_type": type(e).__name__}}
+
+        response = {
+            "type": "response",
+            "turn": turn,
+            "message": result.get("message", "Task completed"),
+            "status": result.get("status", "success"),
+            "data": result.get("data", {}),
+            "session_id": self.session_id,
+        }
+        if response["status"] == "success":
+            self.state["history"] += [
+                {"sender": "user", "message": message},
+                {"sender": "ai", "message": response["message"]},
+            ]
+            self.state["turns"] = turn
+            self.state["responses"] = (self.state["responses"] + [response])[-self.KEEP_RESPONSES:]
+            self.store.save(self.persona, self.session_id, self.state)
+        await self.send(response)
+
+    async def handle(self, frame: Dict[str, Any]) -> None:
+        kind = frame.get("type")
+        if kind == "ping":
+            await self.send({"type": "pong", "ts": time.time()})
+        elif kind == "pong":
+            pass
+        elif kind in ("start", "resume"):
+            if self.turn_task and not self.turn_task.done():
+                await self.error("busy", "Cannot rebind while a turn is running")
+                return
+            await self.bind(frame)
+        elif kind == "turn":
+            if self.state is None:
+                await self.error("not_started", "Send a start or resume frame first")
+            elif self.turn_task and not self.turn_task.done():
+                await self.error("busy", "A turn is already running on this connection")
+            elif not frame.get("message"):
+                await self.error("bad_request", "A turn needs a message")
+            else:
+                # Run the turn in the background so pings keep flowing while the model works
+                self.turn_task = asyncio.create_task(self.run_turn(frame))
+        else:
+            await self.error("bad_request", f"Unknown frame type {kind!r}")
+
+    async def heartbeat(self, interval: float, idle: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self.last_received > idle:
+                logger.info(f"Closing idle WebSocket for session {self.session_id}")
+                await self.websocket.close(code=1001)
+                return
+            await self.send({"type": "ping", "ts": time.time()})
+
+
+def register_ws_channel(app: Any, task_managers: Dict[str, Any], turn_guard: Any, rate_limiter: Any = None) -> None:
+    """Add the /ws/{persona} WebSocket route for the given persona TaskManagers (turns count against ``rate_limiter``)."""
+    from fastapi import WebSocket, WebSocketDisconnect
+
+    store = ChannelStore()
+    store.prune(float(os.getenv("WS_SESSION_TTL_HOURS", "48")) * 3600)
+    heartbeat_interval = float(os.getenv("WS_HEARTBEAT_SECONDS", "20"))
+    idle_timeout = float(os.getenv("WS_IDLE_SECONDS", "90"))
+
+    @app.websocket("/ws/{persona}")
+    async def consultation_channel(websocket: WebSocket, persona: str):
+        manager = task_managers.get(persona)
+        if manager is None:
+            await websocket.close(code=4404, reason=f"Unknown persona {persona}")
+            return
+        await websocket.accept()
+        channel = Channel(websocket, persona, manager, turn_guard, store, rate_limiter)
+        heartbeat = asyncio.create_task(channel.heartbeat(heartbeat_interval, idle_timeout))
+        try:
+            while True:
+                raw = await websocket.receive_text()
+                channel.last_received = time.monotonic()
+                try:
+                    frame = json.loads(raw)
+                except ValueError:
+                    await channel.error("bad_request", "Frames must be JSON")
+                    continue
+                if not isinstance(frame, dict):
+                    await channel.error("bad_request", "Frames must be JSON objects")
+                    continue
+                await channel.handle(frame)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            channel.closed = True
+            heartbeat.cancel()
+            # A turn in flight still completes and is stored, so a reconnect can pick up its response
+            if channel.turn_task and not channel.turn_task.done():
+                logger.info(f"WebSocket for session {channel.session_id} closed mid-turn; finishing the turn for resume")
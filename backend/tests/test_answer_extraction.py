@@ -0,0 +1,106 @@
+import pytest
+
+from agent.answer_extraction import (
+    extract_answers, parse_answer, parse_capacity, parse_ranking, parse_ratings, question_kind,
+)
+
+
+def test_labelled_challenge_ratings():
+    answer = "Staff recruitment: 4\nStudent retention - 3\nPlacements 5/5\nFunding: 2"
+    assert parse_ratings(answer, "challenge_ratings") == {
+        "Staff recruitment/retention": 4,
+        "Student recruitment/retention": 3,
+        "Industry placement capacity": 5,
+        "Funding/budget constraints": 2,
+    }
+
+
+def test_ratings_on_one_line_separated_by_commas():
+    answer = "loss of key staff 5, enrolments 3, competition 2"
+    assert parse_ratings(answer, "risk_ratings") == {
+        "Loss of key staff": 5,
+        "Declining student enrolments": 3,
+        "Increased competition": 2,
+    }
+
+
+def test_bare_rating_list_follows_question_order():
+    ratings = parse_ratings("4 3 5 2 2 1 3 5 4 2", "challenge_ratings")
+    assert ratings["Staff recruitment/retention"] == 4
+    assert ratings["Student support services"] == 2
+    assert len(ratings) == 10
+
+
+@pytest.mark.parametrize("answer", [
+    "They're all fairly serious to be honest",
+    "4 3 5",                                  # too few numbers to take in order
+    "Staff recruitment is our biggest worry",  # no rating given
+])
+def test_unparseable_ratings_are_left_to_the_llm_fallback(answer):
+    assert parse_ratings(answer, "challenge_ratings") == {}
+
+
+def test_explicit_ranks():
+    answer = "1. More teaching staff\n2. New equipment\n3. Industry partnerships\n4. PD for staff\n5. Curriculum refresh"
+    assert parse_ranking(answer) == {
+        "Additional teaching staff": 1,
+        "New/upgraded equipment": 2,
+        "Industry partnership development": 3,
+        "Professional development for existing staff": 4,
+        "Curriculum development/refresh": 5,
+    }
+
+
+def test_ranking_by_order_of_mention_stops_at_five():
+    answer = "equipment, facilities, marketing, research, assessment, curriculum"
+    assert parse_ranking(answer) == {
+        "New/upgraded equipment": 1,
+        "Facility improvements/expansion": 2,
+        "Marketing/student recruitment": 3,
+        "Research and innovation capabilities": 4,
+        "Assessment development/refresh": 5,
+    }
+
+
+def test_ranking_without_known_items():
+    assert parse_ranking("Honestly just more money") == {}
+
+
+def test_capacity_with_percentage():
+    assert parse_capacity("Currently 1,200 students, we could take 1,500, about 80% utilised") == {
+        "current_capacity": 1200.0,
+        "max_capacity": 1500.0,
+        "utilisation_pct": 80.0,
+    }
+
+
+def test_capacity_utilisation_derived_from_counts():
+    assert parse_capacity("around 300 now out of a maximum of 400") == {
+        "current_capacity": 300.0,
+        "max_capacity": 400.0,
+        "utilisation_pct": 75.0,
+    }
+
+
+def test_capacity_without_numbers():
+    assert parse_capacity("Not sure, you'd have to ask the head teacher") == {}
+
+
+def test_question_kind_and_dispatch():
+    assert question_kind("Please rate the following challenges in your area on a scale of 1-5") == "challenge_ratings"
+    assert question_kind("What are the top 3 operational challenges?") is None
+    assert parse_answer("capacity", "50 of 100") == {"current_capacity": 50.0, "max_capacity": 100.0, "utilisation_pct": 50.0}
+
+
+def test_extract_answers_from_transcript_and_plan():
+    history = [
+        {"sender": "ai", "message": "Please rate your level of concern about these potential risks (1 = Low, 5 = High)"},
+        {"sender": "user", "message": "Loss of key staff: 5; competition: 2"},
+        {"sender": "ai", "message": "Could you provide your current student capacity?"},
+        {"sender": "user", "message": "no idea"},
+    ]
+    plan = "<table><tr><td>Staff recruitment/retention</td><td>4</td></tr></table>"
+    assert extract_answers(history, plan) == {
+        "risk_ratings": {"Loss of key staff": 5, "Increased competition": 2},
+        "challenge_ratings": {"Staff recruitment/retention": 4},
+    }
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from agent import consultation_facts
+from agent.consultation_facts import AnswerExtractor, SessionFactStore, format_facts, structured_answers
+
+PATTERNS = [
+    "years have you been in your current position",
+    "direct reports",
+    "rate the following challenges",
+    "current student capacity",
+]
+
+
+@pytest.fixture
+def extractor(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCAL_STATE_DIR", str(tmp_path))
+    calls = []
+
+    async def llm_parse_answer(kind, question, answer):
+        calls.append((kind, answer))
+        return {}
+
+    monkeypatch.setattr(consultation_facts, "llm_parse_answer", llm_parse_answer)
+    extractor = AnswerExtractor("riley", PATTERNS, store=SessionFactStore())
+    extractor.llm_calls = calls
+    return extractor
+
+
+def record(extractor, question, answer, session_id="s1"):
+    history = [{"sender": "ai", "message": question}]
+    return asyncio.run(extractor.record_turn(session_id, history, answer))
+
+
+def test_text_answer_is_stored_under_the_question(extractor):
+    facts = record(extractor, "How many years have you been in your current position?", "About six years")
+    assert facts == {"years have you been in your current position": {"kind": "text", "text": "About six years"}}
+    assert extractor.store.get("riley", "s1") == facts
+
+
+def test_structured_answer_is_parsed_without_the_llm(extractor):
+    facts = record(extractor, "To the best of your knowledge, what is your current student capacity?", "400 of 500")
+    assert facts["current student capacity"] == {
+        "kind": "capacity",
+        "value": {"current_capacity": 400.0, "max_capacity": 500.0, "utilisation_pct": 80.0},
+        "source": "parsed",
+        "text": "400 of 500",
+    }
+    assert extractor.llm_calls == []
+
+
+def test_unparsed_answer_goes_to_the_llm_fallback(extractor):
+    question = "Please rate the following challenges in your area on a scale of 1-5"
+    facts = record(extractor, question, "Everything is a struggle")
+    assert extractor.llm_calls == [("challenge_ratings", "Everything is a struggle")]
+    assert facts["rate the following challenges"]["source"] == "unparsed"
+    assert structured_answers(facts) == {}
+
+
+def test_recap_of_an_earlier_question_does_not_take_the_answer(extractor):
+    record(extractor, "How many years have you been in your current position?", "Six years")
+    recap = (
+        "When I asked how many years have you been in your current position, you said six - "
+        "that's a lot of experience. Do you have any direct reports? If so, how many?"
+    )
+    facts = record(extractor, recap, "Yes, 12")
+    assert facts["years have you been in your current position"]["text"] == "Six years"
+    assert facts["direct reports"]["text"] == "Yes, 12"
+
+
+def test_messages_without_a_stage_question_record_nothing(extractor):
+    assert record(extractor, "Great to meet you!", "Likewise") == {}
+    assert record(extractor, "Do you have any direct reports?", "   ") == {}
+    assert extractor.missing(extractor.store.get("riley", "s1")) == PATTERNS
+
+
+def test_sessions_are_kept_apart(extractor):
+    record(extractor, "Do you have any direct reports?", "Three", session_id="a")
+    record(extractor, "Do you have any direct reports?", "None", session_id="b")
+    assert extractor.store.get("riley", "a")["direct reports"]["text"] == "Three"
+    assert extractor.store.get("riley", "b")["direct reports"]["text"] == "None"
+
+
+def test_format_facts():
+    facts = {
+        "direct reports": {"kind": "text", "text": "Yes,\n  twelve"},
+        "current student capacity": {"kind": "capacity", "value": {"current_capacity": 400.0}},
+    }
+    assert format_facts(facts) == "- direct reports: Yes, twelve\n- current student capacity: current_capacity: 400"
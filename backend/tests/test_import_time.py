@@ -0,0 +1,51 @@
+"""
+Cold-start import budget for the agent server.
+
+Environment:
+    IMPORT_BUDGET_MS   Maximum total import time of agent.__main__ (default: 1500)
+"""
+
+import os
+
+import pytest
+
+from common.import_profiler import parse_importtime, profile_imports, format_report
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+
+# Imported when a persona is first built or a model first called, never at startup
+DEFERRED_PACKAGES = ("google.adk", "google.genai", "litellm", "supabase", "numpy")
+
+
+@pytest.fixture(scope="module")
+def server_imports():
+    report = profile_imports("agent.__main__")
+    if not report["ok"] and any("ModuleNotFoundError" in line for line in report["errors"]):
+        pytest.skip(f"server dependencies not installed: {report['errors'][-1]}")
+    assert report["ok"], "\n".join(report["errors"])
+    return report
+
+
+def test_server_imports_within_budget(server_imports):
+    assert server_imports["total_ms"] <= IMPORT_BUDGET_MS, format_report(server_imports, top=15)
+
+
+def test_slow_packages_are_deferred(server_imports):
+    eager = sorted({
+        entry["module"] for entry in server_imports["entries"]
+        if entry["module"].startswith(DEFERRED_PACKAGES)
+    })
+    assert not eager, f"imported at startup: {', '.join(eager[:10])}"
+
+
+def test_parse_importtime():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |   _io",
+        "import time:       300 |        900 | json",
+        "import time:        40 |         40 |     json.scanner",
+        "Traceback (most recent call last):",
+    ])
+    entries = parse_importtime(stderr)
+    assert [(e["module"], e["depth"]) for e in entries] == [("_io", 1), ("json", 0), ("json.scanner", 2)]
+    assert entries[1]["cumulative_us"] == 900
@@ -0,0 +1,146 @@
+import pytest
+
+from agent.question_rules import QuestionRules, compile_condition
+
+OPTIONS = {
+    "1": ["Bankstown", "Campbelltown", "Not Applicable to my role"],
+    "2": [],
+    "3": ["Yes", "No", "Don't know"],
+}
+
+
+def condition(spec):
+    return compile_condition(spec, OPTIONS)
+
+
+@pytest.mark.parametrize("answer, expected", [
+    ("Campbelltown", True),
+    ("campbelltown campus", True),
+    ("2", True),              # option number
+    ("1 and 2", True),
+    ("Bankstown", False),
+    ("dan", False),           # letters of "and" are not option numbers
+    ("", False),
+])
+def test_equals_matches_option_wording_or_number(answer, expected):
+    assert condition({"question": "1", "equals": "Campbelltown"})({"1": answer}) is expected
+
+
+def test_equals_prefers_the_longest_option():
+    # "No" inside "Not Applicable to my role" must not count as selecting "No"
+    options = {"1": ["No", "Not Applicable to my role"]}
+    check = compile_condition({"question": "1", "equals": "No"}, options)
+    assert not check({"1": "Not applicable to my role"})
+    assert check({"1": "no"})
+
+
+def test_in_contains_and_matches():
+    assert condition({"question": "1", "in": ["Bankstown", "Campbelltown"]})({"1": "Bankstown"})
+    assert condition({"question": "2", "contains": "placement"})({"2": "Finding PLACEMENTS is hard"})
+    assert condition({"question": "2", "matches": r"^no\b"})({"2": "No, not really"})
+    assert not condition({"question": "2", "matches": r"^no\b"})({"2": "Nothing to add"})
+
+
+@pytest.mark.parametrize("spec, answer, expected", [
+    ({"question": "2", "lt": 1}, "none", True),
+    ({"question": "2", "lt": 1}, "3 staff", False),
+    ({"question": "2", "gte": 1000}, "about 1,200 students", True),
+    ({"question": "2", "gt": 5}, "not sure", False),
+])
+def test_numeric_comparisons(spec, answer, expected):
+    assert condition(spec)({"2": answer}) is expected
+
+
+def test_answered_and_combinators():
+    assert condition({"question": "2", "answered": False})({})
+    assert not condition({"question": "2", "answered": True})({"2": "   "})
+    both = condition({"all": [{"question": "3", "equals": "Yes"}, {"question": "2", "answered": True}]})
+    assert both({"3": "yes", "2": "x"}) and not both({"3": "yes"})
+    either = condition({"any": [{"question": "3", "equals": "No"}, {"question": "3", "equals": "Don't know"}]})
+    assert either({"3": "I don't know"}) and not either({"3": "Yes"})
+    assert condition({"not": {"question": "3", "equals": "Yes"}})({"3": "No"})
+
+
+def test_conditions_on_unanswered_questions_are_false():
+    assert not condition({"question": "3", "equals": "Yes"})({})
+    assert not condition({"not": {"question": "3", "answered": True}})({"3": "Yes"})
+
+
+@pytest.mark.parametrize("spec", [
+    {"question": "9", "equals": "Yes"},                  # unknown question
+    {"question": "3", "equals": "Yes", "in": ["No"]},    # two operators
+    {"question": "3", "between": [1, 2]},                # unknown operator
+    ["not", "an object"],
+])
+def test_invalid_conditions_raise(spec):
+    with pytest.raises(ValueError):
+        condition(spec)
+
+
+def questions(*specs):
+    return [{"id": str(i), "question": f"Q{i}", **spec} for i, spec in enumerate(specs, start=1)]
+
+
+def test_next_after_walks_in_order_and_ends():
+    rules = QuestionRules(questions({}, {}, {}))
+    assert rules.first({}) == 0
+    assert rules.next_after("1", {}) == 1
+    assert rules.next_after("3", {}) is None
+    assert rules.next_after("unknown", {}) is None
+
+
+def test_show_if_skips_questions():
+    rules = QuestionRules(questions(
+        {"options": ["Yes", "No"]},
+        {"showIf": {"question": "1", "equals": "Yes"}},
+        {"showIf": {"question": "1", "equals": "Yes"}},
+        {},
+    ))
+    assert rules.next_after("1", {"1": "Yes"}) == 1
+    assert rules.next_after("1", {"1": "No"}) == 3
+
+
+def test_skip_to_jumps_forward_on_the_first_matching_rule():
+    rules = QuestionRules(questions(
+        {"options": ["A", "B", "C"], "skipTo": [
+            {"if": {"question": "1", "equals": "B"}, "to": "3"},
+            {"if": {"question": "1", "in": ["B", "C"]}, "to": "4"},
+        ]},
+        {}, {}, {},
+    ))
+    assert rules.next_after("1", {"1": "A"}) == 1
+    assert rules.next_after("1", {"1": "B"}) == 2
+    assert rules.next_after("1", {"1": "C"}) == 3
+
+
+def test_skip_target_passes_over_hidden_questions():
+    rules = QuestionRules(questions(
+        {"skipTo": [{"if": {"question": "1", "contains": "skip"}, "to": "2"}]},
+        {"showIf": {"question": "1", "contains": "never"}},
+        {},
+    ))
+    assert rules.next_after("1", {"1": "skip please"}) == 2
+
+
+def test_end_if_ends_the_questionnaire():
+    rules = QuestionRules(questions({"endIf": {"question": "1", "matches": r"^no\b"}}, {}))
+    assert rules.next_after("1", {"1": "No thanks"}) is None
+    assert rules.next_after("1", {"1": "Sure"}) == 1
+
+
+def test_skips_must_move_forward():
+    with pytest.raises(ValueError):
+        QuestionRules(questions({}, {"skipTo": [{"if": {"question": "1", "answered": True}, "to": "1"}]}))
+
+
+@pytest.mark.parametrize("answer, expected", [
+    ("Bankstown", "58"),
+    ("Not Applicable to my role", "66"),
+    ("9", "66"),
+    ("N/A", "66"),
+    ("not applicable", "66"),
+])
+def test_delivery_staff_campus_skip(answer, expected):
+    from agent.questionnaires import QuestionnaireRegistry
+    survey = QuestionnaireRegistry().get("delivery_staff")
+    assert survey.next_after("57", {"57": answer})["id"] == expected
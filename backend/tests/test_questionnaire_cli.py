@@ -0,0 +1,24 @@
+import json
+import os
+
+import pytest
+
+from agent.questionnaire_cli import main
+from agent.questionnaires import QUESTIONS_DIR
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+@pytest.mark.parametrize("docx, name, extra", [
+    ("Set 1- Riley.docx", "riley", []),
+    ("Set 3 - Industry.docx", "industry", ["--title", "HWHS Industry Survey"]),
+])
+def test_converter_reproduces_committed_questionnaire(tmp_path, docx, name, extra):
+    source = os.path.join(REPO_DIR, docx)
+    if not os.path.exists(source):
+        pytest.skip(f"{docx} not present")
+    output = tmp_path / f"{name}.json"
+    assert main([source, "--name", name, "--output", str(output), *extra]) == 0
+    with open(os.path.join(QUESTIONS_DIR, f"{name}.json"), encoding="utf-8") as f:
+        committed = json.load(f)
+    assert json.loads(output.read_text(encoding="utf-8")) == committed